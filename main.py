@@ -4,12 +4,111 @@ import json
 from datetime import datetime
 from PIL import Image
 import shutil
-from utils.data_manager import DataManager
+import secrets
+import threading
+import time
+import base64
+from urllib.parse import quote
+from utils.data_manager import get_shared_data_manager
+from utils.async_data_manager import get_shared_async_data_manager
+from utils.averages import compute_class_averages, get_mention, build_school_snapshot, compute_school_averages
+from utils.student_import import import_students, write_error_report, StudentImportError
+from utils.export import (export_rows, student_columns, student_rows, grade_sheet_rows,
+                          school_grade_rows, averages_rows, ExportError)
+from utils.bulletins import generate_bulletins, zip_bulletins, BulletinError, PDF_AVAILABLE
+from utils.timetable import generate_timetable, requirements_from_schedule, read_requirements, TimetableError
+from utils.indexes import time_to_minutes
+from utils.storage import school_year_of, grade_id
+
+# Dossier des fichiers envoyés depuis le navigateur (import d'élèves, photos)
+UPLOAD_DIR = "uploads"
+# Photos des élèves ; le chemin est enregistré dans la fiche (champ photo)
+PHOTOS_DIR = os.path.join("photos", "students")
+# Champs affichés dans un bloc de cours : un bloc n'est reconstruit que si l'un d'eux change
+COURSE_BLOCK_FIELDS = ("day", "start_time", "end_time", "subject", "teacher_name", "class_name", "color")
+# Fichiers statiques servis par l'application ; les exports y sont téléchargeables
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+EXPORT_DIR = os.path.join(ASSETS_DIR, "exports")
+# Durée de vie d'un export (secondes) : il contient des données personnelles et des notes
+EXPORT_TTL = 600
+
+
+def purge_exports(max_age=EXPORT_TTL):
+    """Supprimer les exports plus anciens que max_age (sessions fermées, redémarrages)"""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) <= max_age:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Erreur lors de la suppression de l'export {path}: {e}")
+
+
+class ProgressDialog:
+    """Boîte de progression d'une tâche de fond, avec un bouton Annuler
+    
+    Chaque tâche a la sienne : deux tâches simultanées ne se partagent ni la
+    barre ni la fermeture. Annuler positionne cancel_event, que la tâche
+    consulte entre deux étapes.
+    """
+    
+    def __init__(self, page, title, description):
+        self.page = page
+        self.cancel_event = threading.Event()
+        self.bar = ft.ProgressBar(width=400, value=0, color="#059669", bgcolor="#e2e8f0")
+        self.status = ft.Text("Préparation des données...", size=14, color="#64748b")
+        self.dialog = ft.AlertDialog(
+            title=ft.Text(title, weight=ft.FontWeight.BOLD),
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Text(
+                        description,
+                        size=14,
+                        color="#1e293b"
+                    ),
+                    ft.Container(height=16),
+                    self.bar,
+                    ft.Container(height=8),
+                    self.status
+                ], tight=True),
+                width=450
+            ),
+            actions=[
+                ft.TextButton("Annuler", on_click=self.cancel)
+            ],
+            modal=True
+        )
+    
+    def cancel(self, e=None):
+        """Demander l'arrêt de la tâche"""
+        self.cancel_event.set()
+        self.status.value = "Annulation en cours..."
+        self.page.update()
+    
+    def update(self, done, total, message):
+        """Mettre à jour la barre (total None : progression indéterminée) et le message"""
+        self.bar.value = done / total if total else None
+        self.status.value = message
+        self.page.update()
+    
+    def close(self):
+        """Fermer la boîte de progression"""
+        self.page.close(self.dialog)
+
 
 class StudentRegistrationSystem:
     def __init__(self):
-        # Initialize data manager
-        self.data_manager = DataManager()
+        # Gestionnaire de données partagé par toutes les sessions du processus
+        self.data_manager = get_shared_data_manager()
+        # Même gestionnaire, appels exécutés hors de la boucle d'événements (gestionnaires async)
+        self.async_data = get_shared_async_data_manager()
         
         # Variables pour les champs
         self.registration_no = ""
@@ -28,6 +127,9 @@ class StudentRegistrationSystem:
         self.photo_path = None
         self.current_page = "dashboard"
         
+        # Exports de la session : répertoire au nom secret, supprimé à la fin de la session
+        self.export_dir = os.path.join(EXPORT_DIR, secrets.token_urlsafe(16))
+        
         # Variables UI
         self.page = None
         self.sidebar = None
@@ -49,9 +151,23 @@ class StudentRegistrationSystem:
             "actions": True
         }
         
+        # Pagination du tableau des élèves
+        self.students_page_size = 50
+        self.students_page_index = 0
+        self.current_filtered_students = []
+        self.current_filtered_class = "Toutes les classes"
+        
+        # Recherche d'élèves temporisée
+        self.student_search_generation = 0
+        self.student_search_timer = None
+        
     def main(self, page: ft.Page):
         self.page = page
         
+        # Exports : ceux des sessions passées expirés, ceux de la session supprimés à sa fermeture
+        purge_exports()
+        page.on_close = lambda e: shutil.rmtree(self.export_dir, ignore_errors=True)
+        
         # Configuration de la page
         page.title = "École Sans Base - Gestion d'établissement"
         page.theme_mode = ft.ThemeMode.LIGHT
@@ -268,9 +384,9 @@ class StudentRegistrationSystem:
     
     def create_stats_cards(self):
         """Créer les cartes de statistiques modernes"""
-        students_count = len(self.data_manager.get_all_students())
-        teachers_count = len(self.data_manager.get_all_teachers())
-        classes_count = len(self.data_manager.get_all_classes())
+        students_count = len(self.data_manager.get_all_students(shared=True))
+        teachers_count = len(self.data_manager.get_all_teachers(shared=True))
+        classes_count = len(self.data_manager.get_all_classes(shared=True))
         
         stats_data = [
             (str(students_count), "Élèves inscrits", "👥", "#4f8fea"),
@@ -404,14 +520,24 @@ class StudentRegistrationSystem:
         
         # En-tête
         header = ft.Container(
-            content=ft.Column([
+            content=ft.Row([
                 ft.Text(
                     "Inscription d'un élève",
                     size=28,
                     weight=ft.FontWeight.BOLD,
                     color="#1e293b"
+                ),
+                ft.ElevatedButton(
+                    "📥 Importer des élèves (CSV/Excel)",
+                    bgcolor="#059669",
+                    color="#ffffff",
+                    height=44,
+                    on_click=self.open_student_import_picker,
+                    style=ft.ButtonStyle(
+                        shape=ft.RoundedRectangleBorder(radius=8)
+                    )
                 )
-            ]),
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
             padding=ft.padding.all(32),
             bgcolor="#f8fafc"
         )
@@ -553,6 +679,18 @@ class StudentRegistrationSystem:
             disabled=not classes  # Désactiver si aucune classe n'existe
         )
         
+        # Photo de l'élève (facultative), enregistrée avec la fiche
+        self.photo_path = None
+        self.photo_display = ft.Container(
+            content=ft.Icon("person", size=48, color="#94a3b8"),
+            width=120,
+            height=120,
+            bgcolor="#f1f5f9",
+            border_radius=8,
+            alignment=ft.alignment.center
+        )
+        photo_button = ft.TextButton("Choisir une photo", icon="photo_camera", on_click=self.open_photo_picker)
+        
         # Bouton d'inscription
         submit_button = ft.ElevatedButton(
             "👤 Inscrire l'élève",
@@ -570,11 +708,12 @@ class StudentRegistrationSystem:
         form_card = ft.Card(
             content=ft.Container(
                 content=ft.Column([
-                    # Ligne ID - Champ ID déplacé vers le haut, aligné à droite
+                    # Ligne ID - Photo à gauche, champ ID aligné à droite
                     ft.Row([
-                        ft.Container(expand=1),  # Espace vide à gauche
+                        ft.Row([self.photo_display, photo_button], spacing=16),
+                        ft.Container(expand=1),
                         self.student_id_field  # Petit champ fixe à droite
-                    ]),
+                    ], vertical_alignment=ft.CrossAxisAlignment.START),
                     ft.Container(height=20),
                     
                     # Première ligne - Prénom et Nom
@@ -636,35 +775,70 @@ class StudentRegistrationSystem:
         
         return form_card
     
+    def open_photo_picker(self, e):
+        """Choisir la photo de l'élève (JPEG, PNG ou WebP)"""
+        if not hasattr(self, 'photo_picker') or self.photo_picker is None:
+            self.photo_picker = ft.FilePicker(
+                on_result=self.on_photo_selected,
+                on_upload=self.on_photo_upload
+            )
+            self.page.overlay.append(self.photo_picker)
+            self.page.update()
+        
+        self.photo_picker.pick_files(
+            dialog_title="Photo de l'élève",
+            file_type=ft.FilePickerFileType.CUSTOM,
+            allowed_extensions=["jpg", "jpeg", "png", "webp"]
+        )
+    
     def on_photo_selected(self, e: ft.FilePickerResultEvent):
-        """Gérer la sélection de photo"""
-        if e.files:
-            file = e.files[0]
-            # Copier le fichier vers le dossier photos
-            os.makedirs("photos/students", exist_ok=True)
-            
-            # Générer un nom unique pour la photo
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_extension = os.path.splitext(file.name)[1]
-            new_filename = f"student_{timestamp}{file_extension}"
-            new_path = f"photos/students/{new_filename}"
-            
-            try:
-                shutil.copy2(file.path, new_path)
-                self.photo_path = new_path
-                
-                # Afficher l'aperçu de la photo
-                self.photo_display.content = ft.Image(
-                    src=new_path,
-                    width=120,
-                    height=120,
-                    fit=ft.ImageFit.COVER,
-                    border_radius=8
-                )
-                self.page.update()
-                
-            except Exception as ex:
-                self.show_snackbar(f"Erreur lors du téléchargement de la photo: {str(ex)}", error=True)
+        """Gérer la sélection de photo : copie directe (bureau) ou envoi au serveur (web)"""
+        if not e.files:
+            return
+        file = e.files[0]
+        if file.path:
+            self.store_student_photo(file.path, file.name)
+            return
+        self.photo_picker.upload([
+            ft.FilePickerUploadFile(file.name, upload_url=self.page.get_upload_url(file.name, 600))
+        ])
+    
+    def on_photo_upload(self, e: ft.FilePickerUploadEvent):
+        """Fin de l'envoi de la photo (mode web)"""
+        if e.error:
+            self.show_snackbar(f"Erreur lors du téléchargement de la photo: {e.error}", error=True)
+            return
+        if e.progress is not None and e.progress < 1:
+            return
+        self.store_student_photo(os.path.join(UPLOAD_DIR, os.path.basename(e.file_name)), e.file_name)
+    
+    def store_student_photo(self, source_path, file_name):
+        """Copier la photo dans le dossier photos et l'afficher ; save_student enregistre son chemin"""
+        os.makedirs(PHOTOS_DIR, exist_ok=True)
+        
+        # Générer un nom unique pour la photo
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_extension = os.path.splitext(file_name)[1].lower()
+        new_path = os.path.join(PHOTOS_DIR, f"student_{timestamp}_{secrets.token_hex(4)}{file_extension}")
+        
+        try:
+            shutil.copy2(source_path, new_path)
+            with open(new_path, "rb") as f:
+                preview = base64.b64encode(f.read()).decode("ascii")
+        except Exception as ex:
+            self.show_snackbar(f"Erreur lors du téléchargement de la photo: {str(ex)}", error=True)
+            return
+        
+        self.photo_path = new_path
+        # Aperçu intégré : le dossier photos n'est pas servi en mode web
+        self.photo_display.content = ft.Image(
+            src_base64=preview,
+            width=120,
+            height=120,
+            fit=ft.ImageFit.COVER,
+            border_radius=8
+        )
+        self.page.update()
     
     def save_student(self, e):
         """Enregistrer un nouvel élève avec logs détaillés"""
@@ -712,27 +886,22 @@ class StudentRegistrationSystem:
         
         print("[LOG] Tous les champs obligatoires sont valides ✓")
         
-        # Générer l'ID avec la nouvelle méthode
-        print("[LOG] Génération de l'ID élève...")
-        student_id = self.data_manager.get_next_student_id()
-        print(f"[LOG] ID généré automatiquement: {student_id}")
-        
-        # Créer l'objet étudiant
+        # Créer l'objet étudiant (l'ID est attribué à l'enregistrement, voir register_student)
         print("[LOG] Construction des données de l'élève...")
         student_data = {
-            "id": student_id,
-            "student_id": student_id,  # ID séquentiel pour affichage
             "prenom": self.prenom_field.value.strip(),
             "nom": self.nom_field.value.strip(),
             "nom_complet": f"{self.prenom_field.value.strip()} {self.nom_field.value.strip()}",
             "date_naissance": self.dob_field.value,
             "lieu_naissance": self.lieu_naissance_field.value.strip(),
-            "numero_eleve": self.numero_eleve_field.value.strip() if self.numero_eleve_field.value else f"E{student_id:03d}",
+            "numero_eleve": self.numero_eleve_field.value.strip() if self.numero_eleve_field.value else "",
             "telephone_parent": self.telephone_parent_field.value.strip(),
             "genre": self.genre_dropdown.value,
             "classe": self.classe_dropdown.value,
             "date_creation": datetime.now().isoformat()
         }
+        if self.photo_path:
+            student_data["photo"] = self.photo_path
         
         print(f"[LOG] Données complètes de l'élève:")
         for key, value in student_data.items():
@@ -741,7 +910,8 @@ class StudentRegistrationSystem:
         # Sauvegarder l'élève
         print("[LOG] Tentative de sauvegarde dans la base de données...")
         try:
-            if self.data_manager.add_student(student_data):
+            student_id = self.data_manager.register_student(student_data)
+            if student_id is not None:
                 print(f"[LOG] SUCCESS: Élève inscrit avec succès - ID: {student_id}, Nom: {student_data['nom_complet']}")
                 self.show_snackbar("Élève inscrit avec succès!")
                 print("[LOG] Réinitialisation complète du formulaire...")
@@ -758,6 +928,157 @@ class StudentRegistrationSystem:
         
         print("=== FIN INSCRIPTION ÉLÈVE ===\n")
     
+    def open_data_file_picker(self, dialog_title, upload_title, on_file):
+        """Choisir un fichier CSV ou Excel ; on_file(chemin, nom) le traite une fois disponible
+        
+        En mode web, le fichier est d'abord envoyé dans le dossier uploads du
+        serveur, avec une boîte de progression intitulée upload_title.
+        """
+        if not hasattr(self, 'data_file_picker') or self.data_file_picker is None:
+            self.data_file_picker = ft.FilePicker(
+                on_result=self.on_data_file_selected,
+                on_upload=self.on_data_file_upload
+            )
+            self.page.overlay.append(self.data_file_picker)
+            self.page.update()
+        
+        self.data_file_request = (upload_title, on_file)
+        if not hasattr(self, 'data_file_uploads'):
+            # Envois en cours : nom du fichier -> (progression, traitement)
+            self.data_file_uploads = {}
+        self.data_file_picker.pick_files(
+            dialog_title=dialog_title,
+            file_type=ft.FilePickerFileType.CUSTOM,
+            allowed_extensions=["csv", "xlsx"]
+        )
+    
+    def on_data_file_selected(self, e: ft.FilePickerResultEvent):
+        """Fichier choisi : traitement direct (application de bureau) ou envoi au serveur (web)"""
+        if not e.files:
+            return
+        file = e.files[0]
+        upload_title, on_file = self.data_file_request
+        
+        if file.path:
+            on_file(file.path, file.name)
+            return
+        
+        # Mode web : le fichier est d'abord envoyé dans le dossier uploads du serveur
+        progress = self.open_progress_dialog(upload_title, f"Envoi du fichier {file.name}...")
+        self.data_file_uploads[file.name] = (progress, on_file)
+        self.data_file_picker.upload([
+            ft.FilePickerUploadFile(file.name, upload_url=self.page.get_upload_url(file.name, 600))
+        ])
+    
+    def on_data_file_upload(self, e: ft.FilePickerUploadEvent):
+        """Progression de l'envoi du fichier ; traitement lancé à la fin de l'envoi"""
+        upload = self.data_file_uploads.get(e.file_name)
+        if upload is None:
+            return
+        progress, on_file = upload
+        if e.error:
+            del self.data_file_uploads[e.file_name]
+            progress.close()
+            self.show_snackbar(f"Erreur lors de l'envoi du fichier: {e.error}", error=True)
+            return
+        if e.progress is not None and e.progress < 1:
+            progress.update(e.progress, 1, f"Envoi du fichier : {int(e.progress * 100)} %")
+            return
+        del self.data_file_uploads[e.file_name]
+        progress.close()
+        on_file(os.path.join(UPLOAD_DIR, os.path.basename(e.file_name)), e.file_name)
+    
+    def open_student_import_picker(self, e):
+        """Choisir le fichier d'élèves à importer (export CSV ou Excel)"""
+        self.open_data_file_picker("Fichier des élèves à importer", "Import des élèves", self.start_student_import)
+    
+    def start_student_import(self, path, file_name):
+        """Ouvrir la progression et importer le fichier dans un thread de fond"""
+        progress = self.open_progress_dialog(
+            "Import des élèves",
+            f"Lecture et validation de {file_name}"
+        )
+        self.page.run_thread(self.run_student_import, path, progress)
+    
+    def run_student_import(self, path, progress):
+        """Importer les élèves du fichier et afficher le rapport (thread de fond)"""
+        def on_progress(done, total, count):
+            progress.update(done, total, f"{count} ligne(s) lue(s) et validée(s)")
+        
+        try:
+            report = import_students(self.data_manager, path, progress=on_progress,
+                                     cancel_event=progress.cancel_event)
+        except StudentImportError as ex:
+            progress.close()
+            self.show_snackbar(str(ex), error=True)
+            return
+        except Exception as ex:
+            print(f"Erreur lors de l'import des élèves: {ex}")
+            progress.close()
+            self.show_snackbar("Erreur lors de l'import des élèves", error=True)
+            return
+        
+        progress.close()
+        if report is None:
+            self.show_snackbar("Import des élèves annulé", error=True)
+            return
+        
+        print(f"[LOG] Import des élèves : {report['imported']}/{report['total']} ligne(s) importée(s)")
+        if self.current_page == "student_registration":
+            # Prochain ID affiché dans le formulaire
+            self.show_student_registration()
+        self.show_student_import_report(report)
+    
+    def show_student_import_report(self, report):
+        """Afficher le rapport d'import : élèves inscrits et lignes rejetées"""
+        rejected = len(report["errors"])
+        content = [
+            ft.Text(f"{report['imported']} élève(s) inscrit(s) sur {report['total']} ligne(s)",
+                    size=16, weight=ft.FontWeight.BOLD, color="#059669"),
+        ]
+        
+        if rejected:
+            report_path = write_error_report(
+                report, os.path.join("rapports", f"import_eleves_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            )
+            content.append(ft.Text(f"{rejected} ligne(s) rejetée(s) — rapport complet : {report_path}",
+                                   size=14, color="#ef4444"))
+            error_rows = [
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(str(error["line"]), size=12)),
+                    ft.DataCell(ft.Text(error["nom"], size=12)),
+                    ft.DataCell(ft.Text(" ; ".join(error["errors"]), size=12))
+                ])
+                for error in report["errors"][:100]
+            ]
+            content.append(ft.Container(
+                content=ft.Column([
+                    ft.DataTable(
+                        columns=[
+                            ft.DataColumn(ft.Text("Ligne", weight=ft.FontWeight.BOLD)),
+                            ft.DataColumn(ft.Text("Élève", weight=ft.FontWeight.BOLD)),
+                            ft.DataColumn(ft.Text("Erreurs", weight=ft.FontWeight.BOLD))
+                        ],
+                        rows=error_rows
+                    )
+                ], scroll=ft.ScrollMode.AUTO),
+                height=300
+            ))
+            if rejected > len(error_rows):
+                content.append(ft.Text(f"... et {rejected - len(error_rows)} autre(s) ligne(s)",
+                                       size=12, color="#64748b"))
+        
+        def close_report(e):
+            self.page.close(self.student_import_dialog)
+        
+        self.student_import_dialog = ft.AlertDialog(
+            title=ft.Text("Rapport d'import des élèves", weight=ft.FontWeight.BOLD),
+            content=ft.Container(content=ft.Column(content, tight=True), width=650),
+            actions=[ft.TextButton("Fermer", on_click=close_report)],
+            modal=True
+        )
+        self.page.open(self.student_import_dialog)
+    
     def reset_form(self, e):
         """Réinitialiser le formulaire avec logs""" 
         print("[LOG] Réinitialisation des champs du formulaire...")
@@ -768,6 +1089,8 @@ class StudentRegistrationSystem:
         self.numero_eleve_field.value = ""
         self.telephone_parent_field.value = ""
         self.genre_dropdown.value = "Masculin"
+        self.photo_path = None
+        self.photo_display.content = ft.Icon("person", size=48, color="#94a3b8")
         
         # Correction spéciale pour le dropdown classe : réinitialiser complètement
         print("[LOG] Réinitialisation spéciale du dropdown classe...")
@@ -843,7 +1166,9 @@ class StudentRegistrationSystem:
                 ]),
                 ft.Container(height=20),
                 ft.Row([
-                    self.class_filter_dropdown
+                    self.class_filter_dropdown,
+                    ft.Container(expand=True),
+                    self.create_export_menu(self.export_students)
                 ])
             ]),
             padding=ft.padding.all(32),
@@ -869,109 +1194,50 @@ class StudentRegistrationSystem:
         self.page.update()
     
     def search_students(self, e):
-        """Rechercher des élèves par ID, nom, prénom ou nom complet"""
-        search_term = self.student_search_field.value.strip().lower() if self.student_search_field.value else ""
-        
-        # Si le terme de recherche est vide, afficher tous les élèves selon le filtre de classe actuel
-        if not search_term:
-            self.filter_students_by_class(None)
+        """Rechercher des élèves par ID, nom, prénom ou nom complet (saisie temporisée)"""
+        # Chaque frappe rend la recherche précédente obsolète : seule la dernière,
+        # lancée après une courte pause, met à jour le tableau
+        self.student_search_generation += 1
+        generation = self.student_search_generation
+        
+        if self.student_search_timer is not None:
+            self.student_search_timer.cancel()
+        self.student_search_timer = threading.Timer(0.25, self.run_student_search, args=(generation,))
+        self.student_search_timer.daemon = True
+        self.student_search_timer.start()
+    
+    def run_student_search(self, generation):
+        """Exécuter la recherche si aucune frappe plus récente n'est arrivée"""
+        if generation != self.student_search_generation:
             return
         
-        # Récupérer tous les élèves selon le filtre de classe actuel
-        selected_class = self.class_filter_dropdown.value if hasattr(self, 'class_filter_dropdown') else "Toutes les classes"
-        
-        if selected_class == "Toutes les classes":
-            all_students = self.data_manager.get_all_students()
-        else:
-            all_students = self.data_manager.get_students_by_class(selected_class)
-        
-        # Filtrer les élèves selon le terme de recherche
-        filtered_students = []
-        for student in all_students:
-            # Récupérer les champs de recherche
-            student_id = str(student.get("student_id", student.get("id", ""))).lower()
-            prenom = str(student.get("prenom", "")).lower()
-            nom = str(student.get("nom", "")).lower()
-            nom_complet = f"{prenom} {nom}".strip()
-            numero_eleve = str(student.get("numero_eleve", "")).lower()
-            
-            # Vérifier si le terme de recherche correspond à l'un des champs
-            if (search_term in student_id or 
-                search_term in prenom or 
-                search_term in nom or 
-                search_term in nom_complet or
-                search_term in numero_eleve):
-                filtered_students.append(student)
-        
-        # Trier les résultats par ID
-        def get_sort_key(student):
-            student_id = student.get("student_id", student.get("id", 0))
-            id_str = str(student_id)
-            import re
-            numbers = re.findall(r'\d+', id_str)
-            if numbers:
-                return int(numbers[0])
-            else:
-                return 0
-        
-        filtered_students.sort(key=get_sort_key)
-        
-        # Créer la table avec les résultats filtrés
-        students_table = self.create_filtered_students_table(filtered_students, selected_class)
-        self.students_table_container.content = students_table
-        
-        if hasattr(self, 'page') and self.page:
-            self.page.update()
+        # Une nouvelle recherche repart de la première page
+        self.students_page_index = 0
+        self.filter_students_by_class(None, generation)
     
-    def filter_students_by_class(self, e):
-        """Filtrer les élèves par classe sélectionnée"""
+    def filter_students_by_class(self, e, generation=None):
+        """Filtrer les élèves par classe sélectionnée (et par le terme de recherche actif)"""
+        # Changement de classe par l'utilisateur : revenir à la première page
+        if e is not None:
+            self.students_page_index = 0
+        
         selected_class = self.class_filter_dropdown.value if hasattr(self, 'class_filter_dropdown') else "Toutes les classes"
         
         # Vérifier s'il y a un terme de recherche actif
         search_term = ""
         if hasattr(self, 'student_search_field') and self.student_search_field.value:
-            search_term = self.student_search_field.value.strip().lower()
+            search_term = self.student_search_field.value.strip()
         
-        # Récupérer les élèves selon la classe sélectionnée
-        if selected_class == "Toutes les classes":
-            students = self.data_manager.get_all_students()
-        else:
-            students = self.data_manager.get_students_by_class(selected_class)
-        
-        # Appliquer le filtre de recherche si un terme de recherche est actif
-        if search_term:
-            filtered_students = []
-            for student in students:
-                # Récupérer les champs de recherche
-                student_id = str(student.get("student_id", student.get("id", ""))).lower()
-                prenom = str(student.get("prenom", "")).lower()
-                nom = str(student.get("nom", "")).lower()
-                nom_complet = f"{prenom} {nom}".strip()
-                numero_eleve = str(student.get("numero_eleve", "")).lower()
-                
-                # Vérifier si le terme de recherche correspond à l'un des champs
-                if (search_term in student_id or 
-                    search_term in prenom or 
-                    search_term in nom or 
-                    search_term in nom_complet or
-                    search_term in numero_eleve):
-                    filtered_students.append(student)
-            students = filtered_students
-        
-        # Trier les étudiants par ID avec gestion des différents formats
-        def get_sort_key(student):
-            student_id = student.get("student_id", student.get("id", 0))
-            # Convertir en chaîne puis extraire les chiffres pour le tri
-            id_str = str(student_id)
-            # Si l'ID contient des lettres (comme STU0001), extraire seulement les chiffres
-            import re
-            numbers = re.findall(r'\d+', id_str)
-            if numbers:
-                return int(numbers[0])  # Prendre le premier groupe de chiffres
-            else:
-                return 0  # Valeur par défaut si aucun chiffre trouvé
+        # Recherche dans l'index (triée par ID), limitée à la classe sélectionnée
+        students = self.data_manager.search_students(
+            search_term,
+            None if selected_class == "Toutes les classes" else selected_class,
+            shared=True
+        )
         
-        students.sort(key=get_sort_key)
+        # Une recherche plus récente a été lancée pendant celle-ci : abandonner
+        if generation is not None and generation != self.student_search_generation:
+            return
         
         # Créer la table avec scrollbars
         students_table = self.create_filtered_students_table(students, selected_class)
@@ -981,12 +1247,10 @@ class StudentRegistrationSystem:
             self.page.update()
     
     def create_filtered_students_table(self, students, selected_class):
-        """Créer la table des élèves filtrée avec scrollbars"""
-        
-        # Debug: afficher le nombre d'élèves reçus
-        print(f"[DEBUG] create_filtered_students_table - Nombre d'élèves reçus: {len(students) if students else 0}")
-        for i, student in enumerate(students or []):
-            print(f"[DEBUG] Élève {i}: ID={student.get('id')}, nom_complet={student.get('nom_complet')}")
+        """Créer la table des élèves filtrée avec scrollbars (une page à la fois)"""
+        # Conserver la liste filtrée complète pour la navigation entre pages
+        self.current_filtered_students = students or []
+        self.current_filtered_class = selected_class
         
         if not students:
             return ft.Card(
@@ -1017,9 +1281,16 @@ class StudentRegistrationSystem:
                 color="#ffffff"
             )
         
+        # Pagination côté serveur : seules les lignes de la page courante sont construites
+        page_size = self.students_page_size
+        total_pages = max(1, (len(students) + page_size - 1) // page_size)
+        self.students_page_index = max(0, min(self.students_page_index, total_pages - 1))
+        start = self.students_page_index * page_size
+        page_students = students[start:start + page_size]
+        
         # Créer les lignes du tableau avec gestion de la visibilité des colonnes
         rows = []
-        for student in students:
+        for student in page_students:
             student_id = student.get("student_id", student.get("id", ""))
             row_cells = []
             
@@ -1136,6 +1407,44 @@ class StudentRegistrationSystem:
             heading_row_color="#f8fafc"
         )
         
+        # Barre de pagination
+        pagination_bar = ft.Row([
+            ft.Text("Lignes par page :", size=12, color="#64748b"),
+            ft.Dropdown(
+                value=str(page_size),
+                options=[ft.dropdown.Option(str(size)) for size in (25, 50, 100, 200)],
+                width=90,
+                dense=True,
+                text_size=12,
+                border_radius=8,
+                on_change=self.change_students_page_size
+            ),
+            ft.Container(expand=True),
+            ft.Text(
+                f"{start + 1}-{start + len(page_students)} sur {len(students)}",
+                size=12,
+                color="#64748b"
+            ),
+            ft.IconButton(
+                icon="chevron_left",
+                tooltip="Page précédente",
+                disabled=self.students_page_index == 0,
+                on_click=lambda e: self.change_students_page(-1)
+            ),
+            ft.Text(
+                f"Page {self.students_page_index + 1} / {total_pages}",
+                size=12,
+                weight=ft.FontWeight.W_500,
+                color="#1e293b"
+            ),
+            ft.IconButton(
+                icon="chevron_right",
+                tooltip="Page suivante",
+                disabled=self.students_page_index >= total_pages - 1,
+                on_click=lambda e: self.change_students_page(1)
+            )
+        ], vertical_alignment=ft.CrossAxisAlignment.CENTER)
+        
         return ft.Card(
             content=ft.Container(
                 content=ft.Column([
@@ -1165,12 +1474,14 @@ class StudentRegistrationSystem:
                             scroll=ft.ScrollMode.ALWAYS,  # Scroll horizontal toujours visible
                             vertical_alignment=ft.CrossAxisAlignment.START
                         ),
-                        height=max(120, len(students) * 45 + 60),  # Hauteur dynamique sans limitation maximale
+                        height=max(120, len(page_students) * 45 + 60),  # Hauteur bornée par la taille de page
                         border_radius=8,
                         bgcolor="#ffffff",
                         border=ft.border.all(1, "#e2e8f0"),
                         clip_behavior=ft.ClipBehavior.HARD_EDGE
-                    )
+                    ),
+                    ft.Container(height=8),
+                    pagination_bar
                 ]),
                 padding=24
             ),
@@ -1179,6 +1490,23 @@ class StudentRegistrationSystem:
             color="#ffffff"
         )
     
+    def change_students_page(self, delta):
+        """Afficher la page précédente/suivante du tableau des élèves"""
+        self.students_page_index += delta
+        self.students_table_container.content = self.create_filtered_students_table(
+            self.current_filtered_students, self.current_filtered_class
+        )
+        self.page.update()
+    
+    def change_students_page_size(self, e):
+        """Changer le nombre d'élèves affichés par page"""
+        self.students_page_size = int(e.control.value)
+        self.students_page_index = 0
+        self.students_table_container.content = self.create_filtered_students_table(
+            self.current_filtered_students, self.current_filtered_class
+        )
+        self.page.update()
+    
     def show_column_settings_dialog(self, e):
         """Afficher le popup de paramètres des colonnes"""
         
@@ -2229,13 +2557,8 @@ class StudentRegistrationSystem:
                 self.show_snackbar("Format d'email invalide", error=True)
                 return
             
-            # Générer l'ID du professeur
-            teacher_id = self.data_manager.get_next_teacher_id()
-            
-            # Préparer les données du professeur
+            # Préparer les données du professeur (l'ID est attribué à l'enregistrement)
             teacher_data = {
-                "id": teacher_id,
-                "teacher_id": teacher_id,
                 "prenom": self.teacher_prenom_field.value.strip(),
                 "nom": self.teacher_nom_field.value.strip(),
                 "date_naissance": self.teacher_dob_field.value.strip(),
@@ -2250,7 +2573,7 @@ class StudentRegistrationSystem:
             }
             
             # Enregistrer le professeur
-            if self.data_manager.add_teacher(teacher_data):
+            if self.data_manager.register_teacher(teacher_data) is not None:
                 self.show_snackbar("Professeur inscrit avec succès!")
                 
                 # Réinitialiser le formulaire
@@ -3341,7 +3664,7 @@ class StudentRegistrationSystem:
         )
         
         # Charger les classes existantes
-        self.load_classes()
+        self.page.run_task(self.load_classes)
         
         # Contenu principal
         content = ft.Container(
@@ -3357,9 +3680,16 @@ class StudentRegistrationSystem:
         
         self.page.update()
     
-    def load_classes(self):
-        """Charger et afficher la liste des classes"""
-        classes = self.data_manager.get_all_classes()
+    async def load_classes(self):
+        """Charger et afficher la liste des classes (tâche asynchrone, voir page.run_task)"""
+        self.classes_list.controls.clear()
+        self.classes_list.controls.append(
+            ft.Container(content=ft.ProgressRing(), alignment=ft.alignment.center, padding=40)
+        )
+        self.page.update()
+        
+        classes = await self.async_data.get_all_classes()
+        class_counts = await self.async_data.get_class_counts()
         self.classes_list.controls.clear()
         
         if not classes:
@@ -3392,9 +3722,11 @@ class StudentRegistrationSystem:
             self.classes_list.controls.append(empty_message)
         else:
             for classe in classes:
-                student_count = self.data_manager.get_students_count_in_class(classe.get("nom", ""))
+                student_count = class_counts.get(classe.get("nom", ""), 0)
                 class_card = self.create_class_card(classe, student_count)
                 self.classes_list.controls.append(class_card)
+        
+        self.page.update()
     
     def create_class_card(self, classe, student_count):
         """Créer une carte pour une classe"""
@@ -3518,7 +3850,7 @@ class StudentRegistrationSystem:
             self.show_snackbar("Classe créée avec succès!")
             print("Classe sauvegardée, fermeture popup")
             self.page.close(self.create_class_dialog)
-            self.load_classes()  # Recharger la liste des classes
+            self.page.run_task(self.load_classes)  # Recharger la liste des classes
             self.page.update()
         else:
             self.show_snackbar("Une classe avec ce nom existe déjà", error=True)
@@ -3591,7 +3923,7 @@ class StudentRegistrationSystem:
             self.show_snackbar("Classe modifiée avec succès!")
             print("Classe modifiée, fermeture popup")
             self.page.close(self.edit_class_dialog)
-            self.load_classes()  # Recharger la liste des classes
+            self.page.run_task(self.load_classes)  # Recharger la liste des classes
             self.page.update()
         else:
             self.show_snackbar("Erreur lors de la modification", error=True)
@@ -3636,7 +3968,7 @@ class StudentRegistrationSystem:
             self.show_snackbar("Classe supprimée avec succès!")
             print("Classe supprimée, fermeture popup")
             self.page.close(self.delete_class_dialog)
-            self.load_classes()  # Recharger la liste des classes
+            self.page.run_task(self.load_classes)  # Recharger la liste des classes
             self.page.update()
         else:
             self.show_snackbar("Erreur lors de la suppression", error=True)
@@ -3720,7 +4052,26 @@ class StudentRegistrationSystem:
                         size=14,
                         color="#64748b",
                         text_align=ft.TextAlign.CENTER
-                    )
+                    ),
+                    ft.Container(height=24),
+                    ft.OutlinedButton(
+                        content=ft.Row([
+                            ft.Icon("calculate", color="#059669"),
+                            ft.Text("Calculer toutes les moyennes de l'établissement", color="#059669", weight=ft.FontWeight.BOLD)
+                        ], spacing=8, tight=True),
+                        on_click=self.show_school_averages_job,
+                        height=48,
+                        tooltip="Toutes les classes, les deux semestres et la moyenne annuelle"
+                    ),
+                    ft.Container(height=12),
+                    ft.Row([
+                        self.create_export_menu(self.export_school_grades, "Exporter toutes les notes"),
+                        self.create_bulletins_menu(
+                            lambda fmt, semester: self.start_bulletins(semester, "best_two", fmt),
+                            "Bulletins de l'établissement",
+                            semesters=True
+                        )
+                    ], alignment=ft.MainAxisAlignment.CENTER, spacing=12)
                 ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 padding=48
             ),
@@ -3742,6 +4093,279 @@ class StudentRegistrationSystem:
         
         self.page.update()
     
+    def open_progress_dialog(self, title, description):
+        """Ouvrir la boîte de progression d'une tâche et la retourner (ProgressDialog)
+        
+        La tâche de fond met à jour la barre via update(), consulte
+        cancel_event entre deux étapes et ferme la boîte avec close().
+        """
+        progress = ProgressDialog(self.page, title, description)
+        self.page.open(progress.dialog)
+        return progress
+    
+    def show_school_averages_job(self, e):
+        """Lancer le calcul groupé des moyennes de toutes les classes"""
+        progress = self.open_progress_dialog(
+            "Calcul des moyennes de l'établissement",
+            "Toutes les classes, premier et deuxième semestres, moyenne annuelle"
+        )
+        self.page.run_thread(self.run_school_averages_job, progress)
+    
+    def run_school_averages_job(self, progress):
+        """Calculer et enregistrer les moyennes de l'établissement (thread de fond)"""
+        # Empreintes relevées avant la lecture pour détecter les notes saisies pendant le calcul
+        classes = self.data_manager.get_all_classes(shared=True)
+        source_versions = self.data_manager.get_averages_source_versions([c.get("nom", "") for c in classes])
+        snapshot = build_school_snapshot(
+            classes,
+            self.data_manager.get_all_students(shared=True),
+            self.data_manager.get_all_subjects(shared=True),
+            self.data_manager.get_grade_columns(school_year=school_year_of())
+        )
+        
+        def on_progress(done, total):
+            progress.update(done, total, f"{done}/{total} calculs terminés")
+        
+        try:
+            records = compute_school_averages(snapshot, progress=on_progress,
+                                              cancel_event=progress.cancel_event)
+        except Exception as e:
+            print(f"Erreur lors du calcul groupé des moyennes: {e}")
+            progress.close()
+            self.show_snackbar("Erreur lors du calcul des moyennes", error=True)
+            return
+        
+        progress.close()
+        
+        if records is None:
+            self.show_snackbar("Calcul des moyennes annulé", error=True)
+        elif self.data_manager.save_school_averages(records, source_versions):
+            self.show_snackbar(f"Moyennes de {len(snapshot['classes'])} classe(s) enregistrées")
+        else:
+            self.show_snackbar("Erreur lors de l'enregistrement des moyennes", error=True)
+    
+    # Exports CSV / Excel
+    def create_export_menu(self, on_export, label="Exporter"):
+        """Bouton d'export avec le choix du format ; on_export(format) lance l'export"""
+        return ft.PopupMenuButton(
+            content=ft.Container(
+                content=ft.Row([
+                    ft.Icon("download", color="#ffffff"),
+                    ft.Text(label, color="#ffffff", weight=ft.FontWeight.BOLD)
+                ], spacing=8, tight=True),
+                bgcolor="#0ea5e9",
+                border_radius=8,
+                padding=ft.padding.symmetric(horizontal=20, vertical=12)
+            ),
+            tooltip="Exporter en CSV ou Excel",
+            items=[
+                ft.PopupMenuItem(text="CSV (.csv)", on_click=lambda e: on_export("csv")),
+                ft.PopupMenuItem(text="Excel (.xlsx)", on_click=lambda e: on_export("xlsx"))
+            ]
+        )
+    
+    def start_export(self, title, base_name, file_format, make_rows, total=None):
+        """Lancer un export en tâche de fond avec la boîte de progression
+        
+        make_rows() est appelé dans le thread de fond et renvoie le générateur
+        des lignes (en-tête compris) ; total est le nombre de lignes attendu.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in base_name)
+        file_name = f"{safe_name}_{timestamp}.{file_format}"
+        progress = self.open_progress_dialog(title, f"Fichier : {file_name}")
+        self.page.run_thread(self.run_export, make_rows, os.path.join(self.export_dir, file_name), total, title, progress)
+    
+    def run_export(self, make_rows, path, total, title, progress):
+        """Écrire le fichier d'export puis proposer le téléchargement (thread de fond)"""
+        def on_progress(done, expected):
+            progress.update(done, expected, f"{done} ligne(s) écrite(s)")
+        
+        try:
+            path = export_rows(make_rows(), path, total, on_progress, progress.cancel_event, sheet_title=title)
+        except ExportError as ex:
+            progress.close()
+            self.show_snackbar(str(ex), error=True)
+            return
+        except Exception as ex:
+            print(f"Erreur lors de l'export: {ex}")
+            progress.close()
+            self.show_snackbar("Erreur lors de l'export", error=True)
+            return
+        
+        progress.close()
+        if path is None:
+            self.show_snackbar("Export annulé", error=True)
+            return
+        self.show_export_ready(path)
+    
+    def remove_export(self, path):
+        """Supprimer un fichier d'export (téléchargé, abandonné ou expiré)"""
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Erreur lors de la suppression de l'export {path}: {e}")
+    
+    def show_export_ready(self, path):
+        """Boîte de fin d'export avec le lien de téléchargement
+        
+        Le fichier est servi depuis le répertoire secret de la session et
+        supprimé après EXPORT_TTL secondes, ou dès la fermeture de la boîte
+        sans téléchargement.
+        """
+        file_name = os.path.basename(path)
+        expiry = threading.Timer(EXPORT_TTL, self.remove_export, (path,))
+        expiry.daemon = True
+        expiry.start()
+        
+        def close_dialog(e):
+            expiry.cancel()
+            self.remove_export(path)
+            self.page.close(self.export_dialog)
+        
+        def download(e):
+            self.page.launch_url(f"/exports/{os.path.basename(self.export_dir)}/{quote(file_name)}")
+            self.page.close(self.export_dialog)
+        
+        self.export_dialog = ft.AlertDialog(
+            title=ft.Text("Export terminé", weight=ft.FontWeight.BOLD),
+            content=ft.Text(f"Le fichier {file_name} est prêt.", size=14, color="#1e293b"),
+            actions=[
+                ft.TextButton("Fermer", on_click=close_dialog),
+                ft.ElevatedButton("Télécharger", icon="download", bgcolor="#0ea5e9", color="#ffffff",
+                                  on_click=download)
+            ],
+            actions_alignment=ft.MainAxisAlignment.END
+        )
+        self.page.open(self.export_dialog)
+    
+    def export_students(self, file_format):
+        """Exporter la liste des élèves affichée (classe filtrée, colonnes visibles)"""
+        students = list(self.current_filtered_students)
+        selected_class = self.current_filtered_class
+        columns = student_columns(self.column_visibility, selected_class)
+        base_name = "eleves" if selected_class == "Toutes les classes" else f"eleves_{selected_class}"
+        self.start_export("Liste des élèves", base_name, file_format,
+                          lambda: student_rows(students, columns), len(students) + 1)
+    
+    def export_grade_sheet(self, subject, file_format):
+        """Exporter la feuille de notes de la matière affichée"""
+        class_name = self.current_class.get("nom", "")
+        semester = self.current_semester
+        num_devoirs = self.num_devoirs
+        
+        def make_rows():
+            students = self.data_manager.get_students_by_class(class_name)
+            return grade_sheet_rows(self.data_manager, students, subject.get("id", ""), semester, num_devoirs)
+        
+        self.start_export(f"Notes {subject.get('nom', '')}", f"notes_{class_name}_{subject.get('nom', '')}_{semester}",
+                          file_format, make_rows, self.data_manager.get_students_count_in_class(class_name) + 1)
+    
+    def export_school_grades(self, file_format):
+        """Exporter toutes les notes de l'établissement (une ligne par note)"""
+        def make_rows():
+            return school_grade_rows(
+                self.data_manager.get_all_grades(shared=True),
+                self.data_manager.get_all_students(shared=True),
+                self.data_manager.get_all_subjects(shared=True)
+            )
+        
+        self.start_export("Notes de l'établissement", "notes_etablissement", file_format, make_rows,
+                          len(self.data_manager.get_all_grades(shared=True)) + 1)
+    
+    def export_averages(self, classe, method, students_averages, file_format):
+        """Exporter le classement affiché par show_averages_results"""
+        ranking = sorted(students_averages, key=lambda x: x["general_average"], reverse=True)
+        base_name = f"moyennes_{classe.get('nom', '')}_{self.current_semester}_{method}"
+        self.start_export("Moyennes et classement", base_name, file_format,
+                          lambda: averages_rows(ranking), len(ranking) + 1)
+    
+    # Bulletins de notes
+    def create_bulletins_menu(self, on_generate, label="Bulletins", semesters=False):
+        """Bouton de génération des bulletins avec le choix du format (et du semestre)
+        
+        on_generate(format) est appelé, ou on_generate(format, semestre) avec semesters=True.
+        Le PDF est grisé si weasyprint n'est pas utilisable sur ce serveur.
+        """
+        if semesters:
+            items = [
+                ft.PopupMenuItem(
+                    text=f"{semester_name} ({file_format.upper()})",
+                    on_click=lambda e, f=file_format, s=semester: on_generate(f, s),
+                    disabled=file_format == "pdf" and not PDF_AVAILABLE
+                )
+                for semester, semester_name in (("premier", "Premier semestre"), ("deuxieme", "Deuxième semestre"))
+                for file_format in ("pdf", "html")
+            ]
+        else:
+            items = [
+                ft.PopupMenuItem(text="PDF", on_click=lambda e: on_generate("pdf"), disabled=not PDF_AVAILABLE),
+                ft.PopupMenuItem(text="HTML", on_click=lambda e: on_generate("html"))
+            ]
+        return ft.PopupMenuButton(
+            content=ft.Container(
+                content=ft.Row([
+                    ft.Icon("description", color="#ffffff"),
+                    ft.Text(label, color="#ffffff", weight=ft.FontWeight.BOLD)
+                ], spacing=8, tight=True),
+                bgcolor="#7c3aed",
+                border_radius=8,
+                padding=ft.padding.symmetric(horizontal=20, vertical=12)
+            ),
+            tooltip="Générer les bulletins de notes",
+            items=items
+        )
+    
+    def start_bulletins(self, semester, method, file_format, class_names=None):
+        """Générer les bulletins (une classe ou tout l'établissement) en tâche de fond"""
+        scope = class_names[0] if class_names and len(class_names) == 1 else "l'établissement"
+        progress = self.open_progress_dialog(
+            "Génération des bulletins",
+            f"Bulletins de {scope} - {'Premier' if semester == 'premier' else 'Deuxième'} semestre"
+        )
+        self.page.run_thread(self.run_bulletins, semester, method, file_format, class_names, progress)
+    
+    def run_bulletins(self, semester, method, file_format, class_names, progress):
+        """Générer les bulletins modifiés puis proposer l'archive ZIP (thread de fond)"""
+        def on_progress(done, total):
+            progress.update(done, total, f"{done}/{total} bulletin(s) générés")
+        
+        try:
+            report = generate_bulletins(self.data_manager, semester, method, class_names, file_format,
+                                        progress=on_progress, cancel_event=progress.cancel_event)
+            if report is not None and report["files"]:
+                progress.update(None, None, "Création de l'archive...")
+                base_name = class_names[0] if class_names and len(class_names) == 1 else "etablissement"
+                safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in base_name)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                archive = zip_bulletins(
+                    report["files"],
+                    os.path.join(self.export_dir, f"bulletins_{safe_name}_{semester}_{timestamp}.zip"),
+                    report["directory"]
+                )
+        except BulletinError as ex:
+            progress.close()
+            self.show_snackbar(str(ex), error=True)
+            return
+        except Exception as ex:
+            print(f"Erreur lors de la génération des bulletins: {ex}")
+            progress.close()
+            self.show_snackbar("Erreur lors de la génération des bulletins", error=True)
+            return
+        
+        progress.close()
+        if report is None:
+            self.show_snackbar("Génération des bulletins annulée", error=True)
+            return
+        if not report["files"]:
+            self.show_snackbar("Aucun bulletin : aucune moyenne calculable", error=True)
+            return
+        
+        print(f"[LOG] Bulletins : {report['generated']} générés, {report['skipped']} inchangés, "
+              f"{report['without_average']} élève(s) sans moyenne")
+        self.show_export_ready(archive)
+    
     def show_semester_classes(self, semester):
         """Afficher les classes du semestre sélectionné"""
         self.current_semester = semester
@@ -3856,10 +4480,10 @@ class StudentRegistrationSystem:
             )
             self.classes_grid.controls.append(empty_state)
         else:
+            class_counts = self.data_manager.get_class_counts()
             for classe in classes:
                 # Compter les élèves dans cette classe
-                students = self.data_manager.get_all_students()
-                student_count = len([s for s in students if s.get("classe") == classe.get("nom", "")])
+                student_count = class_counts.get(classe.get("nom", ""), 0)
                 
                 class_card = ft.Container(
                     content=ft.Column([
@@ -3980,7 +4604,7 @@ class StudentRegistrationSystem:
         self.calculation_method = calculation_method
         
         def select_class_for_averages(classe):
-            self.calculate_class_averages(classe, calculation_method)
+            self.page.run_task(self.calculate_class_averages, classe, calculation_method)
         
         # Modifier temporairement le comportement des cartes de classe
         self.temp_class_click_handler = select_class_for_averages
@@ -4048,13 +4672,17 @@ class StudentRegistrationSystem:
         
         self.page.update()
     
-    def calculate_class_averages(self, classe, method):
-        """Calculer les moyennes d'une classe selon la méthode choisie"""
+    async def calculate_class_averages(self, classe, method):
+        """Calculer les moyennes d'une classe selon la méthode choisie (tâche asynchrone annulable)"""
+        class_name = classe.get('nom', '')
+        progress = self.open_progress_dialog("Calcul des moyennes", f"Classe {class_name}")
+        cancel_event = progress.cancel_event
+        students_averages = None
+        
         try:
-            class_name = classe.get('nom', '')
-            
             # Récupérer tous les élèves de cette classe
-            all_students = self.data_manager.get_all_students()
+            progress.update(0, 3, "Chargement des élèves et des matières...")
+            all_students = await self.async_data.get_all_students(shared=True)
             students = [s for s in all_students if s.get("classe") == class_name]
             
             if not students:
@@ -4062,7 +4690,7 @@ class StudentRegistrationSystem:
                 return
             
             # Récupérer toutes les matières de cette classe pour le semestre actuel
-            all_subjects = self.data_manager.get_all_subjects()
+            all_subjects = await self.async_data.get_all_subjects(shared=True)
             subjects = [s for s in all_subjects 
                        if s.get("classe") == class_name and s.get("semestre") == self.current_semester]
             
@@ -4070,99 +4698,36 @@ class StudentRegistrationSystem:
                 self.show_snackbar("Aucune matière trouvée pour cette classe dans ce semestre", error=True)
                 return
             
-            # Calculer les moyennes
-            students_averages = []
+            # Résultats du dernier calcul groupé s'ils sont encore à jour
+            saved = await self.async_data.get_saved_averages(class_name, self.current_semester, method)
+            if saved is not None:
+                students_averages = saved["students_averages"]
+                return
             
-            for student in students:
-                student_id = student.get("student_id", student.get("id", ""))
-                student_name = f"{student.get('prenom', '')} {student.get('nom', '')}"
-                
-                somme_points_eleve = 0
-                somme_coef_eleve = 0
-                subject_details = []
-                
-                for subject in subjects:
-                    subject_id = subject.get("id", "")
-                    subject_name = subject.get("nom", "")
-                    coefficient = float(subject.get("coefficient", 1))
-                    
-                    # Récupérer les notes de l'élève pour cette matière
-                    grades = self.data_manager.get_student_subject_grades(student_id, subject_id)
-                    
-                    if not grades:
-                        continue  # Pas de notes pour cette matière
-                    
-                    # Séparer les devoirs et la composition
-                    homework_notes = []
-                    composition_note = None
-                    
-                    for grade in grades:
-                        grade_type = grade.get("type", "")
-                        grade_value = grade.get("note")
-                        
-                        if grade_value is not None and grade_value != "":
-                            try:
-                                grade_float = float(grade_value)
-                                if grade_type == "composition":
-                                    composition_note = grade_float
-                                elif grade_type.startswith("devoir"):
-                                    homework_notes.append(grade_float)
-                            except ValueError:
-                                continue
-                    
-                    # Calculer la moyenne de la matière selon la méthode
-                    if composition_note is not None and homework_notes:
-                        if method == "best_two":
-                            # Option 1: Utiliser les 2 meilleurs devoirs
-                            homework_notes.sort(reverse=True)  # Trier par ordre décroissant
-                            if len(homework_notes) >= 2:
-                                meilleur_devoir1 = homework_notes[0]
-                                meilleur_devoir2 = homework_notes[1]
-                                total_points = meilleur_devoir1 + meilleur_devoir2 + composition_note
-                                moyenne_matiere = total_points / 3
-                            elif len(homework_notes) == 1:
-                                # Si un seul devoir, utiliser celui-ci deux fois
-                                total_points = homework_notes[0] * 2 + composition_note
-                                moyenne_matiere = total_points / 3
-                            else:
-                                continue
-                        else:
-                            # Option 2: Utiliser tous les devoirs
-                            total_devoirs = sum(homework_notes)
-                            total_points = total_devoirs + composition_note
-                            denominateur = len(homework_notes) + 1  # +1 pour la composition
-                            moyenne_matiere = total_points / denominateur
-                        
-                        # Ajouter à la moyenne générale
-                        points_pondérés = moyenne_matiere * coefficient
-                        somme_points_eleve += points_pondérés
-                        somme_coef_eleve += coefficient
-                        
-                        subject_details.append({
-                            "name": subject_name,
-                            "average": round(moyenne_matiere, 2),
-                            "coefficient": coefficient,
-                            "homework_count": len(homework_notes)
-                        })
-                
-                # Calculer la moyenne générale
-                if somme_coef_eleve > 0:
-                    moyenne_generale_eleve = somme_points_eleve / somme_coef_eleve
-                    students_averages.append({
-                        "student_id": student_id,
-                        "name": student_name,
-                        "general_average": round(moyenne_generale_eleve, 2),
-                        "total_points": round(somme_points_eleve, 2),
-                        "total_coefficient": int(somme_coef_eleve),
-                        "subjects": subject_details
-                    })
-            
-            # Afficher les résultats
-            self.show_averages_results(classe, method, students_averages)
+            # Calculer les moyennes en une passe sur les notes de la classe
+            progress.update(1, 3, "Chargement des notes...")
+            grades = await self.async_data.get_grade_columns(
+                [s.get("id", "") for s in subjects], self.current_semester, school_year_of()
+            )
+            if cancel_event.is_set():
+                self.show_snackbar("Calcul des moyennes annulé", error=True)
+                return
+            
+            progress.update(2, 3, f"Calcul des moyennes de {len(students)} élève(s)...")
+            students_averages = await self.async_data.run(compute_class_averages, students, subjects, grades, method)
+            if cancel_event.is_set():
+                students_averages = None
+                self.show_snackbar("Calcul des moyennes annulé", error=True)
             
         except Exception as e:
             print(f"Erreur lors du calcul des moyennes: {e}")
             self.show_snackbar("Erreur lors du calcul des moyennes", error=True)
+        finally:
+            progress.close()
+        
+        # Afficher les résultats
+        if students_averages is not None:
+            self.show_averages_results(classe, method, students_averages)
     
     def show_averages_results(self, classe, method, students_averages):
         """Afficher les résultats du calcul des moyennes"""
@@ -4193,7 +4758,14 @@ class StudentRegistrationSystem:
                             color="#64748b",
                             weight=ft.FontWeight.W_400
                         )
-                    ], expand=True)
+                    ], expand=True),
+                    self.create_export_menu(
+                        lambda fmt: self.export_averages(classe, method, students_averages, fmt)
+                    ) if students_averages else ft.Container(),
+                    ft.Container(width=12),
+                    self.create_bulletins_menu(
+                        lambda fmt: self.start_bulletins(self.current_semester, method, fmt, [classe.get("nom", "")])
+                    ) if students_averages else ft.Container()
                 ])
             ]),
             padding=ft.padding.all(32),
@@ -4245,19 +4817,6 @@ class StudentRegistrationSystem:
             sorted_students = sorted(students_averages, key=lambda x: x["general_average"], reverse=True)
             
             for rank, student_data in enumerate(sorted_students, 1):
-                # Fonction pour déterminer la mention
-                def get_mention(average):
-                    if average >= 16:
-                        return "Très Bien"
-                    elif average >= 14:
-                        return "Bien"
-                    elif average >= 12:
-                        return "Assez Bien"
-                    elif average >= 10:
-                        return "Passable"
-                    else:
-                        return "Insuffisant"
-                
                 # Couleur selon la moyenne
                 avg = student_data["general_average"]
                 if avg >= 16:
@@ -4889,6 +5448,8 @@ class StudentRegistrationSystem:
                         height=48
                     ),
                     ft.Container(width=16),
+                    self.create_export_menu(lambda fmt: self.export_grade_sheet(subject, fmt)),
+                    ft.Container(width=16),
                     ft.ElevatedButton(
                         content=ft.Row([
                             ft.Icon("save", color="#ffffff"),
@@ -5009,9 +5570,10 @@ class StudentRegistrationSystem:
             )
             return
         
-        # Créer les lignes du tableau
+        # Créer les lignes du tableau (notes de l'année scolaire en cours)
         rows = []
         self.grade_fields = {}  # Stocker les références des champs
+        school_year = school_year_of()
         
         for student in students:
             student_id = student.get("student_id", student.get("id", ""))
@@ -5022,7 +5584,7 @@ class StudentRegistrationSystem:
             
             # Récupérer les notes existantes
             existing_grades = self.data_manager.get_student_subject_grades(
-                student_id, self.current_subject["id"]
+                student_id, self.current_subject["id"], self.current_semester, school_year
             )
             
             # Créer dictionnaire pour stocker les valeurs des devoirs
@@ -5158,8 +5720,9 @@ class StudentRegistrationSystem:
             self.grades_table_container.content = grades_table
     
     def save_all_grades(self, e):
-        """Sauvegarder toutes les notes du tableau"""
-        saved_count = 0
+        """Sauvegarder toutes les notes du tableau (année scolaire en cours)"""
+        grades_to_save = []
+        school_year = school_year_of()
         
         for student_id, fields in self.grade_fields.items():
             # Sauvegarder chaque type de note
@@ -5169,25 +5732,39 @@ class StudentRegistrationSystem:
                         note = float(field.value.strip())
                         if 0 <= note <= 20:  # Validation de la note
                             grade_data = {
-                                "id": f"{student_id}_{self.current_subject['id']}_{grade_type}",
+                                "id": grade_id(student_id, self.current_subject["id"], grade_type, school_year),
                                 "student_id": student_id,
                                 "subject_id": self.current_subject["id"],
                                 "subject_name": self.current_subject["nom"],
                                 "semester": self.current_semester,
                                 "type": grade_type,
                                 "note": note,
+                                "school_year": school_year,
                                 "date_creation": datetime.now().isoformat()
                             }
-                            
-                            if self.data_manager.add_grade(grade_data):
-                                saved_count += 1
+                            grades_to_save.append(grade_data)
                     except ValueError:
                         continue  # Ignorer les valeurs non numériques
         
-        if saved_count > 0:
-            self.show_snackbar(f"{saved_count} notes sauvegardées avec succès!")
-        else:
+        if not grades_to_save:
             self.show_snackbar("Aucune note valide à sauvegarder", error=True)
+            return
+        
+        self.page.run_task(self.save_grades, grades_to_save)
+    
+    async def save_grades(self, grades_to_save):
+        """Enregistrer les notes de la matière en une seule écriture, hors de la boucle d'événements"""
+        # Écriture atomique (comme upsert_grades) : toutes les notes de la matière ou aucune
+        try:
+            saved = await self.async_data.upsert_grades(grades_to_save)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des notes: {e}")
+            saved = False
+        
+        if saved:
+            self.show_snackbar(f"{len(grades_to_save)} notes sauvegardées avec succès!")
+        else:
+            self.show_snackbar("Erreur lors de la sauvegarde des notes", error=True)
     
     def show_subject_settings(self, subject):
         """Afficher la page des paramètres de matière pour gérer les élèves"""
@@ -5599,6 +6176,8 @@ class StudentRegistrationSystem:
                     color="#1e293b"
                 ),
                 ft.Row([
+                    self.create_timetable_menu(),
+                    ft.Container(width=12),
                     ft.ElevatedButton(
                         text="← Retour",
                         on_click=lambda e: self.show_schedule(),
@@ -5621,6 +6200,8 @@ class StudentRegistrationSystem:
         # Options pour les dropdowns
         class_options = [ft.dropdown.Option(key=cls['nom'], text=cls['nom']) for cls in classes]
         teacher_options = [ft.dropdown.Option(key=f"{t['prenom']} {t['nom']}", text=f"{t['prenom']} {t['nom']}") for t in teachers]
+        # ID des professeurs par nom affiché (recherche des créneaux libres)
+        self.teacher_ids_by_name = {f"{t['prenom']} {t['nom']}": t.get('teacher_id', t.get('id')) for t in teachers}
         
         # Créer les options d'horaires (07:00 à 19:30 par tranches de 30min)
         time_options = []
@@ -5645,6 +6226,7 @@ class StudentRegistrationSystem:
         
         self.day_dropdown = ft.Dropdown(
             label="Jour",
+            on_change=self.refresh_class_free_slots,
             options=[
                 ft.dropdown.Option(key="Lundi", text="Lundi"),
                 ft.dropdown.Option(key="Mardi", text="Mardi"),
@@ -5662,6 +6244,7 @@ class StudentRegistrationSystem:
         
         self.start_time_dropdown = ft.Dropdown(
             label="Début",
+            on_change=self.refresh_class_free_slots,
             options=time_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -5672,6 +6255,7 @@ class StudentRegistrationSystem:
         
         self.end_time_dropdown = ft.Dropdown(
             label="Fin",
+            on_change=self.refresh_class_free_slots,
             options=time_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -5682,6 +6266,7 @@ class StudentRegistrationSystem:
         
         self.teacher_dropdown = ft.Dropdown(
             label="Professeur",
+            on_change=self.refresh_class_free_slots,
             options=teacher_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -5722,6 +6307,9 @@ class StudentRegistrationSystem:
             width=150
         )
         
+        # Suggestions de créneaux libres (remplies par refresh_class_free_slots)
+        self.class_free_slots = ft.Row(wrap=True, spacing=8, run_spacing=8)
+        
         # Conteneur formulaire harmonisé
         form_container = ft.Card(
             content=ft.Container(
@@ -5754,7 +6342,10 @@ class StudentRegistrationSystem:
                                 padding=ft.padding.symmetric(horizontal=24, vertical=16)
                             )
                         )
-                    ])
+                    ]),
+                    ft.Container(height=16),
+                    # Troisième ligne: créneaux libres de la classe et du professeur
+                    self.class_free_slots
                 ]),
                 padding=28
             ),
@@ -5792,7 +6383,158 @@ class StudentRegistrationSystem:
         
         self.page.update()
     
+    def create_timetable_menu(self):
+        """Bouton de génération automatique de l'emploi du temps des classes"""
+        return ft.PopupMenuButton(
+            content=ft.Container(
+                content=ft.Row([
+                    ft.Icon("auto_awesome", color="#ffffff"),
+                    ft.Text("Générer", color="#ffffff", weight=ft.FontWeight.BOLD)
+                ], spacing=8, tight=True),
+                bgcolor="#4f46e5",
+                border_radius=8,
+                padding=ft.padding.symmetric(horizontal=20, vertical=12)
+            ),
+            tooltip="Construire automatiquement l'emploi du temps des classes",
+            items=[
+                ft.PopupMenuItem(
+                    text="Depuis un fichier de besoins horaires (CSV/Excel)",
+                    on_click=lambda e: self.open_data_file_picker(
+                        "Besoins horaires des classes", "Génération de l'emploi du temps",
+                        self.start_timetable_generation
+                    )
+                ),
+                ft.PopupMenuItem(
+                    text="Réorganiser l'emploi du temps actuel",
+                    on_click=lambda e: self.start_timetable_generation(None, None)
+                )
+            ]
+        )
+    
+    def start_timetable_generation(self, path, file_name):
+        """Lancer la génération de l'emploi du temps dans un thread de fond
+        
+        path : fichier des besoins horaires (Classe, Matière, Professeur, Heures,
+        Indisponibilités) ; None pour réorganiser les cours déjà saisis.
+        """
+        description = (f"Besoins horaires : {file_name}" if path
+                       else "Réorganisation des cours déjà saisis (sans conflit ni heure creuse)")
+        progress = self.open_progress_dialog("Génération de l'emploi du temps", description)
+        self.page.run_thread(self.run_timetable_generation, path, progress)
+    
+    def run_timetable_generation(self, path, progress):
+        """Calculer l'emploi du temps et proposer de l'enregistrer (thread de fond)"""
+        try:
+            teachers = self.data_manager.get_all_teachers()
+            schedules = self.data_manager.get_all_schedules()
+            if path:
+                data = read_requirements(path, teachers, [c.get("nom") for c in self.data_manager.get_all_classes()])
+            else:
+                data = {"requirements": requirements_from_schedule(schedules, teachers=teachers),
+                        "unavailable": {}, "errors": []}
+            
+            class_names = sorted({r["class_name"] for r in data["requirements"]})
+            if not class_names:
+                progress.close()
+                self.show_snackbar("Aucun besoin horaire à placer", error=True)
+                return
+            
+            result = generate_timetable(
+                data["requirements"],
+                unavailable=data["unavailable"],
+                fixed_slots=[s for s in schedules if s.get("class_name") not in class_names],
+                progress=progress.update,
+                cancel_event=progress.cancel_event
+            )
+        except TimetableError as ex:
+            progress.close()
+            self.show_snackbar(str(ex), error=True)
+            return
+        except Exception as ex:
+            print(f"Erreur lors de la génération de l'emploi du temps: {ex}")
+            progress.close()
+            self.show_snackbar("Erreur lors de la génération de l'emploi du temps", error=True)
+            return
+        
+        progress.close()
+        if result is None:
+            self.show_snackbar("Génération de l'emploi du temps annulée", error=True)
+            return
+        self.show_timetable_preview(class_names, result, data["errors"])
+    
+    def show_timetable_preview(self, class_names, result, errors):
+        """Résumé de l'emploi du temps généré, enregistré seulement après confirmation"""
+        statistics = result["statistics"]
+        content = [
+            ft.Text(f"{len(result['slots'])} créneau(x) pour {len(class_names)} classe(s)",
+                    size=16, weight=ft.FontWeight.BOLD, color="#059669"),
+            ft.Text(f"Heures creuses : {statistics['class_gaps']} pour les classes, "
+                    f"{statistics['teacher_gaps']} pour les professeurs",
+                    size=14, color="#1e293b"),
+            ft.Text("L'emploi du temps actuel de ces classes sera remplacé.", size=14, color="#64748b"),
+        ]
+        
+        if result["unplaced"]:
+            missing = sum(u["hours"] for u in result["unplaced"])
+            content.append(ft.Text(f"{missing} heure(s) n'ont pas pu être placées :", size=14, color="#ef4444"))
+            content.extend(
+                ft.Text(f"• {u['class_name']} - {u['subject']} ({u['teacher_name']}) : {u['hours']} h",
+                        size=12, color="#ef4444")
+                for u in result["unplaced"][:20]
+            )
+        
+        if errors:
+            report_path = write_error_report(
+                {"errors": errors},
+                os.path.join("rapports", f"besoins_horaires_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            )
+            content.append(ft.Text(f"{len(errors)} ligne(s) du fichier ignorée(s) — rapport : {report_path}",
+                                   size=14, color="#ef4444"))
+        
+        def close_preview(e):
+            self.page.close(self.timetable_dialog)
+        
+        def save_timetable(e):
+            self.page.close(self.timetable_dialog)
+            try:
+                saved = self.data_manager.replace_class_schedules(class_names, result["slots"])
+            except TimetableError as ex:
+                self.show_snackbar(f"Emploi du temps non enregistré: {ex}. Relancez la génération.", error=True)
+                return
+            if saved is None:
+                self.show_snackbar("Impossible d'enregistrer l'emploi du temps", error=True)
+                return
+            self.show_snackbar(f"✅ Emploi du temps enregistré pour {len(class_names)} classe(s)")
+            if self.current_page == "schedule" and getattr(self, 'selected_class', None):
+                self.load_class_schedule()
+        
+        self.timetable_dialog = ft.AlertDialog(
+            title=ft.Text("Emploi du temps généré", weight=ft.FontWeight.BOLD),
+            content=ft.Container(content=ft.Column(content, tight=True, scroll=ft.ScrollMode.AUTO), width=600),
+            actions=[
+                ft.TextButton("Annuler", on_click=close_preview),
+                ft.ElevatedButton(
+                    "Enregistrer",
+                    on_click=save_timetable,
+                    style=ft.ButtonStyle(bgcolor="#4f46e5", color="#ffffff")
+                )
+            ],
+            modal=True
+        )
+        self.page.open(self.timetable_dialog)
+    
     def create_schedule_grid(self):
+        """Afficher la grille d'emploi du temps des classes
+        
+        Le fond de la grille (horaires, jours, lignes) est construit une seule
+        fois par session puis réutilisé ; load_class_schedule n'y change que
+        les blocs de cours.
+        """
+        if getattr(self, 'class_schedule_grid', None) is None:
+            self.class_schedule_grid = self.build_schedule_grid()
+        self.schedule_grid_container.content = self.class_schedule_grid
+    
+    def build_schedule_grid(self):
         """Créer la grille d'emploi du temps - Style HTML professionnel"""
         
         # Jours de la semaine
@@ -5902,35 +6644,146 @@ class StudentRegistrationSystem:
             clip_behavior=ft.ClipBehavior.HARD_EDGE
         )
         
-        self.schedule_grid_container.content = schedule_grid
+        # Blocs de cours affichés : ID -> (signature, jour, bloc)
+        self.class_grid_blocks = {}
+        return schedule_grid
     
     def on_class_selected_new(self, e):
         """Quand une classe est sélectionnée dans la nouvelle interface"""
         self.selected_class = e.control.value
         self.load_class_schedule()
     
-    def load_class_schedule(self):
-        """Charger l'emploi du temps d'une classe"""
-        if not self.selected_class:
+    def fill_free_slot_suggestions(self, target, class_names, teachers, day, start_time, end_time, on_pick):
+        """Afficher dans target les créneaux où classes et professeurs sont tous libres
+        
+        La durée cherchée est celle du cours saisi (1 h par défaut), sur le jour
+        choisi ou toute la semaine ; chaque suggestion est alignée sur les
+        demi-heures des listes d'horaires et on_pick(jour, début, fin) remplit
+        le formulaire au clic.
+        """
+        duration = 60
+        if start_time and end_time and time_to_minutes(end_time) > time_to_minutes(start_time):
+            duration = time_to_minutes(end_time) - time_to_minutes(start_time)
+        
+        windows = self.data_manager.find_free_windows(
+            class_names, teachers, duration, days=[day] if day else None, day_start="08:00", day_end="19:00"
+        )
+        buttons = []
+        for window in windows:
+            start = -(-time_to_minutes(window["start_time"]) // 30) * 30
+            end = start + duration
+            if end > time_to_minutes(window["end_time"]):
+                continue
+            suggestion = (window["day"], f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}")
+            buttons.append(ft.OutlinedButton(
+                text=f"{suggestion[0]} {suggestion[1]}-{suggestion[2]}",
+                tooltip=f"Libre de {window['start_time']} à {window['end_time']}",
+                on_click=lambda e, s=suggestion: on_pick(*s)
+            ))
+            if len(buttons) == 12:
+                break
+        
+        label = f"Créneaux libres ({duration // 60}h{duration % 60:02d}) :" if buttons else "Aucun créneau libre commun"
+        target.controls = [ft.Text(label, size=13, color="#64748b")] + buttons
+    
+    def refresh_class_free_slots(self, e=None):
+        """Suggestions de créneaux libres pour la classe et le professeur du formulaire"""
+        if not getattr(self, 'selected_class', None) or not hasattr(self, 'class_free_slots'):
             return
+        teachers = []
+        if self.teacher_dropdown.value:
+            teacher_name = self.teacher_dropdown.value
+            teachers.append((self.teacher_ids_by_name.get(teacher_name), teacher_name))
+        
+        def pick(day, start_time, end_time):
+            self.day_dropdown.value = day
+            self.start_time_dropdown.value = start_time
+            self.end_time_dropdown.value = end_time
+            self.page.update()
         
-        # Effacer les cours existants
-        for day_stack in self.day_columns.values():
-            # Garder seulement le background (premier élément)
-            day_stack.controls = day_stack.controls[:1]
-        
-        # Récupérer les cours de cette classe
-        schedules = self.data_manager.get_schedule_by_class(self.selected_class)
+        self.fill_free_slot_suggestions(
+            self.class_free_slots, [self.selected_class], teachers, self.day_dropdown.value,
+            self.start_time_dropdown.value, self.end_time_dropdown.value, pick
+        )
+        if e is not None:
+            self.page.update()
+    
+    def refresh_teacher_free_slots(self, e=None):
+        """Suggestions de créneaux libres pour le professeur et la classe du formulaire"""
+        if not hasattr(self, 'teacher_free_slots'):
+            return
+        class_names = [self.teacher_class_dropdown.value] if self.teacher_class_dropdown.value else []
         
-        # Ajouter chaque cours à la grille
-        for schedule in schedules:
-            self.add_course_to_grid(schedule)
+        def pick(day, start_time, end_time):
+            self.teacher_day_dropdown.value = day
+            self.teacher_start_time_dropdown.value = start_time
+            self.teacher_end_time_dropdown.value = end_time
+            self.page.update()
         
-        self.page.update()
+        self.fill_free_slot_suggestions(
+            self.teacher_free_slots, class_names, [(self.current_teacher_id, self.current_teacher_name)],
+            self.teacher_day_dropdown.value, self.teacher_start_time_dropdown.value,
+            self.teacher_end_time_dropdown.value, pick
+        )
+        if e is not None:
+            self.page.update()
+    
+    def load_class_schedule(self):
+        """Charger l'emploi du temps d'une classe (seuls les blocs qui changent sont envoyés)"""
+        schedules = self.data_manager.get_schedule_by_class(self.selected_class) if self.selected_class else []
+        changed = self.sync_course_blocks(self.day_columns, self.class_grid_blocks, schedules,
+                                          self.create_course_block)
+        
+        self.refresh_class_free_slots()
+        self.update_controls(changed + [self.class_free_slots])
+    
+    def sync_course_blocks(self, day_columns, blocks, courses, create_block):
+        """Mettre à jour les blocs de cours d'une grille par différence, selon leur ID
+        
+        blocks associe l'ID de chaque cours affiché à (signature, jour, bloc) ;
+        les blocs des cours disparus ou modifiés sont retirés, ceux des cours
+        nouveaux ou modifiés créés avec create_block(cours), les autres restent
+        tels quels. Retourne les colonnes de jours modifiées.
+        """
+        wanted = {}
+        for course in courses:
+            if course.get('day') in day_columns:
+                signature = tuple(str(course.get(field, "")) for field in COURSE_BLOCK_FIELDS)
+                course_id = course.get('id')
+                wanted[signature if course_id is None else course_id] = (signature, course)
+        
+        changed = []
+        for course_id, (signature, day, block) in list(blocks.items()):
+            if wanted.get(course_id, (None,))[0] != signature:
+                day_columns[day].controls.remove(block)
+                del blocks[course_id]
+                if day_columns[day] not in changed:
+                    changed.append(day_columns[day])
+        
+        for course_id, (signature, course) in wanted.items():
+            if course_id in blocks:
+                continue
+            day = course.get('day')
+            block = create_block(course)
+            day_columns[day].controls.append(block)
+            blocks[course_id] = (signature, day, block)
+            if day_columns[day] not in changed:
+                changed.append(day_columns[day])
+        return changed
+    
+    def update_controls(self, controls):
+        """Envoyer seulement ces contrôles s'ils sont affichés, sinon mettre à jour la page
+        
+        Une grille réutilisée vient d'être rattachée à une nouvelle interface :
+        la mise à jour de la page n'envoie alors, elle aussi, que les différences.
+        """
+        if controls and all(control.page is not None for control in controls):
+            self.page.update(*controls)
+        else:
+            self.page.update()
     
-    def add_course_to_grid(self, course_data):
-        """Ajouter un bloc de cours à la grille avec options de modification/suppression"""
-        day = course_data.get('day')
+    def create_course_block(self, course_data):
+        """Bloc de cours de la grille avec options de modification/suppression"""
         start_time = course_data.get('start_time', '08:00')
         end_time = course_data.get('end_time', '09:00')
         subject = course_data.get('subject', '')
@@ -5938,9 +6791,6 @@ class StudentRegistrationSystem:
         course_color = course_data.get('color', '#4f46e5')  # Utiliser la couleur sauvegardée
         course_id = course_data.get('id')
         
-        if day not in self.day_columns:
-            return
-        
         # Calculer la position et la taille du bloc
         position = self.calculate_course_position(start_time, end_time)
         
@@ -5989,8 +6839,7 @@ class StudentRegistrationSystem:
             ink=True  # Effet de clic visuel
         )
         
-        # Ajouter le bloc à la colonne du jour
-        self.day_columns[day].controls.append(course_block)
+        return course_block
     
     def calculate_course_position(self, start_time, end_time):
         """Calculer la position d'un cours dans la grille"""
@@ -6228,7 +7077,8 @@ class StudentRegistrationSystem:
         teacher_cards = []
         for teacher in teachers:
             # Récupérer les matières enseignées par ce professeur
-            teacher_subjects = self.get_teacher_subjects(teacher.get('teacher_id', teacher.get('id')))
+            teacher_subjects = self.get_teacher_subjects(teacher.get('teacher_id', teacher.get('id')),
+                                                         f"{teacher.get('prenom', '')} {teacher.get('nom', '')}")
             subjects_text = ", ".join(teacher_subjects) if teacher_subjects else "Aucune matière assignée"
             
             card = ft.Card(
@@ -6328,19 +7178,9 @@ class StudentRegistrationSystem:
         self.schedule_main_container.content = interface
         self.page.update()
     
-    def get_teacher_subjects(self, teacher_id):
+    def get_teacher_subjects(self, teacher_id, teacher_name=None):
         """Récupérer les matières enseignées par un professeur basé sur son emploi du temps"""
-        schedules = self.data_manager.get_all_schedules()
-        subjects = set()
-        
-        for schedule in schedules:
-            if schedule.get('teacher_id') == teacher_id or \
-               (schedule.get('teacher_name') and teacher_id and str(teacher_id) in str(schedule.get('teacher_name', ''))):
-                subject = schedule.get('subject')
-                if subject:
-                    subjects.add(subject)
-        
-        return list(subjects)
+        return self.data_manager.get_teacher_subjects(teacher_id, teacher_name)
     
     def show_teacher_schedule_editor(self, teacher_id):
         """Afficher l'éditeur d'emploi du temps pour un professeur spécifique"""
@@ -6371,6 +7211,17 @@ class StudentRegistrationSystem:
                     )
                 ], spacing=4),
                 ft.Row([
+                    ft.ElevatedButton(
+                        text="Absence / remplaçants",
+                        icon="person_search",
+                        on_click=lambda e: self.show_substitutes_dialog(),
+                        style=ft.ButtonStyle(
+                            bgcolor="#4f46e5",
+                            color="#ffffff",
+                            padding=ft.padding.symmetric(horizontal=16, vertical=8)
+                        )
+                    ),
+                    ft.Container(width=12),
                     ft.ElevatedButton(
                         text="← Retour aux professeurs",
                         on_click=lambda e: self.show_teacher_schedule_interface(),
@@ -6413,6 +7264,94 @@ class StudentRegistrationSystem:
         self.load_teacher_schedule()
         self.page.update()
     
+    def show_substitutes_dialog(self):
+        """Remplaçants possibles du professeur affiché pour une date d'absence"""
+        date_field = ft.TextField(
+            label="Date d'absence (jj/mm/aaaa)",
+            value=datetime.now().strftime("%d/%m/%Y"),
+            bgcolor="#ffffff",
+            border_radius=8,
+            border_color="#e2e8f0",
+            focused_border_color="#4f46e5",
+            expand=True
+        )
+        results = ft.Column(spacing=12, scroll=ft.ScrollMode.AUTO)
+        
+        def search(e):
+            try:
+                affected = self.data_manager.find_substitutes(self.current_teacher_id, date_field.value)
+            except ValueError as ex:
+                date_field.error_text = str(ex)
+                self.page.update()
+                return
+            date_field.error_text = None
+            results.controls = self.substitutes_result_controls(affected)
+            self.page.update()
+        
+        def close_dialog(e):
+            self.page.close(self.substitutes_dialog)
+        
+        search(None)
+        self.substitutes_dialog = ft.AlertDialog(
+            title=ft.Text(f"Remplacement de {self.current_teacher_name}", weight=ft.FontWeight.BOLD),
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Row([
+                        date_field,
+                        ft.ElevatedButton(
+                            text="Rechercher",
+                            on_click=search,
+                            style=ft.ButtonStyle(bgcolor="#4f46e5", color="#ffffff")
+                        )
+                    ]),
+                    ft.Container(height=8),
+                    ft.Container(content=results, height=400)
+                ], tight=True),
+                width=650
+            ),
+            actions=[ft.TextButton("Fermer", on_click=close_dialog)],
+            modal=True
+        )
+        self.page.open(self.substitutes_dialog)
+    
+    def substitutes_result_controls(self, affected):
+        """Cours touchés par l'absence, chacun avec ses remplaçants classés"""
+        if not affected:
+            return [ft.Text("Aucun cours ce jour-là", size=14, color="#64748b")]
+        
+        controls = []
+        for entry in affected:
+            slot = entry["slot"]
+            lines = [ft.Text(
+                f"{slot.get('day', '')} {slot.get('start_time', '')}-{slot.get('end_time', '')} · "
+                f"{slot.get('class_name', '')} · {slot.get('subject', '')}",
+                size=15, weight=ft.FontWeight.BOLD, color="#1e293b"
+            )]
+            if not entry["candidates"]:
+                lines.append(ft.Text("Aucun professeur libre sur ce créneau", size=13, color="#ef4444"))
+            for rank, candidate in enumerate(entry["candidates"], 1):
+                reasons = []
+                if candidate["same_speciality"]:
+                    reasons.append("même matière")
+                elif candidate["teaches_subject"]:
+                    reasons.append("enseigne déjà cette matière")
+                if candidate["knows_class"]:
+                    reasons.append("connaît la classe")
+                reasons.append(f"{candidate['weekly_hours']:g} h/semaine")
+                lines.append(ft.Text(
+                    f"{rank}. {candidate['teacher_name']} ({candidate['matiere'] or 'matière non renseignée'}) — "
+                    + ", ".join(reasons),
+                    size=13,
+                    color="#059669" if candidate["same_speciality"] or candidate["teaches_subject"] else "#1e293b"
+                ))
+            controls.append(ft.Container(
+                content=ft.Column(lines, spacing=4),
+                padding=12,
+                border_radius=8,
+                bgcolor="#f8fafc"
+            ))
+        return controls
+    
     def create_teacher_course_form(self):
         """Créer le formulaire d'ajout de cours pour un professeur"""
         # Récupérer les classes disponibles
@@ -6431,6 +7370,7 @@ class StudentRegistrationSystem:
         # Dropdown pour la classe (remplace le dropdown professeur)
         self.teacher_class_dropdown = ft.Dropdown(
             label="Classe",
+            on_change=self.refresh_teacher_free_slots,
             options=class_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -6442,6 +7382,7 @@ class StudentRegistrationSystem:
         # Dropdown pour le jour
         self.teacher_day_dropdown = ft.Dropdown(
             label="Jour",
+            on_change=self.refresh_teacher_free_slots,
             options=[
                 ft.dropdown.Option(key="Lundi", text="Lundi"),
                 ft.dropdown.Option(key="Mardi", text="Mardi"),
@@ -6460,6 +7401,7 @@ class StudentRegistrationSystem:
         # Dropdowns pour les horaires
         self.teacher_start_time_dropdown = ft.Dropdown(
             label="Début",
+            on_change=self.refresh_teacher_free_slots,
             options=time_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -6470,6 +7412,7 @@ class StudentRegistrationSystem:
         
         self.teacher_end_time_dropdown = ft.Dropdown(
             label="Fin",
+            on_change=self.refresh_teacher_free_slots,
             options=time_options,
             bgcolor="#ffffff",
             border_radius=8,
@@ -6479,7 +7422,7 @@ class StudentRegistrationSystem:
         )
         
         # Champ matière (pré-rempli basé sur les matières du professeur)
-        teacher_subjects = self.get_teacher_subjects(self.current_teacher_id)
+        teacher_subjects = self.get_teacher_subjects(self.current_teacher_id, self.current_teacher_name)
         default_subject = teacher_subjects[0] if teacher_subjects else ""
         
         self.teacher_subject_field = ft.TextField(
@@ -6527,6 +7470,9 @@ class StudentRegistrationSystem:
             width=200
         )
         
+        # Suggestions de créneaux libres (remplies par refresh_teacher_free_slots)
+        self.teacher_free_slots = ft.Row(wrap=True, spacing=8, run_spacing=8)
+        
         # Conteneur formulaire EXACTEMENT identique aux classes
         form_container = ft.Card(
             content=ft.Container(
@@ -6557,7 +7503,10 @@ class StudentRegistrationSystem:
                                 padding=ft.padding.symmetric(horizontal=24, vertical=16)
                             )
                         )
-                    ])
+                    ]),
+                    ft.Container(height=16),
+                    # Troisième ligne: créneaux libres du professeur et de la classe
+                    self.teacher_free_slots
                 ]),
                 padding=28
             ),
@@ -6570,6 +7519,12 @@ class StudentRegistrationSystem:
         return form_container
     
     def create_teacher_schedule_grid(self):
+        """Grille d'emploi du temps des professeurs, construite une fois par session"""
+        if getattr(self, 'teacher_schedule_grid', None) is None:
+            self.teacher_schedule_grid = self.build_teacher_schedule_grid()
+        return self.teacher_schedule_grid
+    
+    def build_teacher_schedule_grid(self):
         """Créer la grille d'emploi du temps - EXACTEMENT identique aux classes"""
         
         # Jours de la semaine (identique aux classes)
@@ -6681,91 +7636,28 @@ class StudentRegistrationSystem:
             clip_behavior=ft.ClipBehavior.HARD_EDGE
         )
         
+        # Blocs de cours affichés : ID -> (signature, jour, bloc)
+        self.teacher_grid_blocks = {}
         return schedule_grid
     
     def load_teacher_schedule(self):
-        """Charger l'emploi du temps d'un professeur"""
-        # Vider les colonnes
-        for day_column in self.teacher_day_columns.values():
-            day_column.controls.clear()
-        
-        # Récupérer les cours du professeur
+        """Charger l'emploi du temps d'un professeur (seuls les blocs qui changent sont envoyés)"""
         teacher_schedules = self.data_manager.get_schedule_by_teacher(str(self.current_teacher_id))
+        changed = self.sync_course_blocks(self.teacher_day_columns, self.teacher_grid_blocks, teacher_schedules,
+                                          self.create_teacher_course_block)
         
-        # Ajouter chaque cours à la grille
-        for schedule in teacher_schedules:
-            self.add_teacher_course_to_grid(schedule)
-        
-        self.page.update()
+        self.refresh_teacher_free_slots()
+        self.update_controls(changed + [self.teacher_free_slots])
     
-    def add_teacher_course_to_grid(self, course_data):
-        """Ajouter un bloc de cours à la grille du professeur - EXACTEMENT identique aux classes"""
-        day = course_data.get('day')
+    def create_teacher_course_block(self, course_data):
+        """Bloc de cours de la grille du professeur (la classe en titre, la matière en dessous)"""
         start_time = course_data.get('start_time', '08:00')
         end_time = course_data.get('end_time', '09:00')
         class_name = course_data.get('class_name', '')  # Afficher la classe au lieu de la matière
         subject = course_data.get('subject', '')
-        color = course_data.get('color', '#4f46e5')
-        course_id = course_data.get('id', 0)
-        
-        if not day or day not in self.teacher_day_columns:
-            return
-        
-        # Calculer position avec la MÊME méthode que les classes
-        position = self.calculate_course_position(start_time, end_time)
-        
-        # Créer le bloc de cours - IDENTIQUE aux classes mais avec classe comme titre
-        course_block = ft.Container(
-            content=ft.Column([
-                ft.Text(
-                    class_name,  # Afficher la classe au lieu de la matière
-                    size=13,
-                    weight=ft.FontWeight.BOLD,
-                    color="#ffffff",
-                    text_align=ft.TextAlign.CENTER,
-                    max_lines=1,
-                    overflow=ft.TextOverflow.ELLIPSIS
-                ),
-                ft.Text(
-                    subject,  # Afficher la matière en sous-titre
-                    size=11,
-                    color="#ffffff",
-                    text_align=ft.TextAlign.CENTER,
-                    opacity=0.9,
-                    max_lines=1,
-                    overflow=ft.TextOverflow.ELLIPSIS
-                ),
-                ft.Text(
-                    f"{start_time}-{end_time}",
-                    size=10,
-                    color="#ffffff",
-                    text_align=ft.TextAlign.CENTER,
-                    opacity=0.8
-                )
-            ], 
-            spacing=2,
-            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-            alignment=ft.MainAxisAlignment.CENTER),
-            bgcolor=color,
-            border_radius=6,
-            padding=ft.padding.all(6),
-            margin=ft.margin.symmetric(horizontal=2),
-            on_click=lambda e: self.show_teacher_course_context_menu(e, course_id),
-            tooltip=f"{class_name} - {subject}\n{start_time} à {end_time}",
-            top=position['top'],
-            height=position['height'],
-            left=0,
-            right=0
-        )
-        
-        # Ajouter le bloc au Stack du jour
-        self.teacher_day_columns[day].controls.append(course_block)
         course_color = course_data.get('color', '#4f46e5')
         course_id = course_data.get('id')
         
-        if day not in self.teacher_day_columns:
-            return
-        
         # Calculer la position (même logique que pour les classes)
         position = self.calculate_course_position(start_time, end_time)
         
@@ -6814,8 +7706,7 @@ class StudentRegistrationSystem:
             ink=True
         )
         
-        # Ajouter le bloc à la colonne du jour
-        self.teacher_day_columns[day].controls.append(course_block)
+        return course_block
     
     def show_teacher_course_context_menu(self, e, course_id):
         """Afficher le menu contextuel pour un cours dans l'emploi du temps professeur"""
@@ -8015,4 +8906,6 @@ def main(page: ft.Page):
     app.main(page)
 
 if __name__ == "__main__":
-    ft.app(target=main, port=5000, view=ft.AppView.WEB_BROWSER)
+    # Les envois de fichiers du mode web exigent une clé secrète
+    os.environ.setdefault("FLET_SECRET_KEY", secrets.token_hex(16))
+    ft.app(target=main, port=5000, view=ft.AppView.WEB_BROWSER, upload_dir=UPLOAD_DIR, assets_dir=ASSETS_DIR)
@@ -0,0 +1,51 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from utils.data_manager import DataManager, get_shared_data_manager
+
+
+class AsyncDataManager:
+    """Façade asyncio du DataManager
+
+    Chaque méthode publique du DataManager est disponible sous forme de
+    coroutine (await async_data.get_all_students()) : l'appel bloquant est
+    exécuté dans un pool de threads borné, la boucle d'événements de Flet
+    reste libre pour les autres contrôles de la session.
+    """
+
+    def __init__(self, data_manager: DataManager, max_workers: int = 4):
+        self.data_manager = data_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="data-io")
+
+    async def run(self, func, *args, **kwargs):
+        """Exécuter une fonction bloquante quelconque dans le pool (calculs, exports...)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self.data_manager, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
+
+
+_shared_async_data_manager: Optional[AsyncDataManager] = None
+_shared_async_data_manager_lock = threading.Lock()
+
+
+def get_shared_async_data_manager() -> AsyncDataManager:
+    """Façade asynchrone du DataManager partagé, avec un pool commun à toutes les sessions"""
+    global _shared_async_data_manager
+    with _shared_async_data_manager_lock:
+        if _shared_async_data_manager is None:
+            _shared_async_data_manager = AsyncDataManager(get_shared_data_manager())
+        return _shared_async_data_manager
@@ -0,0 +1,294 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Iterable, Optional, Callable
+
+from utils.records import Grade, MISSING
+from utils.grade_store import GradeStore
+
+SEMESTERS = ["premier", "deuxieme"]
+AVERAGE_METHODS = ["best_two", "all"]
+
+# Instantané des données partagé par les processus de calcul (voir _init_worker)
+_snapshot: Optional[Dict] = None
+
+
+def get_mention(average: float) -> str:
+    """Mention correspondant à une moyenne sur 20"""
+    if average >= 16:
+        return "Très Bien"
+    elif average >= 14:
+        return "Bien"
+    elif average >= 12:
+        return "Assez Bien"
+    elif average >= 10:
+        return "Passable"
+    else:
+        return "Insuffisant"
+
+
+def subject_average(homework_notes: List[float], composition_note: Optional[float], method: str) -> Optional[float]:
+    """Moyenne d'une matière : devoirs retenus + composition, None si incalculable"""
+    if composition_note is None or not homework_notes:
+        return None
+
+    if method == "best_two":
+        # Option 1 : les 2 meilleurs devoirs (un seul devoir compte double)
+        best = sorted(homework_notes, reverse=True)[:2]
+        if len(best) == 1:
+            best = best * 2
+        return (best[0] + best[1] + composition_note) / 3
+
+    # Option 2 : tous les devoirs
+    return (sum(homework_notes) + composition_note) / (len(homework_notes) + 1)
+
+
+def build_grade_matrix(students: List[Dict], subjects: List[Dict], grades: Iterable[Dict]) -> List[List[Dict]]:
+    """Tableau dense élèves x matières des notes (devoirs et composition)
+
+    Chaque case vaut {"devoirs": [...], "composition": note ou None} ; les notes
+    sont lues une seule fois, quel que soit le nombre d'élèves et de matières.
+    Avec un GradeStore, les colonnes sont parcourues directement.
+    """
+    student_rows = {}
+    for i, student in enumerate(students):
+        student_rows[student.get("student_id", student.get("id", ""))] = i
+    subject_columns = {subject.get("id", ""): j for j, subject in enumerate(subjects)}
+
+    matrix = [[{"devoirs": [], "composition": None} for _ in subjects] for _ in students]
+
+    if isinstance(grades, GradeStore):
+        _fill_matrix_from_store(matrix, student_rows, subject_columns, grades)
+        return matrix
+
+    for grade in grades:
+        if isinstance(grade, Grade):
+            # Enregistrement typé : lecture directe des attributs (champ absent = MISSING)
+            student_id, subject_id = grade.student_id, grade.subject_id
+            grade_value, grade_type = grade.note, grade.type or ""
+        else:
+            student_id, subject_id = grade.get("student_id"), grade.get("subject_id")
+            grade_value, grade_type = grade.get("note"), grade.get("type") or ""
+
+        i = student_rows.get(student_id)
+        j = subject_columns.get(subject_id)
+        if i is None or j is None:
+            continue
+
+        if grade_value is None or grade_value is MISSING or grade_value == "":
+            continue
+        try:
+            grade_float = float(grade_value)
+        except (TypeError, ValueError):
+            continue
+
+        cell = matrix[i][j]
+        if grade_type == "composition":
+            cell["composition"] = grade_float
+        elif grade_type.startswith("devoir"):
+            cell["devoirs"].append(grade_float)
+
+    return matrix
+
+
+def _fill_matrix_from_store(matrix: List[List[Dict]], student_rows: Dict, subject_columns: Dict,
+                            store: GradeStore):
+    """Remplir le tableau élèves x matières en parcourant les colonnes du magasin"""
+    # Traduction des codes une fois par valeur distincte, pas une fois par note
+    rows = [student_rows.get(value) for value in store.students.values]
+    columns = [subject_columns.get(value) for value in store.subjects.values]
+    kinds = []
+    for value in store.types.values:
+        if value == "composition":
+            kinds.append("composition")
+        elif isinstance(value, str) and value.startswith("devoir"):
+            kinds.append("devoirs")
+        else:
+            kinds.append(None)
+
+    for student, subject, grade_type, note in zip(store.student, store.subject, store.type, store.note):
+        i = rows[student]
+        j = columns[subject]
+        kind = kinds[grade_type]
+        if i is None or j is None or kind is None or note != note:
+            continue
+        # float32 -> valeur saisie (au plus 4 décimales, précision float32 ~1e-6 sur 20)
+        note = round(note, 4)
+        cell = matrix[i][j]
+        if kind == "composition":
+            cell["composition"] = note
+        else:
+            cell["devoirs"].append(note)
+
+
+def compute_class_averages(students: List[Dict], subjects: List[Dict], grades: Iterable[Dict], method: str) -> List[Dict]:
+    """Calculer les moyennes d'une classe pour un semestre
+
+    Retourne la structure attendue par show_averages_results, triée par
+    moyenne décroissante, avec en plus le rang et la mention de chaque élève.
+    """
+    matrix = build_grade_matrix(students, subjects, grades)
+    coefficients = [float(subject.get("coefficient", 1)) for subject in subjects]
+    subject_names = [subject.get("nom", "") for subject in subjects]
+
+    students_averages = []
+    for student, row in zip(students, matrix):
+        somme_points_eleve = 0
+        somme_coef_eleve = 0
+        subject_details = []
+
+        for j, cell in enumerate(row):
+            moyenne_matiere = subject_average(cell["devoirs"], cell["composition"], method)
+            if moyenne_matiere is None:
+                continue
+
+            somme_points_eleve += moyenne_matiere * coefficients[j]
+            somme_coef_eleve += coefficients[j]
+            subject_details.append({
+                "name": subject_names[j],
+                "average": round(moyenne_matiere, 2),
+                "coefficient": coefficients[j],
+                "homework_count": len(cell["devoirs"])
+            })
+
+        if somme_coef_eleve > 0:
+            moyenne_generale_eleve = somme_points_eleve / somme_coef_eleve
+            students_averages.append({
+                "student_id": student.get("student_id", student.get("id", "")),
+                "name": f"{student.get('prenom', '')} {student.get('nom', '')}",
+                "general_average": round(moyenne_generale_eleve, 2),
+                "total_points": round(somme_points_eleve, 2),
+                "total_coefficient": int(somme_coef_eleve),
+                "subjects": subject_details
+            })
+
+    # Classement et mentions
+    students_averages.sort(key=lambda x: x["general_average"], reverse=True)
+    for rank, student_data in enumerate(students_averages, 1):
+        student_data["rank"] = rank
+        student_data["mention"] = get_mention(student_data["general_average"])
+
+    return students_averages
+
+
+def annual_averages(premier: List[Dict], deuxieme: List[Dict]) -> List[Dict]:
+    """Moyenne annuelle : moyenne des moyennes générales semestrielles disponibles"""
+    by_student: Dict = {}
+    for semester, averages in (("premier", premier), ("deuxieme", deuxieme)):
+        for student_data in averages:
+            entry = by_student.setdefault(student_data["student_id"], {
+                "student_id": student_data["student_id"],
+                "name": student_data["name"],
+                "total_points": 0,
+                "total_coefficient": 0,
+                "subjects": [],
+                "semester_averages": {}
+            })
+            entry["total_points"] = round(entry["total_points"] + student_data["total_points"], 2)
+            entry["total_coefficient"] += student_data["total_coefficient"]
+            entry["semester_averages"][semester] = student_data["general_average"]
+
+    annual = list(by_student.values())
+    for entry in annual:
+        semester_values = list(entry["semester_averages"].values())
+        entry["general_average"] = round(sum(semester_values) / len(semester_values), 2)
+
+    annual.sort(key=lambda x: x["general_average"], reverse=True)
+    for rank, entry in enumerate(annual, 1):
+        entry["rank"] = rank
+        entry["mention"] = get_mention(entry["general_average"])
+    return annual
+
+
+def build_school_snapshot(classes: List[Dict], students: List[Dict], subjects: List[Dict], grades) -> Dict:
+    """Regrouper une fois les données de l'établissement par classe et par matière
+
+    Les notes (liste ou GradeStore) sont gardées en colonnes : l'instantané
+    transmis aux processus de calcul ne contient pas un objet par note.
+    """
+    snapshot = {
+        "classes": list(dict.fromkeys(c.get("nom", "") for c in classes)),
+        "students": {},
+        "subjects": {},
+        "grades": grades if isinstance(grades, GradeStore) else GradeStore(grades)
+    }
+    for student in students:
+        snapshot["students"].setdefault(student.get("classe"), []).append(student)
+    for subject in subjects:
+        snapshot["subjects"].setdefault((subject.get("classe"), subject.get("semestre")), []).append(subject)
+    return snapshot
+
+
+def _init_worker(snapshot: Dict):
+    """Initialiser un processus de calcul avec l'instantané (transmis une seule fois)"""
+    global _snapshot
+    _snapshot = snapshot
+
+
+def _compute_task(task: tuple) -> tuple:
+    """Calculer les moyennes d'une classe pour un semestre et une méthode"""
+    class_name, semester, method = task
+    students = _snapshot["students"].get(class_name, [])
+    subjects = _snapshot["subjects"].get((class_name, semester), [])
+    store = _snapshot["grades"]
+    grades = store.subset(store.mask(subject_id=[s.get("id", "") for s in subjects], semester=semester))
+    return task, compute_class_averages(students, subjects, grades, method)
+
+
+def compute_school_averages(snapshot: Dict, methods: List[str] = AVERAGE_METHODS,
+                            progress: Optional[Callable[[int, int], None]] = None,
+                            cancel_event=None, max_workers: Optional[int] = None) -> Optional[List[Dict]]:
+    """Calculer les moyennes de toutes les classes, des deux semestres et de l'année
+
+    Les calculs par classe sont répartis sur un pool de processus qui partagent
+    le même instantané. progress(fait, total) est appelé après chaque calcul ;
+    si cancel_event est positionné, le travail s'arrête et None est retourné.
+    """
+    tasks = [(class_name, semester, method)
+             for class_name in snapshot["classes"]
+             for semester in SEMESTERS
+             for method in methods]
+    results = {}
+
+    if max_workers == 1:
+        # Calcul dans le processus courant (petits établissements, tests)
+        _init_worker(snapshot)
+        for done, task in enumerate(tasks, 1):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            results[task] = _compute_task(task)[1]
+            if progress:
+                progress(done, len(tasks))
+    else:
+        # spawn : pas de fork du serveur multi-thread ; l'instantané passe par l'initialiseur
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(snapshot,),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_compute_task, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return None
+                task, averages = future.result()
+                results[task] = averages
+                if progress:
+                    progress(done, len(tasks))
+
+    records = []
+    for class_name in snapshot["classes"]:
+        for method in methods:
+            for semester in SEMESTERS:
+                records.append({
+                    "id": f"{class_name}_{semester}_{method}",
+                    "class_name": class_name,
+                    "semester": semester,
+                    "method": method,
+                    "students_averages": results[(class_name, semester, method)]
+                })
+            records.append({
+                "id": f"{class_name}_annuel_{method}",
+                "class_name": class_name,
+                "semester": "annuel",
+                "method": method,
+                "students_averages": annual_averages(results[(class_name, "premier", method)],
+                                                     results[(class_name, "deuxieme", method)])
+            })
+    return records
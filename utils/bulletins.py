@@ -0,0 +1,355 @@
+import base64
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Dict, Optional, Callable
+
+from utils.averages import compute_class_averages, get_mention, AVERAGE_METHODS
+from utils.storage import school_year_of
+
+try:
+    import weasyprint
+except (ImportError, OSError):  # OSError : bibliothèques système (Pango) absentes
+    weasyprint = None
+
+# Format PDF proposé seulement si weasyprint est utilisable
+PDF_AVAILABLE = weasyprint is not None
+
+SCHOOL_NAME = "École Sans Base"
+BULLETINS_DIR = "bulletins"
+
+# À incrémenter quand la mise en page change : tous les bulletins sont regénérés
+TEMPLATE_VERSION = 1
+
+SEMESTER_NAMES = {"premier": "Premier semestre", "deuxieme": "Deuxième semestre"}
+METHOD_NAMES = {"best_two": "2 meilleurs devoirs", "all": "tous les devoirs"}
+
+PHOTO_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+class BulletinError(Exception):
+    """Génération des bulletins impossible (format ou dépendance manquante)"""
+
+
+def student_photo(student: Dict) -> Optional[str]:
+    """Photo de l'élève : chemin enregistré dans sa fiche à l'inscription, None s'il n'existe plus"""
+    photo = student.get("photo")
+    if photo and os.path.exists(photo):
+        return photo
+    return None
+
+
+def class_summary(students_averages: List[Dict]) -> Dict:
+    """Données de classe affichées sur chaque bulletin : l'effectif classé
+
+    La moyenne de la classe n'y figure pas volontairement : elle change à
+    chaque note saisie et obligerait à regénérer tous les bulletins.
+    """
+    return {"ranked": len(students_averages)}
+
+
+def bulletin_payload(student: Dict, student_averages: Dict, summary: Dict, class_name: str,
+                     semester: str, method: str, school_year: str) -> Dict:
+    """Données d'un bulletin (tout ce qui influence le rendu, sérialisable en JSON)"""
+    photo = student_photo(student)
+    return {
+        "school": SCHOOL_NAME,
+        "school_year": school_year,
+        "class_name": class_name,
+        "semester": semester,
+        "method": method,
+        "student": {
+            "id": student.get("student_id", student.get("id", "")),
+            "prenom": student.get("prenom", ""),
+            "nom": student.get("nom", ""),
+            "date_naissance": student.get("date_naissance", ""),
+            "lieu_naissance": student.get("lieu_naissance", ""),
+            "numero_eleve": student.get("numero_eleve", ""),
+            "genre": student.get("genre", "")
+        },
+        "photo": photo,
+        "photo_mtime": os.stat(photo).st_mtime_ns if photo else None,
+        "averages": student_averages,
+        "summary": summary
+    }
+
+
+def payload_fingerprint(payload: Dict) -> str:
+    """Empreinte des données d'un bulletin : inchangée = bulletin à jour"""
+    data = json.dumps([TEMPLATE_VERSION, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _photo_html(path: Optional[str], student: Dict) -> str:
+    """Photo intégrée au bulletin (data URI), ou initiales à défaut"""
+    if path:
+        try:
+            with open(path, "rb") as f:
+                data = base64.b64encode(f.read()).decode("ascii")
+            mime = PHOTO_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+            return f'<img class="photo" src="data:{mime};base64,{data}" alt="Photo">'
+        except OSError:
+            pass
+    initials = f"{str(student['prenom'])[:1]}{str(student['nom'])[:1]}".upper()
+    return f'<div class="photo initials">{html.escape(initials)}</div>'
+
+
+def render_bulletin_html(payload: Dict) -> str:
+    """Bulletin HTML autonome (styles et photo intégrés)"""
+    e = html.escape
+    student = payload["student"]
+    averages = payload["averages"]
+    summary = payload["summary"]
+
+    subject_rows = []
+    for subject in averages["subjects"]:
+        subject_rows.append(
+            "<tr>"
+            f"<td>{e(str(subject['name']))}</td>"
+            f"<td class=\"num\">{subject['coefficient']:g}</td>"
+            f"<td class=\"num\">{subject['average']:.2f}</td>"
+            f"<td class=\"num\">{subject['homework_count']}</td>"
+            f"<td>{e(get_mention(subject['average']))}</td>"
+            "</tr>"
+        )
+
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>Bulletin - {e(str(student['prenom']))} {e(str(student['nom']))}</title>
+<style>
+  @page {{ size: A4; margin: 15mm; }}
+  body {{ font-family: Arial, Helvetica, sans-serif; color: #1e293b; font-size: 12px; }}
+  .header {{ display: flex; justify-content: space-between; align-items: center;
+             border-bottom: 2px solid #4f46e5; padding-bottom: 8px; }}
+  .school {{ font-size: 20px; font-weight: bold; color: #4f46e5; }}
+  .title {{ text-align: center; font-size: 16px; font-weight: bold; margin: 16px 0; }}
+  .student {{ display: flex; gap: 16px; align-items: center; margin-bottom: 16px; }}
+  .photo {{ width: 90px; height: 90px; object-fit: cover; border-radius: 8px; border: 1px solid #e2e8f0; }}
+  .initials {{ display: flex; align-items: center; justify-content: center; font-size: 28px;
+               background: #f1f5f9; color: #64748b; }}
+  table {{ width: 100%; border-collapse: collapse; }}
+  th, td {{ border: 1px solid #e2e8f0; padding: 6px 8px; }}
+  th {{ background: #f8fafc; text-align: left; }}
+  .num {{ text-align: right; }}
+  .results td {{ font-weight: bold; }}
+  .footer {{ margin-top: 24px; color: #64748b; font-size: 10px; }}
+</style>
+</head>
+<body>
+<div class="header">
+  <div class="school">{e(payload['school'])}</div>
+  <div>Année scolaire {e(payload['school_year'])}<br>{e(SEMESTER_NAMES.get(payload['semester'], payload['semester']))}</div>
+</div>
+<div class="title">BULLETIN DE NOTES</div>
+<div class="student">
+  {_photo_html(payload['photo'], student)}
+  <div>
+    <div><strong>{e(str(student['prenom']))} {e(str(student['nom']))}</strong></div>
+    <div>ID : {e(str(student['id']))} &mdash; N° élève : {e(str(student['numero_eleve']))}</div>
+    <div>Né(e) le {e(str(student['date_naissance']))} à {e(str(student['lieu_naissance']))}</div>
+    <div>Classe : {e(payload['class_name'])}</div>
+  </div>
+</div>
+<table>
+  <tr><th>Matière</th><th class="num">Coefficient</th><th class="num">Moyenne /20</th><th class="num">Devoirs</th><th>Appréciation</th></tr>
+  {''.join(subject_rows)}
+  <tr class="results"><td>Total ({averages['total_points']:.2f} points)</td><td class="num">{averages['total_coefficient']}</td><td></td><td></td><td></td></tr>
+</table>
+<table style="margin-top: 16px;">
+  <tr><th>Moyenne générale</th><th>Rang</th><th>Mention</th></tr>
+  <tr class="results">
+    <td>{averages['general_average']:.2f}/20</td>
+    <td>{averages['rank']} / {summary['ranked']}</td>
+    <td>{e(averages['mention'])}</td>
+  </tr>
+</table>
+<div class="footer">Moyennes calculées avec {e(METHOD_NAMES.get(payload['method'], payload['method']))}.</div>
+</body>
+</html>
+"""
+
+
+def _write_atomic(path: str, write: Callable[[str], None]):
+    """Écrire un fichier sous un nom temporaire puis le renommer"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".bulletin-")
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def render_bulletin(task: tuple) -> str:
+    """Écrire un bulletin (HTML ou PDF) : tâche exécutée dans un processus de rendu"""
+    payload, path, file_format = task
+    document = render_bulletin_html(payload)
+
+    def write(temp_path):
+        if file_format == "pdf":
+            weasyprint.HTML(string=document).write_pdf(temp_path)
+        else:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(document)
+
+    _write_atomic(path, write)
+    return path
+
+
+def _class_averages(data_manager, class_name: str, semester: str, method: str, school_year: str) -> tuple:
+    """Élèves et moyennes d'une classe sur l'année : moyennes enregistrées si à jour, sinon un seul calcul"""
+    students = data_manager.get_students_by_class(class_name)
+    saved = data_manager.get_saved_averages(class_name, semester, method)
+    if saved is not None:
+        return students, saved["students_averages"]
+
+    subjects = [s for s in data_manager.get_all_subjects(shared=True)
+                if s.get("classe") == class_name and s.get("semestre") == semester]
+    grades = data_manager.get_grade_columns([s.get("id", "") for s in subjects], semester, school_year)
+    return students, compute_class_averages(students, subjects, grades, method)
+
+
+def _safe_name(name: str) -> str:
+    """Nom de fichier sans séparateurs de chemin ni espaces"""
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))
+
+
+def _load_manifest(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path: str, manifest: Dict):
+    def write(temp_path):
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    _write_atomic(path, write)
+
+
+def generate_bulletins(data_manager, semester: str, method: str = AVERAGE_METHODS[0],
+                       class_names: Optional[List[str]] = None, file_format: str = "pdf",
+                       output_dir: str = BULLETINS_DIR, force: bool = False,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       cancel_event=None, max_workers: Optional[int] = None) -> Optional[Dict]:
+    """Générer les bulletins d'une ou plusieurs classes (toutes par défaut)
+
+    Les moyennes de chaque classe sont calculées une seule fois (ou reprises
+    du calcul groupé enregistré) puis le rendu des bulletins est réparti sur
+    un pool de processus (PDF, ou max_workers précisé). Un manifeste garde l'empreinte des données de chaque
+    bulletin : seuls les bulletins dont les notes, le rang, la fiche élève ou
+    la photo ont changé sont regénérés (force=True : tous). progress(fait,
+    total) suit le rendu. Retourne {"generated", "skipped", "files",
+    "without_average", "directory"}, ou None si cancel_event est positionné.
+    """
+    if file_format not in ("pdf", "html"):
+        raise BulletinError(f"Format de bulletin non pris en charge: {file_format}")
+    if file_format == "pdf" and weasyprint is None:
+        raise BulletinError("La génération PDF nécessite weasyprint et ses bibliothèques système (Pango) ; "
+                            "choisissez le format HTML")
+
+    if class_names is None:
+        class_names = list(dict.fromkeys(c.get("nom", "") for c in data_manager.get_all_classes(shared=True)))
+    school_year = school_year_of()
+    directory = os.path.join(output_dir, school_year, f"{semester}_{method}")
+    manifest_path = os.path.join(directory, "manifest.json")
+    manifest = _load_manifest(manifest_path)
+
+    tasks = []
+    files = []
+    skipped = 0
+    without_average = 0
+    for class_name in class_names:
+        students, students_averages = _class_averages(data_manager, class_name, semester, method, school_year)
+        summary = class_summary(students_averages)
+        by_id = {s.get("student_id", s.get("id", "")): s for s in students}
+        without_average += len(by_id) - len(students_averages)
+
+        for student_averages in students_averages:
+            student = by_id.get(student_averages["student_id"])
+            if student is None:
+                continue
+            payload = bulletin_payload(student, student_averages, summary, class_name,
+                                       semester, method, school_year)
+            key = f"{class_name}/{payload['student']['id']}"
+            file_name = f"{payload['student']['id']}_{payload['student']['nom']}.{file_format}"
+            path = os.path.join(directory, _safe_name(class_name), _safe_name(file_name))
+            fingerprint = payload_fingerprint(payload)
+            files.append(path)
+
+            entry = manifest.get(key)
+            if (not force and entry is not None and entry.get("fingerprint") == fingerprint
+                    and entry.get("file") == path and os.path.exists(path)):
+                skipped += 1
+                continue
+            tasks.append(((payload, path, file_format), key, fingerprint))
+
+    done = 0
+    try:
+        # Le rendu HTML seul est trop léger pour amortir le démarrage d'un pool
+        if max_workers == 1 or len(tasks) <= 1 or (file_format == "html" and max_workers is None):
+            for task, key, fingerprint in tasks:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                render_bulletin(task)
+                _record_bulletin(manifest, key, fingerprint, task[1])
+                done += 1
+                if progress:
+                    progress(done, len(tasks))
+        else:
+            # spawn : pas de fork d'un serveur multi-thread (verrous tenus par d'autres threads)
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {executor.submit(render_bulletin, task): (task, key, fingerprint)
+                           for task, key, fingerprint in tasks}
+                for future in as_completed(futures):
+                    if cancel_event is not None and cancel_event.is_set():
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        return None
+                    task, key, fingerprint = futures[future]
+                    future.result()
+                    _record_bulletin(manifest, key, fingerprint, task[1])
+                    done += 1
+                    if progress:
+                        progress(done, len(tasks))
+    finally:
+        # Les bulletins déjà écrits restent à jour même en cas d'annulation
+        if done:
+            _save_manifest(manifest_path, manifest)
+
+    return {"generated": done, "skipped": skipped, "files": files,
+            "without_average": without_average, "directory": directory}
+
+
+def _record_bulletin(manifest: Dict, key: str, fingerprint: str, path: str):
+    """Noter un bulletin écrit ; l'ancien fichier du même format est supprimé si son nom a changé (élève renommé)"""
+    previous = (manifest.get(key) or {}).get("file")
+    if (previous and previous != path and os.path.splitext(previous)[1] == os.path.splitext(path)[1]
+            and os.path.exists(previous)):
+        os.remove(previous)
+    manifest[key] = {"fingerprint": fingerprint, "file": path,
+                     "generated_at": datetime.now().isoformat()}
+
+
+def zip_bulletins(files: List[str], path: str, base_dir: str) -> str:
+    """Rassembler des bulletins dans une archive ZIP (chemins relatifs à base_dir)"""
+    def write(temp_path):
+        with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file in files:
+                archive.write(file, os.path.relpath(file, base_dir))
+    _write_atomic(path, write)
+    return path
@@ -1,12 +1,29 @@
-import json
+import functools
 import os
+import threading
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from utils.storage import (StorageEngine, StaleVersionError, create_storage, copy_records,
+                           school_year_of, fill_grade_partition_fields)
+from utils.indexes import (GradeIndex, ClassCountIndex, StudentSearchIndex, IdAllocator,
+                           ScheduleIndex, AvailabilityIndex, TeacherLoadIndex, DigestIndex,
+                           time_to_minutes)
+from utils.locking import ReadWriteLock, reads, writes
+from utils.grade_store import GradeStore
+from utils.averages import SEMESTERS
+from utils.substitutes import substitutes_for_day, weekday_name
+from utils.timetable import teacher_clashes, TimetableError
+from utils.records import (RECORD_TYPES, to_record, Student, Teacher, SchoolClass, Subject,
+                           Grade, ScheduleSlot)
+
 class DataManager:
     """Gestionnaire de données pour l'application scolaire"""
     
-    def __init__(self):
+    # Nombre de tentatives d'une écriture dont la version lue est devenue obsolète
+    WRITE_ATTEMPTS = 5
+    
+    def __init__(self, storage: Optional[StorageEngine] = None):
         self.data_dir = "data"
         self.students_file = os.path.join(self.data_dir, "students.json")
         self.teachers_file = os.path.join(self.data_dir, "teachers.json")
@@ -18,340 +35,619 @@ class DataManager:
         self.homework_config_file = os.path.join(self.data_dir, "homework_config.json")
         self.subject_settings_file = os.path.join(self.data_dir, "subject_settings.json")
         
+        # Correspondance fichier historique -> collection du moteur de stockage
+        self._collections = {
+            self.students_file: "students",
+            self.teachers_file: "teachers",
+            self.classes_file: "classes",
+            self.grades_file: "grades",
+            self.subjects_file: "subjects",
+            self.attendance_file: "attendance",
+            self.schedule_file: "schedule",
+            self.homework_config_file: "homework_config",
+            self.subject_settings_file: "subject_settings"
+        }
+        
         self._ensure_data_directory()
-        self._initialize_files()
+        
+        # Moteur de stockage (JSON par défaut, SQLite via SCHOOL_STORAGE=sqlite)
+        self.storage = storage or create_storage(self.data_dir)
+        self.storage.initialize()
+        
+        # Index dérivés des collections : mis à jour à chaque écriture de
+        # DataManager, reconstruits si la collection a changé ailleurs
+        self._derived_indexes = {
+            "grades": {"collection": "grades", "factory": GradeIndex, "index": None, "version": None},
+            "grade_store": {"collection": "grades", "factory": GradeStore, "index": None, "version": None},
+            "class_counts": {"collection": "students", "factory": ClassCountIndex, "index": None, "version": None},
+            "student_search": {"collection": "students", "factory": StudentSearchIndex, "index": None, "version": None},
+            # Élèves : IDs à partir de 0, trous réutilisés ; professeurs : à partir de 1, jamais
+            # réutilisés car les créneaux d'emploi du temps gardent leur teacher_id
+            "student_ids": {"collection": "students", "index": None, "version": None,
+                            "factory": functools.partial(IdAllocator, fields=("id", "student_id"), start=0)},
+            "teacher_ids": {"collection": "teachers", "index": None, "version": None,
+                            "factory": functools.partial(IdAllocator, fields=("teacher_id", "id"), start=1,
+                                                         reuse_gaps=False)},
+            # Créneaux : intervalles en minutes par (classe, jour) et (professeur, jour)
+            "schedule": {"collection": "schedule", "factory": ScheduleIndex, "index": None, "version": None},
+            # Occupation par quarts d'heure des classes et des professeurs (plages libres)
+            "availability": {"collection": "schedule", "factory": AvailabilityIndex, "index": None, "version": None},
+            # Charge, matières, classes et créneaux de chaque professeur
+            "teacher_load": {"collection": "schedule", "factory": TeacherLoadIndex, "index": None, "version": None},
+            "schedule_ids": {"collection": "schedule", "index": None, "version": None,
+                             "factory": functools.partial(IdAllocator, start=1, reuse_gaps=False)},
+            # Empreintes des données d'où sont calculées les moyennes d'une classe et d'un semestre
+            "grade_digests": {"collection": "grades", "index": None, "version": None,
+                              "factory": functools.partial(DigestIndex, fields=("class_name", "school_year", "semester"))},
+            "subject_digests": {"collection": "subjects", "index": None, "version": None,
+                                "factory": functools.partial(DigestIndex, fields=("classe", "semestre"))},
+            "student_digests": {"collection": "students", "index": None, "version": None,
+                                "factory": functools.partial(DigestIndex, fields=("classe",))}
+        }
+        
+        # Lectures concurrentes, écritures exclusives (sessions web partageant l'instance)
+        self._lock = ReadWriteLock()
+        # Reconstruction d'un index dérivé pendant une lecture partagée
+        self._index_lock = threading.Lock()
     
     def _ensure_data_directory(self):
         """Créer le répertoire de données s'il n'existe pas"""
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs("photos/students", exist_ok=True)
     
-    def _initialize_files(self):
-        """Initialiser les fichiers de données avec des structures vides"""
-        files_to_init = [
-            self.students_file,
-            self.teachers_file,
-            self.classes_file,
-            self.grades_file,
-            self.subjects_file,
-            self.attendance_file,
-            self.schedule_file,
-            self.homework_config_file,
-            self.subject_settings_file
-        ]
-        
-        for file_path in files_to_init:
-            if not os.path.exists(file_path):
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump([], f, ensure_ascii=False, indent=2)
-    
-    def _load_data(self, file_path: str) -> List[Dict]:
-        """Charger les données depuis un fichier JSON"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+    def _load_data(self, file_path: str, shared: bool = False) -> List[Dict]:
+        """Charger une collection complète depuis le moteur de stockage
+        
+        Avec shared=True, la liste en cache est renvoyée telle quelle : elle est
+        partagée et ne doit pas être modifiée par l'appelant.
+        """
+        return self.storage.load(self._collections[file_path], shared)
+    
+    def _save_data(self, file_path: str, data: List[Dict], expected_version=None) -> bool:
+        """Sauvegarder une collection complète dans le moteur de stockage"""
+        return self.storage.save(self._collections[file_path], data, expected_version)
+    
+    def _write_with_retry(self, collection: str, attempt) -> bool:
+        """Exécuter une lecture-modification-écriture sous le verrou de la collection
+        
+        attempt(version) relit les données, les modifie et les écrit en passant
+        expected_version=version ; si un autre processus a écrit entre-temps,
+        l'écriture est refusée (StaleVersionError) et recommencée sur des
+        données fraîches au lieu d'écraser ses modifications.
+        """
+        for _ in range(self.WRITE_ATTEMPTS):
+            with self.storage.locked(collection):
+                try:
+                    return attempt(self.storage.version(collection))
+                except StaleVersionError:
+                    continue
+        print(f"Erreur lors de la sauvegarde: la collection {collection} est modifiée en continu par un autre processus")
+        return False
+    
+    def _modify_collection(self, file_path: str, modify) -> bool:
+        """Modifier une collection complète (modify(records) la change sur place)"""
+        def attempt(version):
+            records = self._load_data(file_path)
+            modify(records)
+            return self._save_data(file_path, records, expected_version=version)
+        return self._write_with_retry(self._collections[file_path], attempt)
+    
+    def _find_one(self, collection: str, key_value) -> Optional[Dict]:
+        """Récupérer un enregistrement par sa clé primaire"""
+        records = self.storage.find(collection, id=key_value)
+        return records[0] if records else None
+    
+    def _derived_index(self, name: str):
+        """Index dérivé à jour avec le stockage (reconstruit si nécessaire)"""
+        entry = self._derived_indexes[name]
+        with self._index_lock:
+            version = self.storage.version(entry["collection"])
+            if entry["index"] is None or entry["version"] != version:
+                entry["index"] = entry["factory"](self.storage.load(entry["collection"], shared=True))
+                entry["version"] = version
+            return entry["index"]
+    
+    def _records_written(self, collection: str, version_before, changes: List[tuple]):
+        """Répercuter des écritures (ancien, nouveau) sur les index dérivés de la collection
+        
+        Un index qui n'était pas à jour avant l'écriture est abandonné et sera
+        reconstruit à la prochaine lecture.
+        """
+        version_after = self.storage.version(collection)
+        for entry in self._derived_indexes.values():
+            if entry["collection"] != collection or entry["index"] is None:
+                continue
+            if entry["version"] != version_before:
+                entry["index"] = None
+                continue
+            for old, new in changes:
+                entry["index"].apply(old, self._stored_form(collection, new))
+            entry["version"] = version_after
+    
+    @staticmethod
+    def _stored_form(collection: str, record: Optional[Dict]):
+        """Copie d'un enregistrement écrit, sous la forme renvoyée par le stockage"""
+        if record is None:
+            return None
+        if collection in RECORD_TYPES:
+            return to_record(collection, record)
+        return copy_records(record)
+    
+    def _update_record(self, collection: str, key_value, changes: Dict) -> bool:
+        """Fusionner des modifications dans un enregistrement existant et l'écrire seul"""
+        changes["date_modification"] = datetime.now().isoformat()
+        
+        def attempt(version_before):
+            record = self._find_one(collection, key_value)
+            if record is None:
+                return False
+            
+            # Les enregistrements typés sont immuables : fusion dans un nouveau dict
+            old = record
+            record = dict(record)
+            record.update(changes)
+            
+            expected_version = version_before
+            if record.get("id") != key_value:
+                # L'ID a été modifié : retirer l'ancien enregistrement
+                if not self.storage.delete(collection, key_value, expected_version):
+                    return False
+                expected_version = self.storage.version(collection)
+            if not self.storage.upsert(collection, [record], expected_version):
+                return False
+            self._records_written(collection, version_before, [(old, record)])
+            return True
+        
+        return self._write_with_retry(collection, attempt)
+    
+    def _add_or_merge_record(self, collection: str, record_data: Dict) -> bool:
+        """Ajouter un enregistrement ou fusionner avec celui qui porte le même ID"""
+        def attempt(version_before):
+            record = record_data
+            existing = self._find_one(collection, record.get("id"))
+            old = existing
+            
+            if existing is not None:
+                merged = dict(existing)
+                merged.update(record)
+                merged["date_modification"] = datetime.now().isoformat()
+                record = merged
+            
+            if not self.storage.upsert(collection, [record], version_before):
+                return False
+            self._records_written(collection, version_before, [(old, record)])
+            return True
+        
+        return self._write_with_retry(collection, attempt)
+    
+    def _insert_record(self, collection: str, record_data: Dict) -> bool:
+        """Ajouter un enregistrement ; False si sa clé primaire existe déjà"""
+        record = dict(record_data)
+        record["date_creation"] = datetime.now().isoformat()
+        
+        def attempt(version_before):
+            # Vérification et écriture sous le même verrou et la même version
+            if self.storage.existing_keys(collection, [record.get("id")]):
+                return False
+            if not self.storage.upsert(collection, [record], version_before):
+                return False
+            self._records_written(collection, version_before, [(None, record)])
+            return True
+        
+        return self._write_with_retry(collection, attempt)
     
-    def _save_data(self, file_path: str, data: List[Dict]) -> bool:
-        """Sauvegarder les données dans un fichier JSON"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+    def _delete_record(self, collection: str, key_value) -> bool:
+        """Supprimer un enregistrement par sa clé primaire"""
+        def attempt(version_before):
+            old = self._find_one(collection, key_value)
+            if not self.storage.delete(collection, key_value, version_before):
+                return False
+            if old is not None:
+                self._records_written(collection, version_before, [(old, None)])
             return True
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde: {e}")
-            return False
+        
+        return self._write_with_retry(collection, attempt)
     
     # Gestion des étudiants
-    def get_all_students(self) -> List[Dict]:
-        """Récupérer tous les étudiants"""
-        return self._load_data(self.students_file)
+    @reads
+    def get_all_students(self, shared: bool = False) -> List[Student]:
+        """Récupérer tous les étudiants (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.students_file, shared)
     
-    def get_student(self, student_id: str) -> Optional[Dict]:
+    @reads
+    def get_student(self, student_id: str) -> Optional[Student]:
         """Récupérer un étudiant par son ID"""
-        students = self.get_all_students()
-        for student in students:
-            if student.get("id") == student_id:
-                return student
-        return None
+        return self._find_one("students", student_id)
     
+    @reads
     def get_next_student_id(self) -> int:
-        """Générer le prochain ID d'élève disponible"""
-        students = self.get_all_students()
-        
-        if not students:
-            return 0
-        
-        # Récupérer tous les IDs existants
-        existing_ids = []
-        for student in students:
-            student_id = student.get("id", student.get("student_id", 0))
-            try:
-                existing_ids.append(int(student_id))
-            except (ValueError, TypeError):
-                continue
-        
-        if not existing_ids:
-            return 0
-        
-        # Trouver le prochain ID disponible (gérer les trous)
-        existing_ids.sort()
-        
-        # Vérifier s'il y a des trous dans la séquence
-        for i in range(len(existing_ids)):
-            if i not in existing_ids:
-                return i
+        """Prochain ID d'élève disponible (affichage ; register_student l'attribue réellement)"""
+        return self._derived_index("student_ids").next_id()
+    
+    def _register_records(self, collection: str, allocator: str, records_data: List[Dict],
+                          id_fields: tuple, complete=None) -> Optional[List[Dict]]:
+        """Insérer de nouveaux enregistrements sous les prochains IDs libres, en une écriture
+        
+        Les IDs sont choisis et écrits sous le même verrou ; si un autre processus
+        a inscrit quelqu'un entre-temps, l'allocateur est reconstruit et
+        l'inscription recommencée avec de nouveaux IDs. complete(record) peut
+        compléter les champs qui dépendent de l'ID avant l'écriture.
+        """
+        registered = {}
+        
+        def attempt(version_before):
+            record_ids = self._derived_index(allocator).next_ids(len(records_data))
+            records = []
+            for record_id, record_data in zip(record_ids, records_data):
+                # Champs d'ID en tête, comme dans les enregistrements existants
+                record = {field: record_id for field in id_fields}
+                record.update((k, v) for k, v in record_data.items() if k not in id_fields)
+                if complete is not None:
+                    complete(record)
+                records.append(record)
+            if not self.storage.upsert(collection, records, version_before):
+                return False
+            self._records_written(collection, version_before, [(None, record) for record in records])
+            registered["records"] = records
+            return True
         
-        # Si pas de trous, retourner le suivant
-        return max(existing_ids) + 1
+        if not self._write_with_retry(collection, attempt):
+            return None
+        return registered["records"]
+    
+    def _register_record(self, collection: str, allocator: str, record_data: Dict,
+                         id_fields: tuple, complete=None) -> Optional[Dict]:
+        """Insérer un nouvel enregistrement sous le prochain ID libre"""
+        records = self._register_records(collection, allocator, [record_data], id_fields, complete)
+        return records[0] if records else None
+    
+    @staticmethod
+    def _complete_student(student: Dict):
+        """Numéro d'élève par défaut (E000) dérivé de l'ID attribué"""
+        if not student.get("numero_eleve"):
+            student["numero_eleve"] = f"E{student['id']:03d}"
+    
+    @writes
+    def register_student(self, student_data: Dict) -> Optional[int]:
+        """Inscrire un nouvel élève en lui attribuant le prochain ID libre
+        
+        Le numéro d'élève par défaut (E000) est dérivé de l'ID attribué.
+        Retourne l'ID attribué, None en cas d'échec.
+        """
+        student = self._register_record("students", "student_ids", student_data, ("id", "student_id"),
+                                        self._complete_student)
+        return student["id"] if student is not None else None
+    
+    @writes
+    def register_students(self, students_data: List[Dict]) -> Optional[List[int]]:
+        """Inscrire plusieurs élèves en une seule écriture (import groupé)
+        
+        Les IDs sont attribués d'un bloc, dans l'ordre de la liste.
+        Retourne les IDs attribués, None en cas d'échec.
+        """
+        if not students_data:
+            return []
+        students = self._register_records("students", "student_ids", students_data, ("id", "student_id"),
+                                          self._complete_student)
+        return [student["id"] for student in students] if students is not None else None
 
+    @writes
     def add_student(self, student_data: Dict) -> bool:
-        """Ajouter un nouvel étudiant"""
-        students = self.get_all_students()
-        
-        # Vérifier si l'ID existe déjà
-        for student in students:
-            if student.get("id") == student_data.get("id"):
-                # Mettre à jour l'étudiant existant
-                student.update(student_data)
-                student["date_modification"] = datetime.now().isoformat()
-                return self._save_data(self.students_file, students)
-        
-        # Ajouter un nouveau étudiant
-        students.append(student_data)
-        return self._save_data(self.students_file, students)
+        """Ajouter un nouvel étudiant (ou mettre à jour celui qui a le même ID)"""
+        return self._add_or_merge_record("students", student_data)
     
+    @writes
     def update_student(self, student_id: str, student_data: Dict) -> bool:
         """Mettre à jour un étudiant"""
-        students = self.get_all_students()
-        for i, student in enumerate(students):
-            if student.get("id") == student_id:
-                student_data["date_modification"] = datetime.now().isoformat()
-                students[i].update(student_data)
-                return self._save_data(self.students_file, students)
-        return False
+        return self._update_record("students", student_id, student_data)
     
+    @writes
     def delete_student(self, student_id: str) -> bool:
         """Supprimer un étudiant"""
-        students = self.get_all_students()
-        students = [s for s in students if s.get("id") != student_id]
-        return self._save_data(self.students_file, students)
+        return self._delete_record("students", student_id)
     
-    def get_students_by_class(self, class_name: str) -> List[Dict]:
+    @reads
+    def get_students_by_class(self, class_name: str) -> List[Student]:
         """Récupérer tous les étudiants d'une classe spécifique"""
-        students = self.get_all_students()
-        return [s for s in students if s.get("classe") == class_name]
+        return self.storage.find("students", classe=class_name)
+    
+    @reads
+    def search_students(self, query: str, class_name: Optional[str] = None, shared: bool = False) -> List[Student]:
+        """Rechercher des élèves par ID, prénom, nom, nom complet ou numéro (sans tenir compte des accents)
+        
+        Une requête vide renvoie tous les élèves (de la classe si précisée).
+        Les résultats sont triés par ID numérique ; shared=True : vue partagée en lecture seule.
+        """
+        results = self._derived_index("student_search").search(query, class_name)
+        return results if shared else [copy_records(s) for s in results]
     
     # Gestion des professeurs
-    def get_all_teachers(self) -> List[Dict]:
-        """Récupérer tous les professeurs"""
-        return self._load_data(self.teachers_file)
+    @reads
+    def get_all_teachers(self, shared: bool = False) -> List[Teacher]:
+        """Récupérer tous les professeurs (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.teachers_file, shared)
     
-    def get_teacher(self, teacher_id: str) -> Optional[Dict]:
+    @reads
+    def get_teacher(self, teacher_id: str) -> Optional[Teacher]:
         """Récupérer un professeur par son ID"""
-        teachers = self.get_all_teachers()
-        for teacher in teachers:
-            if teacher.get("id") == teacher_id:
-                return teacher
-        return None
+        return self._find_one("teachers", teacher_id)
     
+    @writes
     def add_teacher(self, teacher_data: Dict) -> bool:
-        """Ajouter un nouveau professeur"""
-        teachers = self.get_all_teachers()
-        
-        # Vérifier si l'ID existe déjà
-        for teacher in teachers:
-            if teacher.get("id") == teacher_data.get("id"):
-                # Mettre à jour le professeur existant
-                teacher.update(teacher_data)
-                teacher["date_modification"] = datetime.now().isoformat()
-                return self._save_data(self.teachers_file, teachers)
-        
-        # Ajouter un nouveau professeur
-        teachers.append(teacher_data)
-        return self._save_data(self.teachers_file, teachers)
+        """Ajouter un nouveau professeur (ou mettre à jour celui qui a le même ID)"""
+        return self._add_or_merge_record("teachers", teacher_data)
     
+    @writes
     def update_teacher(self, teacher_id: str, teacher_data: Dict) -> bool:
         """Mettre à jour un professeur"""
-        teachers = self.get_all_teachers()
-        for i, teacher in enumerate(teachers):
-            if teacher.get("id") == teacher_id:
-                teacher_data["date_modification"] = datetime.now().isoformat()
-                teachers[i].update(teacher_data)
-                return self._save_data(self.teachers_file, teachers)
-        return False
+        return self._update_record("teachers", teacher_id, teacher_data)
     
+    @writes
     def delete_teacher(self, teacher_id: str) -> bool:
         """Supprimer un professeur"""
-        teachers = self.get_all_teachers()
-        teachers = [t for t in teachers if t.get("id") != teacher_id]
-        return self._save_data(self.teachers_file, teachers)
+        return self._delete_record("teachers", teacher_id)
     
+    @reads
     def get_next_teacher_id(self) -> int:
-        """Obtenir le prochain ID de professeur disponible"""
-        teachers = self.get_all_teachers()
-        if not teachers:
-            return 1
-        
-        # Trouver l'ID le plus élevé et ajouter 1
-        max_id = 0
-        for teacher in teachers:
-            teacher_id = teacher.get("teacher_id", teacher.get("id", 0))
-            try:
-                current_id = int(teacher_id)
-                if current_id > max_id:
-                    max_id = current_id
-            except (ValueError, TypeError):
-                continue
-        
-        return max_id + 1
+        """Prochain ID de professeur disponible (affichage ; register_teacher l'attribue réellement)"""
+        return self._derived_index("teacher_ids").next_id()
+    
+    @writes
+    def register_teacher(self, teacher_data: Dict) -> Optional[int]:
+        """Inscrire un nouveau professeur sous le prochain ID ; retourne l'ID, None en cas d'échec"""
+        teacher = self._register_record("teachers", "teacher_ids", teacher_data, ("id", "teacher_id"))
+        return teacher["id"] if teacher is not None else None
     
     # Gestion des classes
-    def get_all_classes(self) -> List[Dict]:
-        """Récupérer toutes les classes"""
-        return self._load_data(self.classes_file)
+    @reads
+    def get_all_classes(self, shared: bool = False) -> List[SchoolClass]:
+        """Récupérer toutes les classes (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.classes_file, shared)
     
-    def get_class(self, class_id: str) -> Optional[Dict]:
+    @reads
+    def get_class(self, class_id: str) -> Optional[SchoolClass]:
         """Récupérer une classe par son ID"""
-        classes = self.get_all_classes()
-        for classe in classes:
-            if classe.get("id") == class_id:
-                return classe
-        return None
+        return self._find_one("classes", class_id)
     
+    @writes
     def add_class(self, class_data: Dict) -> bool:
-        """Ajouter une nouvelle classe"""
-        classes = self.get_all_classes()
-        
-        # Vérifier si l'ID existe déjà
-        for classe in classes:
-            if classe.get("id") == class_data.get("id"):
-                return False
-        
-        class_data["date_creation"] = datetime.now().isoformat()
-        classes.append(class_data)
-        return self._save_data(self.classes_file, classes)
+        """Ajouter une nouvelle classe (False si l'ID existe déjà)"""
+        return self._insert_record("classes", class_data)
     
+    @writes
     def update_class(self, class_id: str, class_data: Dict) -> bool:
         """Mettre à jour une classe"""
-        classes = self.get_all_classes()
-        for i, classe in enumerate(classes):
-            if classe.get("id") == class_id:
-                class_data["date_modification"] = datetime.now().isoformat()
-                classes[i].update(class_data)
-                return self._save_data(self.classes_file, classes)
-        return False
+        return self._update_record("classes", class_id, class_data)
     
+    @writes
     def delete_class(self, class_id: str) -> bool:
         """Supprimer une classe"""
-        classes = self.get_all_classes()
-        classes = [c for c in classes if c.get("id") != class_id]
-        return self._save_data(self.classes_file, classes)
+        return self._delete_record("classes", class_id)
     
+    @reads
     def get_students_count_in_class(self, class_name: str) -> int:
         """Récupérer le nombre d'élèves dans une classe"""
-        students = self.get_all_students()
-        return len([s for s in students if s.get("classe") == class_name])
+        return self._derived_index("class_counts").counts.get(class_name, 0)
+    
+    @reads
+    def get_class_counts(self) -> Dict[str, int]:
+        """Récupérer le nombre d'élèves de chaque classe en un seul appel"""
+        return dict(self._derived_index("class_counts").counts)
     
     # Gestion des matières
-    def get_all_subjects(self) -> List[Dict]:
-        """Récupérer toutes les matières"""
-        return self._load_data(self.subjects_file)
+    @reads
+    def get_all_subjects(self, shared: bool = False) -> List[Subject]:
+        """Récupérer toutes les matières (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.subjects_file, shared)
     
-    def get_subjects_by_semester(self, semester: str) -> List[Dict]:
+    @reads
+    def get_subjects_by_semester(self, semester: str) -> List[Subject]:
         """Récupérer les matières d'un semestre"""
-        subjects = self.get_all_subjects()
-        return [s for s in subjects if s.get("semestre") == semester]
+        return self.storage.find("subjects", semestre=semester)
     
+    @writes
     def add_subject(self, subject_data: Dict) -> bool:
-        """Ajouter une nouvelle matière"""
-        subjects = self.get_all_subjects()
-        
-        # Vérifier si l'ID existe déjà
-        for subject in subjects:
-            if subject.get("id") == subject_data.get("id"):
-                return False
-        
-        subject_data["date_creation"] = datetime.now().isoformat()
-        subjects.append(subject_data)
-        return self._save_data(self.subjects_file, subjects)
+        """Ajouter une nouvelle matière (False si l'ID existe déjà)"""
+        return self._insert_record("subjects", subject_data)
     
-    def get_subject(self, subject_id: str) -> Optional[Dict]:
+    @reads
+    def get_subject(self, subject_id: str) -> Optional[Subject]:
         """Récupérer une matière par son ID"""
-        subjects = self.get_all_subjects()
-        for subject in subjects:
-            if subject.get("id") == subject_id:
-                return subject
-        return None
+        return self._find_one("subjects", subject_id)
     
+    @writes
     def delete_subject(self, subject_id: str) -> bool:
         """Supprimer une matière"""
-        subjects = self.get_all_subjects()
-        subjects = [s for s in subjects if s.get("id") != subject_id]
-        return self._save_data(self.subjects_file, subjects)
+        return self._delete_record("subjects", subject_id)
     
     # Gestion des notes
-    def get_all_grades(self) -> List[Dict]:
-        """Récupérer toutes les notes"""
-        return self._load_data(self.grades_file)
+    def _get_grade_index(self) -> GradeIndex:
+        """Index des notes à jour avec le stockage"""
+        return self._derived_index("grades")
+    
+    @reads
+    def get_all_grades(self, shared: bool = False) -> List[Grade]:
+        """Récupérer toutes les notes (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.grades_file, shared)
     
+    @writes
     def add_grade(self, grade_data: Dict) -> bool:
         """Ajouter ou mettre à jour une note"""
-        grades = self.get_all_grades()
-        
-        # Vérifier si la note existe déjà
-        for i, grade in enumerate(grades):
-            if grade.get("id") == grade_data.get("id"):
-                # Mettre à jour la note existante
-                grade_data["date_modification"] = datetime.now().isoformat()
-                grades[i] = grade_data
-                return self._save_data(self.grades_file, grades)
-        
-        # Ajouter une nouvelle note
-        grade_data["date_creation"] = datetime.now().isoformat()
-        grades.append(grade_data)
-        return self._save_data(self.grades_file, grades)
-    
-    def get_student_grades(self, student_id: str) -> List[Dict]:
-        """Récupérer les notes d'un étudiant"""
-        grades = self.get_all_grades()
-        return [g for g in grades if g.get("student_id") == student_id]
+        return self.upsert_grades([grade_data])
+    
+    @writes
+    def upsert_grades(self, grades_data: List[Dict]) -> bool:
+        """Ajouter ou mettre à jour plusieurs notes en une seule écriture
+        
+        Les dicts de l'appelant ne sont pas modifiés : les notes écrites en
+        sont des copies complétées (dates, année scolaire, classe).
+        """
+        if not grades_data:
+            return True
+        
+        def attempt(version_before):
+            index = self._get_grade_index()
+            now = datetime.now().isoformat()
+            grades = []
+            changes = []
+            
+            for grade_data in grades_data:
+                grade = dict(grade_data)
+                old = index.by_id.get(grade.get("id"))
+                if old is not None:
+                    # Mettre à jour la note existante, dans sa partition d'origine
+                    grade["date_modification"] = now
+                    grade.setdefault("school_year", old.get("school_year"))
+                    grade.setdefault("class_name", old.get("class_name"))
+                else:
+                    # Ajouter une nouvelle note à l'année scolaire en cours
+                    grade["date_creation"] = now
+                    grade.setdefault("school_year", school_year_of(now))
+                grades.append(grade)
+                changes.append((old, grade))
+            
+            # Classe de la note (partition) d'après sa matière
+            missing = [g for g in grades if not g.get("school_year") or not g.get("class_name")]
+            if missing:
+                subject_ids = {g.get("subject_id") for g in missing}
+                subjects = [s for s in self.get_all_subjects(shared=True) if s.get("id") in subject_ids]
+                fill_grade_partition_fields(missing, subjects)
+            
+            if not self.storage.upsert("grades", grades, version_before):
+                return False
+            # Mise à jour incrémentale de l'index
+            self._records_written("grades", version_before, changes)
+            return True
+        
+        return self._write_with_retry("grades", attempt)
     
-    def get_student_subject_grades(self, student_id: str, subject_id: str) -> List[Dict]:
-        """Récupérer les notes d'un étudiant pour une matière spécifique"""
-        grades = self.get_all_grades()
-        return [g for g in grades if g.get("student_id") == student_id and g.get("subject_id") == subject_id]
+    @writes
+    def delete_grade(self, grade_id: str) -> bool:
+        """Supprimer une note"""
+        return self._delete_record("grades", grade_id)
     
-    def get_subject_grades(self, subject_id: str) -> List[Dict]:
+    @reads
+    def get_student_grades(self, student_id: str) -> List[Grade]:
+        """Récupérer les notes d'un étudiant"""
+        return self._get_grade_index().student_grades(student_id)
+    
+    @reads
+    def get_student_subject_grades(self, student_id: str, subject_id: str, semester: Optional[str] = None,
+                                   school_year: Optional[str] = None) -> List[Grade]:
+        """Récupérer les notes d'un étudiant pour une matière (et un semestre, une année scolaire si précisés)"""
+        grades = self._get_grade_index().student_subject_grades(student_id, subject_id, semester)
+        if school_year is not None:
+            grades = [g for g in grades if g.get("school_year") == school_year]
+        return grades
+    
+    @reads
+    def get_subject_grades(self, subject_id: str) -> List[Grade]:
         """Récupérer toutes les notes d'une matière"""
-        grades = self.get_all_grades()
-        return [g for g in grades if g.get("subject_id") == subject_id]
+        return self._get_grade_index().subject_grades(subject_id)
+    
+    @reads
+    def get_subjects_grades(self, subject_ids: List[str], semester: Optional[str] = None, shared: bool = False) -> List[Grade]:
+        """Récupérer les notes de plusieurs matières (shared=True : vue partagée en lecture seule)"""
+        index = self._get_grade_index()
+        grades = []
+        for subject_id in subject_ids:
+            for grade in index.by_subject.get(subject_id, {}).values():
+                if semester is None or grade.get("semester") == semester:
+                    grades.append(grade if shared else copy_records(grade))
+        return grades
+    
+    @reads
+    def get_grade_columns(self, subject_ids: Optional[List[str]] = None, semester: Optional[str] = None,
+                          school_year: Optional[str] = None) -> GradeStore:
+        """Notes en colonnes (GradeStore), éventuellement limitées à des matières, un semestre et une année
+        
+        Le résultat est une copie : il reste valable après de nouvelles écritures.
+        """
+        store = self._derived_index("grade_store")
+        return store.subset(store.mask(subject_id=subject_ids, semester=semester, school_year=school_year))
+    
+    # Moyennes enregistrées (calcul groupé de l'établissement)
+    @reads
+    def get_averages_source_version(self, class_name: str, semester: str) -> List[int]:
+        """Empreintes des élèves, matières et notes dont dépendent les moyennes d'une classe
+        
+        semester vaut "premier", "deuxieme" ou "annuel" (les deux semestres).
+        Seules les écritures touchant cette classe et ce semestre de l'année
+        scolaire en cours les modifient.
+        """
+        semesters = SEMESTERS if semester == "annuel" else [semester]
+        school_year = school_year_of()
+        subjects = self._derived_index("subject_digests")
+        grades = self._derived_index("grade_digests")
+        version = [self._derived_index("student_digests").digest(class_name)]
+        for name in semesters:
+            version += [subjects.digest(class_name, name), grades.digest(class_name, school_year, name)]
+        return version
+    
+    @reads
+    def get_averages_source_versions(self, class_names: List[str]) -> Dict[tuple, List[int]]:
+        """Empreintes de chaque (classe, semestre), semestres et année"""
+        return {(class_name, semester): self.get_averages_source_version(class_name, semester)
+                for class_name in class_names for semester in SEMESTERS + ["annuel"]}
+    
+    @writes
+    def save_school_averages(self, averages_records: List[Dict],
+                             source_versions: Optional[Dict[tuple, List[int]]] = None) -> bool:
+        """Remplacer les moyennes enregistrées par celles d'un calcul groupé
+        
+        source_versions doit être relevé avant la lecture des données du calcul
+        (get_averages_source_versions) pour que des notes saisies entre-temps
+        rendent périmées les moyennes de la classe concernée.
+        """
+        now = datetime.now().isoformat()
+        records = []
+        for record in averages_records:
+            key = (record.get("class_name"), record.get("semester"))
+            if source_versions is not None and key in source_versions:
+                source_version = source_versions[key]
+            else:
+                source_version = self.get_averages_source_version(*key)
+            records.append({**record, "computed_at": now, "source_version": source_version})
+        
+        def attempt(version_before):
+            return self.storage.save("averages", records, version_before)
+        
+        return self._write_with_retry("averages", attempt)
+    
+    @reads
+    def get_saved_averages(self, class_name: str, semester: str, method: str) -> Optional[Dict]:
+        """Récupérer les moyennes enregistrées d'une classe, None si absentes ou périmées"""
+        record = self._find_one("averages", f"{class_name}_{semester}_{method}")
+        if record is None or record.get("source_version") != self.get_averages_source_version(class_name, semester):
+            return None
+        return record
     
     # Gestion des présences
-    def get_all_attendance(self) -> List[Dict]:
-        """Récupérer toutes les présences"""
-        return self._load_data(self.attendance_file)
+    @reads
+    def get_all_attendance(self, shared: bool = False) -> List[Dict]:
+        """Récupérer toutes les présences (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.attendance_file, shared)
     
+    @writes
     def add_attendance(self, attendance_data: Dict) -> bool:
         """Ajouter une présence"""
-        attendance_records = self.get_all_attendance()
-        attendance_records.append(attendance_data)
-        return self._save_data(self.attendance_file, attendance_records)
+        return self._modify_collection(self.attendance_file,
+                                       lambda records: records.append(attendance_data))
     
+    @reads
     def get_student_attendance(self, student_id: str) -> List[Dict]:
         """Récupérer les présences d'un étudiant"""
-        attendance_records = self.get_all_attendance()
-        return [a for a in attendance_records if a.get("student_id") == student_id]
+        return self.storage.find("attendance", student_id=student_id)
     
     # Ancienne gestion de l'emploi du temps (remplacée par les nouvelles méthodes en fin de fichier)
     
     # Statistiques
+    @reads
     def get_statistics(self) -> Dict:
         """Récupérer les statistiques générales"""
-        students = self.get_all_students()
-        teachers = self.get_all_teachers()
-        classes = self.get_all_classes()
+        students = self.get_all_students(shared=True)
+        teachers = self.get_all_teachers(shared=True)
+        classes = self.get_all_classes(shared=True)
         
         # Compter les étudiants par classe
         students_by_class = {}
@@ -375,183 +671,252 @@ class DataManager:
         }
     
     # Gestion de la configuration des devoirs
+    @reads
     def get_homework_config(self, class_name: str, subject_id: str, semester: str) -> int:
         """Récupérer le nombre de devoirs configuré pour une classe+matière+semestre"""
-        configs = self._load_data(self.homework_config_file)
+        configs = self.storage.find("homework_config", class_name=class_name,
+                                    subject_id=subject_id, semester=semester)
         
-        for config in configs:
-            if (config.get("class_name") == class_name and 
-                config.get("subject_id") == subject_id and 
-                config.get("semester") == semester):
-                return config.get("num_homework", 2)  # Par défaut 2 devoirs
+        if configs:
+            return configs[0].get("num_homework", 2)  # Par défaut 2 devoirs
         
         return 2  # Par défaut 2 devoirs si pas de configuration
     
+    @writes
     def set_homework_config(self, class_name: str, subject_id: str, semester: str, num_homework: int) -> bool:
         """Définir le nombre de devoirs pour une classe+matière+semestre"""
-        configs = self._load_data(self.homework_config_file)
-        
-        # Vérifier si une configuration existe déjà
-        for i, config in enumerate(configs):
-            if (config.get("class_name") == class_name and 
-                config.get("subject_id") == subject_id and 
-                config.get("semester") == semester):
-                configs[i]["num_homework"] = num_homework
-                configs[i]["updated_at"] = datetime.now().isoformat()
-                return self._save_data(self.homework_config_file, configs)
-        
-        # Créer une nouvelle configuration
-        new_config = {
-            "class_name": class_name,
-            "subject_id": subject_id,
-            "semester": semester,
-            "num_homework": num_homework,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        configs.append(new_config)
-        return self._save_data(self.homework_config_file, configs)
+        def modify(configs):
+            # Vérifier si une configuration existe déjà
+            for i, config in enumerate(configs):
+                if (config.get("class_name") == class_name and 
+                    config.get("subject_id") == subject_id and 
+                    config.get("semester") == semester):
+                    configs[i]["num_homework"] = num_homework
+                    configs[i]["updated_at"] = datetime.now().isoformat()
+                    return
+            
+            # Créer une nouvelle configuration
+            new_config = {
+                "class_name": class_name,
+                "subject_id": subject_id,
+                "semester": semester,
+                "num_homework": num_homework,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat()
+            }
+            configs.append(new_config)
+        
+        return self._modify_collection(self.homework_config_file, modify)
     
     # Gestion des paramètres de matière par élève
+    @reads
     def get_student_subject_settings(self, class_name: str, subject_id: str, semester: str) -> Dict:
         """Récupérer les paramètres d'une matière pour tous les élèves d'une classe"""
-        settings_data = self._load_data(self.subject_settings_file)
+        settings_data = self.storage.find("subject_settings", class_name=class_name,
+                                          subject_id=subject_id, semester=semester)
         
         # Trouver les paramètres pour cette classe+matière+semestre
-        for settings in settings_data:
-            if (settings.get("class_name") == class_name and 
-                settings.get("subject_id") == subject_id and 
-                settings.get("semester") == semester):
-                return settings.get("student_settings", {})
+        if settings_data:
+            return settings_data[0].get("student_settings", {})
         
         return {}  # Retourner vide si aucun paramètre trouvé
     
+    @writes
     def save_student_subject_settings(self, class_name: str, subject_id: str, semester: str, student_settings: Dict) -> bool:
         """Sauvegarder les paramètres d'une matière pour tous les élèves d'une classe"""
-        settings_data = self._load_data(self.subject_settings_file)
-        
-        # Chercher s'il existe déjà des paramètres pour cette classe+matière+semestre
-        for i, settings in enumerate(settings_data):
-            if (settings.get("class_name") == class_name and 
-                settings.get("subject_id") == subject_id and 
-                settings.get("semester") == semester):
-                settings_data[i]["student_settings"] = student_settings
-                settings_data[i]["updated_at"] = datetime.now().isoformat()
-                return self._save_data(self.subject_settings_file, settings_data)
-        
-        # Créer de nouveaux paramètres
-        new_settings = {
-            "class_name": class_name,
-            "subject_id": subject_id,
-            "semester": semester,
-            "student_settings": student_settings,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        settings_data.append(new_settings)
-        return self._save_data(self.subject_settings_file, settings_data)
+        def modify(settings_data):
+            # Chercher s'il existe déjà des paramètres pour cette classe+matière+semestre
+            for i, settings in enumerate(settings_data):
+                if (settings.get("class_name") == class_name and 
+                    settings.get("subject_id") == subject_id and 
+                    settings.get("semester") == semester):
+                    settings_data[i]["student_settings"] = student_settings
+                    settings_data[i]["updated_at"] = datetime.now().isoformat()
+                    return
+            
+            # Créer de nouveaux paramètres
+            new_settings = {
+                "class_name": class_name,
+                "subject_id": subject_id,
+                "semester": semester,
+                "student_settings": student_settings,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat()
+            }
+            settings_data.append(new_settings)
+        
+        return self._modify_collection(self.subject_settings_file, modify)
     
     # Gestion des emplois du temps
-    def get_all_schedules(self) -> List[Dict]:
-        """Récupérer tous les emplois du temps"""
-        return self._load_data(self.schedule_file)
+    @reads
+    def get_all_schedules(self, shared: bool = False) -> List[ScheduleSlot]:
+        """Récupérer tous les emplois du temps (shared=True : vue partagée en lecture seule)"""
+        return self._load_data(self.schedule_file, shared)
     
+    @writes
     def add_schedule_slot(self, schedule_data: Dict) -> bool:
         """Ajouter un créneau à l'emploi du temps"""
-        schedules = self.get_all_schedules()
+        def attempt(version_before):
+            # ID unique (relu à chaque tentative : un autre processus a pu le prendre)
+            schedule_data["id"] = self._derived_index("schedule_ids").next_id()
+            schedule_data["created_at"] = datetime.now().isoformat()
+            
+            if not self.storage.upsert("schedule", [schedule_data], version_before):
+                return False
+            self._records_written("schedule", version_before, [(None, schedule_data)])
+            return True
         
-        # Générer un ID unique
-        schedule_data["id"] = max([s.get("id", 0) for s in schedules], default=0) + 1
-        schedule_data["created_at"] = datetime.now().isoformat()
+        return self._write_with_retry("schedule", attempt)
+    
+    @writes
+    def replace_class_schedules(self, class_names: List[str], slots: List[Dict]) -> Optional[List[Dict]]:
+        """Remplacer l'emploi du temps de ces classes par de nouveaux créneaux, en une écriture
+        
+        Les créneaux des autres classes sont conservés ; les nouveaux reçoivent
+        des IDs consécutifs. Les professeurs sont revérifiés contre les créneaux
+        conservés au moment de l'écriture : si un autre emploi du temps a été
+        enregistré depuis la génération et crée un chevauchement, rien n'est
+        écrit et TimetableError est levée. Retourne les créneaux écrits, None
+        en cas d'échec d'écriture.
+        """
+        class_names = set(class_names)
+        written = {}
+        
+        def attempt(version_before):
+            schedules = self.get_all_schedules(shared=True)
+            removed = [s for s in schedules if s.get("class_name") in class_names]
+            kept = [s for s in schedules if s.get("class_name") not in class_names]
+            
+            clashes = teacher_clashes(kept, slots)
+            if clashes:
+                first = clashes[0]
+                raise TimetableError(
+                    f"{len(clashes)} cours en conflit avec un emploi du temps enregistré entre-temps "
+                    f"({first.get('teacher_name', '')}, {first.get('day')} {first.get('start_time')})"
+                )
+            
+            now = datetime.now().isoformat()
+            slot_ids = self._derived_index("schedule_ids").next_ids(len(slots))
+            records = [{"id": slot_id, **slot, "created_at": now} for slot_id, slot in zip(slot_ids, slots)]
+            
+            if not self.storage.save("schedule", kept + records, version_before):
+                return False
+            self._records_written("schedule", version_before,
+                                  [(old, None) for old in removed] + [(None, record) for record in records])
+            written["records"] = records
+            return True
         
-        schedules.append(schedule_data)
-        return self._save_data(self.schedule_file, schedules)
+        if not self._write_with_retry("schedule", attempt):
+            return None
+        return written["records"]
     
-    def get_schedule_by_class(self, class_name: str) -> List[Dict]:
+    @reads
+    def get_schedule_by_class(self, class_name: str) -> List[ScheduleSlot]:
         """Récupérer l'emploi du temps d'une classe"""
-        schedules = self.get_all_schedules()
-        return [s for s in schedules if s.get("class_name") == class_name]
+        return self.storage.find("schedule", class_name=class_name)
     
-    def get_schedule_by_teacher(self, teacher_id: str) -> List[Dict]:
+    @reads
+    def get_schedule_by_teacher(self, teacher_id: str) -> List[ScheduleSlot]:
         """Récupérer l'emploi du temps d'un professeur"""
-        schedules = self.get_all_schedules()
-        return [s for s in schedules if s.get("teacher_id") == teacher_id]
+        return self.storage.find("schedule", teacher_id=teacher_id)
     
+    @reads
     def check_schedule_conflict(self, class_name: str, day: str, start_time: str, end_time: str, exclude_id: Optional[int] = None) -> bool:
         """Vérifier s'il y a un conflit d'horaire pour une classe"""
-        schedules = self.get_schedule_by_class(class_name)
-        
-        for schedule in schedules:
-            if exclude_id and schedule.get("id") == exclude_id:
-                continue
-                
-            if schedule.get("day") == day:
-                # Convertir les heures en minutes pour comparaison
-                def time_to_minutes(time_str):
-                    hour, minute = map(int, time_str.split(':'))
-                    return hour * 60 + minute
-                
-                existing_start = time_to_minutes(schedule.get("start_time", "00:00"))
-                existing_end = time_to_minutes(schedule.get("end_time", "00:00"))
-                new_start = time_to_minutes(start_time)
-                new_end = time_to_minutes(end_time)
-                
-                # Vérifier chevauchement
-                if (new_start < existing_end and new_end > existing_start):
-                    return True
-        
-        return False
+        return self._derived_index("schedule").class_conflict(
+            class_name, day, time_to_minutes(start_time), time_to_minutes(end_time), exclude_id or None
+        )
     
+    @reads
     def check_teacher_schedule_conflict(self, teacher_id: str, day: str, start_time: str, end_time: str, exclude_id: Optional[int] = None) -> bool:
         """Vérifier s'il y a un conflit d'horaire pour un professeur"""
-        schedules = self.get_schedule_by_teacher(teacher_id)
-        
-        for schedule in schedules:
-            if exclude_id and schedule.get("id") == exclude_id:
-                continue
-                
-            if schedule.get("day") == day:
-                # Convertir les heures en minutes pour comparaison
-                def time_to_minutes(time_str):
-                    hour, minute = map(int, time_str.split(':'))
-                    return hour * 60 + minute
-                
-                existing_start = time_to_minutes(schedule.get("start_time", "00:00"))
-                existing_end = time_to_minutes(schedule.get("end_time", "00:00"))
-                new_start = time_to_minutes(start_time)
-                new_end = time_to_minutes(end_time)
-                
-                # Vérifier chevauchement
-                if (new_start < existing_end and new_end > existing_start):
-                    return True
-        
-        return False
-    
+        return self._derived_index("schedule").teacher_conflict(
+            teacher_id, day, time_to_minutes(start_time), time_to_minutes(end_time), exclude_id or None
+        )
+    
+    @reads
+    def find_schedule_conflicts(self) -> List[Dict]:
+        """Tous les chevauchements de l'emploi du temps (classes et professeurs)
+        
+        Chaque conflit vaut {"type": "classe" ou "professeur", "owner", "day",
+        "slots": (id1, id2)}.
+        """
+        return self._derived_index("schedule").conflicts()
+    
+    @reads
+    def find_free_windows(self, class_names: List[str] = (), teachers: List[tuple] = (),
+                          min_minutes: int = 60, days: Optional[List[str]] = None,
+                          day_start: str = "08:00", day_end: str = "20:00",
+                          exclude_id: Optional[int] = None) -> List[Dict]:
+        """Plages où toutes ces classes et tous ces professeurs sont libres
+        
+        teachers : paires (teacher_id, teacher_name). Retourne
+        [{"day", "start_time", "end_time", "minutes"}] par jour puis par heure.
+        """
+        return self._derived_index("availability").free_windows(
+            class_names, teachers, min_minutes, days, day_start, day_end, exclude_id or None
+        )
+    
+    @reads
+    def get_teacher_subjects(self, teacher_id, teacher_name: Optional[str] = None) -> List[str]:
+        """Matières enseignées par un professeur d'après l'emploi du temps"""
+        return self._derived_index("teacher_load").subjects(teacher_id, teacher_name)
+    
+    @reads
+    def find_substitutes(self, teacher_id, absence_date, limit: int = 5) -> List[Dict]:
+        """Remplaçants possibles d'un professeur absent à une date (jj/mm/aaaa ou date)
+        
+        Retourne, pour chaque créneau du professeur ce jour-là, {"slot",
+        "candidates"} : les professeurs libres, classés par matière puis par
+        charge hebdomadaire. Lève ValueError si la date est invalide.
+        """
+        return substitutes_for_day(
+            self.get_all_teachers(shared=True), teacher_id, weekday_name(absence_date),
+            self._derived_index("availability"), self._derived_index("teacher_load"), limit
+        )
+    
+    @writes
     def delete_schedule_slot(self, schedule_id: int) -> bool:
         """Supprimer un créneau de l'emploi du temps"""
-        schedules = self.get_all_schedules()
-        schedules = [s for s in schedules if s.get("id") != schedule_id]
-        return self._save_data(self.schedule_file, schedules)
+        return self._delete_record("schedule", schedule_id)
     
-    def get_schedule_by_id(self, schedule_id: int) -> Optional[Dict]:
+    @reads
+    def get_schedule_by_id(self, schedule_id: int) -> Optional[ScheduleSlot]:
         """Récupérer un créneau d'emploi du temps par son ID"""
-        schedules = self.get_all_schedules()
-        for schedule in schedules:
-            if schedule.get("id") == schedule_id:
-                return schedule
-        return None
+        return self._find_one("schedule", schedule_id)
     
+    @writes
     def update_schedule_slot(self, schedule_id: int, schedule_data: Dict) -> bool:
         """Mettre à jour un créneau d'emploi du temps"""
-        schedules = self.get_all_schedules()
-        for i, schedule in enumerate(schedules):
-            if schedule.get("id") == schedule_id:
-                # Conserver l'ID et la date de création originaux
-                schedule_data["id"] = schedule_id
-                schedule_data["created_at"] = schedule.get("created_at", datetime.now().isoformat())
-                schedule_data["updated_at"] = datetime.now().isoformat()
-                schedules[i] = schedule_data
-                return self._save_data(self.schedule_file, schedules)
-        return False
+        def attempt(version_before):
+            schedule = self.get_schedule_by_id(schedule_id)
+            if schedule is None:
+                return False
+            
+            # Conserver l'ID et la date de création originaux
+            schedule_data["id"] = schedule_id
+            schedule_data["created_at"] = schedule.get("created_at", datetime.now().isoformat())
+            schedule_data["updated_at"] = datetime.now().isoformat()
+            if not self.storage.upsert("schedule", [schedule_data], version_before):
+                return False
+            self._records_written("schedule", version_before, [(schedule, schedule_data)])
+            return True
+        
+        return self._write_with_retry("schedule", attempt)
+
+
+_shared_data_manager: Optional[DataManager] = None
+_shared_data_manager_lock = threading.Lock()
+
+
+def get_shared_data_manager() -> DataManager:
+    """Instance de DataManager commune à toutes les sessions du processus
+
+    En mode web, chaque onglet ouvert appelle main(page) : partager l'instance
+    évite de relire et de garder en mémoire les collections une fois par session.
+    """
+    global _shared_data_manager
+    with _shared_data_manager_lock:
+        if _shared_data_manager is None:
+            _shared_data_manager = DataManager()
+        return _shared_data_manager
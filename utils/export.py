@@ -0,0 +1,177 @@
+import csv
+import os
+import tempfile
+from typing import List, Dict, Optional, Iterable, Iterator, Callable
+
+from utils.storage import school_year_of
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Colonnes exportables du tableau des élèves, dans l'ordre d'affichage
+STUDENT_COLUMNS = [
+    ("id", "ID"),
+    ("prenom", "Prénom"),
+    ("nom", "Nom"),
+    ("date_naissance", "Date naissance"),
+    ("lieu_naissance", "Lieu naissance"),
+    ("genre", "Genre"),
+    ("classe", "Classe"),
+    ("numero_eleve", "N° Élève"),
+    ("telephone_parent", "N° Parent"),
+]
+
+# Colonnes masquées par défaut dans le tableau des élèves
+STUDENT_COLUMNS_HIDDEN = {"lieu_naissance"}
+
+SEMESTER_NAMES = {"premier": "Premier semestre", "deuxieme": "Deuxième semestre", "annuel": "Année"}
+
+PROGRESS_EVERY = 1000
+
+
+class ExportError(Exception):
+    """Export impossible (format inconnu ou dépendance manquante)"""
+
+
+def student_columns(column_visibility: Dict, selected_class: str = "Toutes les classes") -> List[tuple]:
+    """Colonnes (clé, titre) visibles dans le tableau des élèves
+
+    Comme à l'écran, la classe n'est affichée que pour « Toutes les classes ».
+    """
+    columns = []
+    for key, label in STUDENT_COLUMNS:
+        if not column_visibility.get(key, key not in STUDENT_COLUMNS_HIDDEN):
+            continue
+        if key == "classe" and selected_class != "Toutes les classes":
+            continue
+        columns.append((key, label))
+    return columns
+
+
+def student_rows(students: Iterable[Dict], columns: List[tuple]) -> Iterator[list]:
+    """Lignes de la liste des élèves (en-tête compris)"""
+    yield [label for _, label in columns]
+    for student in students:
+        row = []
+        for key, _ in columns:
+            if key == "id":
+                row.append(student.get("student_id", student.get("id", "")))
+            else:
+                row.append(student.get(key, ""))
+        yield row
+
+
+def grade_sheet_rows(data_manager, students: Iterable[Dict], subject_id: str, semester: str,
+                     num_devoirs: int, school_year: Optional[str] = None) -> Iterator[list]:
+    """Lignes de la feuille de notes d'une matière, comme le tableau de saisie (année en cours par défaut)"""
+    school_year = school_year or school_year_of()
+    yield (["ID", "Nom", "Prénom", "Date naissance", "Lieu naissance"]
+           + [f"Devoir {i}" for i in range(1, num_devoirs + 1)] + ["Composition"])
+    for student in students:
+        student_id = student.get("student_id", student.get("id", ""))
+        notes = {}
+        for grade in data_manager.get_student_subject_grades(student_id, subject_id, semester, school_year):
+            notes[grade.get("type", "")] = grade.get("note", "")
+        yield ([student_id, student.get("nom", ""), student.get("prenom", ""),
+                student.get("date_naissance", ""), student.get("lieu_naissance", "")]
+               + [notes.get(f"devoir{i}", "") for i in range(1, num_devoirs + 1)]
+               + [notes.get("composition", "")])
+
+
+def school_grade_rows(grades: Iterable[Dict], students: Iterable[Dict],
+                      subjects: Iterable[Dict]) -> Iterator[list]:
+    """Toutes les notes de l'établissement, une ligne par note
+
+    Les notes sont parcourues une à une (vue partagée du stockage) : aucune
+    ligne n'est construite à l'avance, quelle que soit la taille de l'export.
+    """
+    names = {s.get("student_id", s.get("id")): (s.get("prenom", ""), s.get("nom", "")) for s in students}
+    subject_names = {s.get("id"): s.get("nom", "") for s in subjects}
+
+    yield ["ID élève", "Prénom", "Nom", "Classe", "Semestre", "Matière", "Évaluation", "Note", "Année scolaire"]
+    for grade in grades:
+        student_id = grade.get("student_id", "")
+        prenom, nom = names.get(student_id, ("", ""))
+        subject_id = grade.get("subject_id", "")
+        yield [student_id, prenom, nom, grade.get("class_name", ""),
+               SEMESTER_NAMES.get(grade.get("semester"), grade.get("semester", "")),
+               subject_names.get(subject_id) or grade.get("subject_name", subject_id),
+               grade.get("type", ""), grade.get("note", ""), grade.get("school_year", "")]
+
+
+def averages_rows(students_averages: Iterable[Dict]) -> Iterator[list]:
+    """Lignes du classement produit par le calcul des moyennes"""
+    yield ["Rang", "ID", "Prénom", "Nom", "Points totaux", "Coeff. total", "Moyenne", "Mention"]
+    for rank, student_data in enumerate(students_averages, 1):
+        name_parts = student_data["name"].split(" ", 1)
+        yield [student_data.get("rank", rank), student_data["student_id"],
+               name_parts[0], name_parts[1] if len(name_parts) > 1 else "",
+               student_data["total_points"], student_data["total_coefficient"],
+               student_data["general_average"], student_data["mention"]]
+
+
+def _write_csv(rows: Iterable[list], path: str, sheet_title: str):
+    """Écrire les lignes en CSV (point-virgule, UTF-8 avec BOM : lisible par Excel)"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        for row in rows:
+            writer.writerow(row)
+            yield
+
+
+def _write_xlsx(rows: Iterable[list], path: str, sheet_title: str):
+    """Écrire les lignes dans un classeur Excel en mode écriture seule (flux)"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31] or "Export")
+    for row in rows:
+        sheet.append(row)
+        yield
+    workbook.save(path)
+
+
+def export_rows(rows: Iterable[list], path: str, total: Optional[int] = None,
+                progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                cancel_event=None, sheet_title: str = "Export") -> Optional[str]:
+    """Écrire des lignes en CSV ou XLSX (selon l'extension) au fil de l'eau
+
+    Les lignes sont consommées une à une depuis le générateur, sans être
+    gardées en mémoire. Le fichier est écrit à côté puis renommé : un export
+    annulé ou en erreur ne laisse pas de fichier partiel. progress(lignes,
+    total) est appelé toutes les PROGRESS_EVERY lignes. Retourne le chemin,
+    ou None si cancel_event est positionné.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (".csv", ".xlsx"):
+        raise ExportError(f"Format d'export non pris en charge: {extension or path}")
+    if extension == ".xlsx" and openpyxl is None:
+        raise ExportError("L'export Excel nécessite le module openpyxl (pip install openpyxl)")
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=extension)
+    os.close(fd)
+    write = _write_csv if extension == ".csv" else _write_xlsx
+    steps = write(rows, temp_path, sheet_title)
+    done = 0
+    try:
+        for _ in steps:
+            done += 1
+            if done % PROGRESS_EVERY == 0:
+                if cancel_event is not None and cancel_event.is_set():
+                    steps.close()
+                    os.remove(temp_path)
+                    return None
+                if progress:
+                    progress(done, total)
+        os.replace(temp_path, path)
+    except BaseException:
+        steps.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if progress:
+        progress(done, total)
+    return path
@@ -0,0 +1,204 @@
+import math
+from array import array
+from itertools import compress
+from typing import List, Dict, Optional, Any, Iterable
+
+from utils.records import Grade, MISSING
+
+# Codes fixes des semestres et des types d'évaluation (identiques d'un magasin à l'autre)
+SEMESTER_VALUES = ["premier", "deuxieme"]
+GRADE_TYPE_VALUES = ["composition", "devoir1", "devoir2", "devoir3", "devoir4", "devoir5"]
+
+NO_CODE = -1
+
+
+class Coder:
+    """Dictionnaire de codage d'une dimension : valeur <-> code entier"""
+
+    def __init__(self, values: Iterable = ()):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value: Any) -> int:
+        """Code de la valeur (attribué à la première rencontre)"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Any) -> int:
+        """Code de la valeur, NO_CODE si elle n'a jamais été rencontrée"""
+        return self.codes.get(value, NO_CODE)
+
+    def decode(self, code: int) -> Any:
+        """Valeur d'origine d'un code"""
+        return self.values[code] if code >= 0 else None
+
+
+def _note_value(value: Any) -> float:
+    """Note en flottant, NaN si absente ou invalide"""
+    if value is None or value is MISSING or value == "":
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def mask_and(*masks: bytes) -> bytes:
+    """Intersection de masques de même longueur (un octet 0/1 par ligne)"""
+    if not masks:
+        return b""
+    length = len(masks[0])
+    combined = int.from_bytes(masks[0], "little")
+    for mask in masks[1:]:
+        combined &= int.from_bytes(mask, "little")
+    return combined.to_bytes(length, "little")
+
+
+class GradeStore:
+    """Notes rangées en colonnes : tableaux contigus d'entiers codés et de float32
+
+    Chaque note occupe une ligne dans des tableaux parallèles (élève, matière,
+    semestre, type d'évaluation, année scolaire, note) ; les Coder traduisent
+    les codes en IDs.
+    Les filtres produisent des masques (un octet par ligne) combinables avec
+    mask_and, et les calculs parcourent les colonnes sans objets Python par note.
+    Semestres et types sont codés sur un octet (256 valeurs distinctes au plus).
+    Une note absente ou invalide vaut NaN. Le magasin se construit depuis les
+    notes du stockage et se met à jour par ID (apply), comme les autres index
+    dérivés de DataManager.
+    """
+
+    def __init__(self, grades: Iterable[Dict] = (), students: Optional[Coder] = None,
+                 subjects: Optional[Coder] = None, semesters: Optional[Coder] = None,
+                 types: Optional[Coder] = None, years: Optional[Coder] = None):
+        self.students = students or Coder()
+        self.subjects = subjects or Coder()
+        self.semesters = semesters or Coder(SEMESTER_VALUES)
+        self.types = types or Coder(GRADE_TYPE_VALUES)
+        self.years = years or Coder()
+
+        self.student = array("i")
+        self.subject = array("i")
+        self.semester = array("B")
+        self.type = array("B")
+        self.year = array("H")
+        self.note = array("f")
+        self.ids: List[Any] = []
+        self.rows: Dict[Any, int] = {}
+
+        for grade in grades:
+            self.upsert(grade)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _encode(self, grade: Dict) -> tuple:
+        """Valeurs de ligne (codes et note) d'une note"""
+        if isinstance(grade, Grade):
+            values = (grade.student_id, grade.subject_id, grade.semester, grade.type,
+                      grade.school_year, grade.note)
+        else:
+            values = (grade.get("student_id"), grade.get("subject_id"), grade.get("semester"),
+                      grade.get("type"), grade.get("school_year"), grade.get("note"))
+        student_id, subject_id, semester, grade_type, school_year, note = values
+        return (self.students.encode(student_id), self.subjects.encode(subject_id),
+                self.semesters.encode(semester or None), self.types.encode(grade_type or None),
+                self.years.encode(school_year or None), _note_value(note))
+
+    def upsert(self, grade: Dict):
+        """Ajouter une note, ou remplacer en place la ligne de même ID"""
+        grade_id = grade.get("id")
+        student, subject, semester, grade_type, year, note = self._encode(grade)
+        row = self.rows.get(grade_id)
+        if row is None:
+            self.rows[grade_id] = len(self.ids)
+            self.ids.append(grade_id)
+            self.student.append(student)
+            self.subject.append(subject)
+            self.semester.append(semester)
+            self.type.append(grade_type)
+            self.year.append(year)
+            self.note.append(note)
+        else:
+            self.student[row] = student
+            self.subject[row] = subject
+            self.semester[row] = semester
+            self.type[row] = grade_type
+            self.year[row] = year
+            self.note[row] = note
+
+    def remove(self, grade_id: Any):
+        """Retirer une note : la dernière ligne prend sa place (tableaux sans trous)"""
+        row = self.rows.pop(grade_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        columns = (self.student, self.subject, self.semester, self.type, self.year, self.note)
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+            for column in columns:
+                column[row] = column[last]
+        self.ids.pop()
+        for column in columns:
+            column.pop()
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'une note (old -> new, None pour absence)"""
+        if old is not None and (new is None or old.get("id") != new.get("id")):
+            self.remove(old.get("id"))
+        if new is not None:
+            self.upsert(new)
+
+    # Filtres
+    def mask(self, student_id: Any = None, subject_id: Any = None, semester: Optional[str] = None,
+             grade_type: Optional[str] = None, school_year: Optional[str] = None) -> bytes:
+        """Masque des lignes correspondant à tous les critères donnés
+
+        Chaque critère est une valeur ou une collection de valeurs (list, set,
+        tuple) ; None ne filtre pas.
+        """
+        criteria = ((self.student, self.students, student_id),
+                    (self.subject, self.subjects, subject_id),
+                    (self.semester, self.semesters, semester),
+                    (self.type, self.types, grade_type),
+                    (self.year, self.years, school_year))
+        masks = []
+        for column, coder, wanted in criteria:
+            if wanted is None:
+                continue
+            if not isinstance(wanted, (list, set, frozenset, tuple)):
+                wanted = (wanted,)
+            codes = {coder.lookup(value) for value in wanted} - {NO_CODE}
+            if column.itemsize == 1:
+                # Colonne d'un octet : table de traduction code -> 0/1 (en C)
+                table = bytes(code in codes for code in range(256))
+                masks.append(column.tobytes().translate(table))
+            else:
+                masks.append(bytes(map(codes.__contains__, column)))
+        if not masks:
+            return b"\x01" * len(self)
+        return mask_and(*masks)
+
+    def graded_mask(self) -> bytes:
+        """Masque des lignes dont la note est renseignée (non NaN)"""
+        return bytes(map(math.isfinite, self.note))
+
+    def subset(self, mask: bytes) -> "GradeStore":
+        """Nouveau magasin limité aux lignes du masque (mêmes dictionnaires de codes)"""
+        store = GradeStore(students=self.students, subjects=self.subjects,
+                           semesters=self.semesters, types=self.types, years=self.years)
+        selected = list(compress(range(len(mask)), mask))
+        for name in ("student", "subject", "semester", "type", "year", "note"):
+            column = getattr(self, name)
+            setattr(store, name, array(column.typecode, map(column.__getitem__, selected)))
+        store.ids = list(map(self.ids.__getitem__, selected))
+        store.rows = {grade_id: row for row, grade_id in enumerate(store.ids)}
+        return store
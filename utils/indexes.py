@@ -0,0 +1,713 @@
+import bisect
+import hashlib
+import heapq
+import json
+import re
+import unicodedata
+from typing import List, Dict, Optional, Any
+
+from utils.storage import copy_records
+from utils.records import Day, to_json
+
+
+class GradeIndex:
+    """Index en mémoire des notes par élève, par matière et par élève+matière+semestre
+
+    Les enregistrements sont rangés par ID dans chaque groupe, ce qui permet
+    de les remplacer ou de les retirer en O(1) lors des écritures.
+    """
+
+    def __init__(self, grades: List[Dict]):
+        self.by_id: Dict[Any, Dict] = {}
+        self.by_student: Dict[Any, Dict[Any, Dict]] = {}
+        self.by_subject: Dict[Any, Dict[Any, Dict]] = {}
+        self.by_student_subject: Dict[tuple, Dict[Any, Dict]] = {}
+        self.by_student_subject_semester: Dict[tuple, Dict[Any, Dict]] = {}
+
+        for grade in grades:
+            self.add(grade)
+
+    def _groups(self, grade: Dict) -> List[tuple]:
+        """Paires (index, clé) dans lesquelles la note est rangée"""
+        student_id = grade.get("student_id")
+        subject_id = grade.get("subject_id")
+        return [
+            (self.by_student, student_id),
+            (self.by_subject, subject_id),
+            (self.by_student_subject, (student_id, subject_id)),
+            (self.by_student_subject_semester, (student_id, subject_id, grade.get("semester"))),
+        ]
+
+    def add(self, grade: Dict):
+        """Ajouter ou remplacer une note"""
+        grade_id = grade.get("id")
+        if grade_id in self.by_id:
+            self.remove(grade_id)
+
+        self.by_id[grade_id] = grade
+        for index, key in self._groups(grade):
+            index.setdefault(key, {})[grade_id] = grade
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'une note (old -> new, None pour absence)"""
+        if old is not None and (new is None or old.get("id") != new.get("id")):
+            self.remove(old.get("id"))
+        if new is not None:
+            self.add(new)
+
+    def remove(self, grade_id: Any):
+        """Retirer une note de tous les index"""
+        grade = self.by_id.pop(grade_id, None)
+        if grade is None:
+            return
+
+        for index, key in self._groups(grade):
+            group = index.get(key)
+            if group is not None:
+                group.pop(grade_id, None)
+                if not group:
+                    del index[key]
+
+    def student_grades(self, student_id: Any) -> List[Dict]:
+        """Notes d'un élève"""
+        return [copy_records(g) for g in self.by_student.get(student_id, {}).values()]
+
+    def subject_grades(self, subject_id: Any) -> List[Dict]:
+        """Notes d'une matière"""
+        return [copy_records(g) for g in self.by_subject.get(subject_id, {}).values()]
+
+    def student_subject_grades(self, student_id: Any, subject_id: Any,
+                               semester: Optional[str] = None) -> List[Dict]:
+        """Notes d'un élève dans une matière, éventuellement limitées à un semestre"""
+        if semester is None:
+            group = self.by_student_subject.get((student_id, subject_id), {})
+        else:
+            group = self.by_student_subject_semester.get((student_id, subject_id, semester), {})
+        return [copy_records(g) for g in group.values()]
+
+
+class ClassCountIndex:
+    """Nombre d'élèves par classe, tenu à jour à chaque écriture d'élève"""
+
+    def __init__(self, students: List[Dict]):
+        self.counts: Dict[Any, int] = {}
+        for student in students:
+            self._increment(student.get("classe"), 1)
+
+    def _increment(self, class_name: Any, delta: int):
+        count = self.counts.get(class_name, 0) + delta
+        if count > 0:
+            self.counts[class_name] = count
+        else:
+            self.counts.pop(class_name, None)
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un élève (old -> new, None pour absence)"""
+        if old is not None:
+            self._increment(old.get("classe"), -1)
+        if new is not None:
+            self._increment(new.get("classe"), 1)
+
+
+def record_digest(record: Dict) -> int:
+    """Empreinte stable (64 bits) du contenu d'un enregistrement, identique d'un processus à l'autre"""
+    data = json.dumps(record, sort_keys=True, ensure_ascii=False, default=to_json)
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class DigestIndex:
+    """Empreinte du contenu des enregistrements, regroupés selon des champs (classe, semestre...)
+
+    L'empreinte d'un groupe est la somme modulo 2^64 des empreintes de ses
+    enregistrements : elle se met à jour en O(1) à chaque écriture et ne
+    dépend ni de l'ordre des enregistrements ni du processus. Conservée avec
+    un résultat calculé, elle indique si les données d'origine ont changé.
+    """
+
+    def __init__(self, records: List[Dict], fields: tuple = ()):
+        self.fields = fields
+        self.digests: Dict[tuple, int] = {}
+        for record in records:
+            self._add(record, 1)
+
+    def _add(self, record: Dict, sign: int):
+        key = tuple(record.get(field) for field in self.fields)
+        digest = (self.digests.get(key, 0) + sign * record_digest(record)) % (1 << 64)
+        if digest:
+            self.digests[key] = digest
+        else:
+            self.digests.pop(key, None)
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un enregistrement (old -> new, None pour absence)"""
+        if old is not None:
+            self._add(old, -1)
+        if new is not None:
+            self._add(new, 1)
+
+    def digest(self, *key) -> int:
+        """Empreinte du groupe (0 s'il est vide)"""
+        return self.digests.get(key, 0)
+
+
+class IdAllocator:
+    """Allocation des IDs numériques : plus haut ID attribué + tas des IDs libres
+
+    next_id() renvoie le plus petit ID libre (trou laissé par une suppression)
+    ou, à défaut, le suivant du plus grand ID, en O(log n) au lieu de
+    parcourir toute la collection. Avec reuse_gaps=False, seuls les IDs
+    au-delà du plus grand sont attribués (références conservées ailleurs).
+    """
+
+    def __init__(self, records: List[Dict], fields: tuple = ("id",), start: int = 0,
+                 reuse_gaps: bool = True):
+        self.fields = fields
+        self.start = start
+        self.reuse_gaps = reuse_gaps
+        self.used: Dict[int, int] = {}
+        self.free: List[int] = []
+        self.high_water = start
+
+        for record in records:
+            record_id = self._record_id(record)
+            if record_id is not None:
+                self.used[record_id] = self.used.get(record_id, 0) + 1
+                self.high_water = max(self.high_water, record_id + 1)
+
+        if reuse_gaps:
+            self.free = [i for i in range(start, self.high_water) if i not in self.used]
+
+    def _record_id(self, record: Dict) -> Optional[int]:
+        """ID numérique de l'enregistrement (premier champ renseigné), None sinon"""
+        value = record.get(self.fields[0])
+        for field in self.fields[1:]:
+            if value is not None:
+                break
+            value = record.get(field)
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+
+    def _take(self, record_id: int):
+        self.used[record_id] = self.used.get(record_id, 0) + 1
+        if record_id >= self.high_water:
+            if self.reuse_gaps:
+                for gap in range(max(self.high_water, self.start), record_id):
+                    heapq.heappush(self.free, gap)
+            self.high_water = record_id + 1
+
+    def _release(self, record_id: int):
+        count = self.used.get(record_id, 0) - 1
+        if count > 0:
+            self.used[record_id] = count
+            return
+        self.used.pop(record_id, None)
+        if self.reuse_gaps and record_id >= self.start:
+            heapq.heappush(self.free, record_id)
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un enregistrement (old -> new, None pour absence)"""
+        old_id = self._record_id(old) if old is not None else None
+        new_id = self._record_id(new) if new is not None else None
+        if old_id == new_id:
+            return
+        if old_id is not None:
+            self._release(old_id)
+        if new_id is not None:
+            self._take(new_id)
+
+    def next_id(self) -> int:
+        """Prochain ID disponible (sans le réserver)"""
+        # Suppression paresseuse des IDs du tas repris entre-temps
+        while self.free and self.free[0] in self.used:
+            heapq.heappop(self.free)
+        return self.free[0] if self.free else self.high_water
+
+    def next_ids(self, count: int) -> List[int]:
+        """Les count prochains IDs disponibles, dans l'ordre (sans les réserver)"""
+        gaps = sorted({i for i in self.free if i not in self.used})[:count]
+        return gaps + list(range(self.high_water, self.high_water + count - len(gaps)))
+
+
+def time_to_minutes(time_str: str) -> int:
+    """Heure "HH:MM" en minutes depuis minuit"""
+    hour, minute = map(int, str(time_str).split(':'))
+    return hour * 60 + minute
+
+
+class IntervalList:
+    """Créneaux [début, fin) d'une journée, triés par début, en minutes
+
+    max_end[i] est la plus grande fin parmi les i+1 premiers créneaux : une
+    requête de chevauchement trouve par dichotomie les créneaux qui commencent
+    avant la fin demandée, puis remonte seulement tant que max_end dépasse le
+    début demandé (O(log n) pour un emploi du temps sans conflit).
+    """
+    __slots__ = ("starts", "items", "max_end")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.items: List[tuple] = []
+        self.max_end: List[int] = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def _refresh_max_end(self, position: int):
+        current = self.max_end[position - 1] if position > 0 else -1
+        del self.max_end[position:]
+        for start, end, _ in self.items[position:]:
+            current = max(current, end)
+            self.max_end.append(current)
+
+    def add(self, start: int, end: int, slot_id: Any):
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.items.insert(position, (start, end, slot_id))
+        self._refresh_max_end(position)
+
+    def remove(self, start: int, slot_id: Any) -> bool:
+        position = bisect.bisect_left(self.starts, start)
+        while position < len(self.items) and self.starts[position] == start:
+            if self.items[position][2] == slot_id:
+                del self.starts[position]
+                del self.items[position]
+                self._refresh_max_end(position)
+                return True
+            position += 1
+        return False
+
+    def overlapping(self, start: int, end: int, exclude_id: Any = None) -> List[tuple]:
+        """Créneaux (début, fin, id) qui chevauchent [start, end), hors exclude_id"""
+        found = []
+        position = bisect.bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_end[position] > start:
+            item = self.items[position]
+            if item[1] > start and (exclude_id is None or item[2] != exclude_id):
+                found.append(item)
+            position -= 1
+        found.reverse()
+        return found
+
+    def has_overlap(self, start: int, end: int, exclude_id: Any = None) -> bool:
+        position = bisect.bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_end[position] > start:
+            item = self.items[position]
+            if item[1] > start and (exclude_id is None or item[2] != exclude_id):
+                return True
+            position -= 1
+        return False
+
+    def conflicts(self) -> List[tuple]:
+        """Paires d'IDs de créneaux qui se chevauchent (balayage de la liste triée)"""
+        pairs = []
+        for position, (start, end, slot_id) in enumerate(self.items):
+            following = position + 1
+            while following < len(self.items) and self.starts[following] < end:
+                pairs.append((slot_id, self.items[following][2]))
+                following += 1
+        return pairs
+
+
+class ScheduleIndex:
+    """Index des créneaux d'emploi du temps par (classe, jour) et (professeur, jour)
+
+    Les heures sont converties une fois en minutes ; les vérifications de
+    conflit ne relisent ni ne réanalysent l'emploi du temps. Un créneau aux
+    heures illisibles n'est pas indexé (il ne pouvait pas être comparé).
+    """
+
+    def __init__(self, slots: List[Dict]):
+        self.by_class: Dict[tuple, IntervalList] = {}
+        self.by_teacher: Dict[tuple, IntervalList] = {}
+        self.slots: Dict[Any, tuple] = {}
+
+        for slot in slots:
+            self.apply(None, slot)
+
+    @staticmethod
+    def _interval(slot: Dict) -> Optional[tuple]:
+        try:
+            return (time_to_minutes(slot.get("start_time", "00:00")),
+                    time_to_minutes(slot.get("end_time", "00:00")))
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _teacher(teacher_id: Any) -> Optional[str]:
+        # Les IDs sont enregistrés tantôt en entier, tantôt en texte : comparés en texte
+        return str(teacher_id) if teacher_id not in (None, "") else None
+
+    def _keys(self, slot: Dict) -> List[tuple]:
+        day = slot.get("day")
+        return [(self.by_class, (slot.get("class_name"), day)),
+                (self.by_teacher, (self._teacher(slot.get("teacher_id")), day))]
+
+    def _remove(self, slot_id: Any):
+        entry = self.slots.pop(slot_id, None)
+        if entry is None:
+            return
+        start, keys = entry
+        for index, key in keys:
+            intervals = index.get(key)
+            if intervals is not None:
+                intervals.remove(start, slot_id)
+                if not intervals:
+                    del index[key]
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un créneau (old -> new, None pour absence)"""
+        if old is not None:
+            self._remove(old.get("id"))
+        if new is None:
+            return
+
+        slot_id = new.get("id")
+        self._remove(slot_id)
+        interval = self._interval(new)
+        if interval is None:
+            return
+        keys = self._keys(new)
+        for index, key in keys:
+            index.setdefault(key, IntervalList()).add(interval[0], interval[1], slot_id)
+        self.slots[slot_id] = (interval[0], keys)
+
+    def class_conflict(self, class_name: Any, day: str, start: int, end: int, exclude_id: Any = None) -> bool:
+        intervals = self.by_class.get((class_name, day))
+        return intervals is not None and intervals.has_overlap(start, end, exclude_id)
+
+    def teacher_conflict(self, teacher_id: Any, day: str, start: int, end: int, exclude_id: Any = None) -> bool:
+        intervals = self.by_teacher.get((self._teacher(teacher_id), day))
+        return intervals is not None and intervals.has_overlap(start, end, exclude_id)
+
+    def conflicts(self) -> List[Dict]:
+        """Tous les chevauchements de l'emploi du temps, par classe puis par professeur"""
+        found = []
+        for kind, index in (("classe", self.by_class), ("professeur", self.by_teacher)):
+            for (owner, day), intervals in index.items():
+                if kind == "professeur" and owner in (None, ""):
+                    continue
+                for first, second in intervals.conflicts():
+                    found.append({"type": kind, "owner": owner, "day": day, "slots": (first, second)})
+        return found
+
+
+# Journées de cours par défaut des recherches de disponibilité (grille du lundi au samedi)
+SCHOOL_DAYS = [day.value for day in Day if day is not Day.DIMANCHE]
+
+
+class AvailabilityIndex:
+    """Occupation des classes et des professeurs en bitmaps par jour
+
+    La journée est découpée en cases de granularity minutes à partir de
+    minuit ; le bit n d'un bitmap vaut 1 si la case n est occupée. Un
+    créneau occupe toutes les cases qu'il touche. Les professeurs sont
+    indexés par ID et par nom (les cours saisis depuis l'emploi du temps
+    d'une classe n'ont que le nom). Les bitmaps de chaque créneau sont
+    gardés séparément pour pouvoir le retirer même s'il en chevauche un autre.
+    """
+
+    def __init__(self, slots: List[Dict], granularity: int = 15):
+        self.granularity = granularity
+        self.owners: Dict[tuple, Dict[Any, int]] = {}
+        self.busy: Dict[tuple, int] = {}
+        self.slots: Dict[Any, List[tuple]] = {}
+
+        for slot in slots:
+            self.apply(None, slot)
+
+    def cells(self, start: int, end: int) -> int:
+        """Bitmap des cases touchées par [start, end) en minutes"""
+        first = start // self.granularity
+        last = -(-end // self.granularity)
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    @staticmethod
+    def teacher_keys(teacher_id: Any = None, teacher_name: Any = None) -> List[tuple]:
+        keys = []
+        if teacher_id not in (None, ""):
+            keys.append(("professeur", str(teacher_id)))
+        if teacher_name:
+            keys.append(("nom", fold_text(teacher_name)))
+        return keys
+
+    def _keys(self, slot: Dict) -> List[tuple]:
+        day = slot.get("day")
+        owners = [("classe", slot.get("class_name"))]
+        owners += self.teacher_keys(slot.get("teacher_id"), slot.get("teacher_name"))
+        return [(kind, owner, day) for kind, owner in owners]
+
+    def _refresh(self, key: tuple):
+        bits = 0
+        for slot_bits in self.owners.get(key, {}).values():
+            bits |= slot_bits
+        if bits:
+            self.busy[key] = bits
+        else:
+            self.busy.pop(key, None)
+            self.owners.pop(key, None)
+
+    def _remove(self, slot_id: Any):
+        for key in self.slots.pop(slot_id, ()):
+            self.owners.get(key, {}).pop(slot_id, None)
+            self._refresh(key)
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un créneau (old -> new, None pour absence)"""
+        if old is not None:
+            self._remove(old.get("id"))
+        if new is None:
+            return
+
+        slot_id = new.get("id")
+        self._remove(slot_id)
+        try:
+            bits = self.cells(time_to_minutes(new.get("start_time", "00:00")),
+                              time_to_minutes(new.get("end_time", "00:00")))
+        except (ValueError, TypeError):
+            return
+        if not bits:
+            return
+        keys = self._keys(new)
+        for key in keys:
+            self.owners.setdefault(key, {})[slot_id] = bits
+            self._refresh(key)
+        self.slots[slot_id] = keys
+
+    def free_bits(self, day: str, class_names: List[str] = (), teachers: List[tuple] = (),
+                  exclude_id: Any = None) -> int:
+        """Cases libres à la fois pour toutes ces classes et tous ces professeurs (ET des bitmaps)
+
+        teachers : paires (teacher_id, teacher_name), l'un des deux pouvant
+        être None. exclude_id : créneau ignoré (celui qu'on modifie).
+        """
+        keys = [("classe", name, day) for name in class_names]
+        for teacher_id, teacher_name in teachers:
+            keys += [(kind, owner, day) for kind, owner in self.teacher_keys(teacher_id, teacher_name)]
+
+        free = ~0
+        for key in keys:
+            if exclude_id is not None and exclude_id in self.owners.get(key, {}):
+                busy = 0
+                for slot_id, slot_bits in self.owners[key].items():
+                    if slot_id != exclude_id:
+                        busy |= slot_bits
+            else:
+                busy = self.busy.get(key, 0)
+            free &= ~busy
+        return free
+
+    def free_windows(self, class_names: List[str] = (), teachers: List[tuple] = (),
+                     min_minutes: int = 60, days: Optional[List[str]] = None,
+                     day_start: str = "08:00", day_end: str = "20:00",
+                     exclude_id: Any = None) -> List[Dict]:
+        """Plages libres communes d'au moins min_minutes : [{"day", "start_time", "end_time", "minutes"}]
+
+        Les plages sont bornées par day_start et day_end et suivent les cases
+        de l'index ; elles sont classées par jour puis par heure.
+        """
+        window = self.cells(time_to_minutes(day_start), time_to_minutes(day_end))
+        min_cells = max(1, -(-min_minutes // self.granularity))
+        windows = []
+
+        for day in days or SCHOOL_DAYS:
+            free = self.free_bits(day, class_names, teachers, exclude_id) & window
+            while free:
+                # Début de la plage : bit libre le plus bas ; fin : premier bit occupé au-dessus
+                first = (free & -free).bit_length() - 1
+                run = free >> first
+                length = (~run & (run + 1)).bit_length() - 1
+                free &= ~(((1 << length) - 1) << first)
+                if length >= min_cells:
+                    start = first * self.granularity
+                    end = (first + length) * self.granularity
+                    windows.append({
+                        "day": day,
+                        "start_time": f"{start // 60:02d}:{start % 60:02d}",
+                        "end_time": f"{end // 60:02d}:{end % 60:02d}",
+                        "minutes": end - start,
+                    })
+        return windows
+
+
+class TeacherLoadIndex:
+    """Charge hebdomadaire, matières et classes de chaque professeur d'après l'emploi du temps
+
+    Les créneaux sont rangés sous les mêmes clés que AvailabilityIndex (ID
+    et nom du professeur) ; un créneau portant les deux n'est compté qu'une
+    fois grâce à son ID.
+    """
+
+    def __init__(self, slots: List[Dict]):
+        self.by_teacher: Dict[tuple, Dict[Any, tuple]] = {}
+        self.slots: Dict[Any, List[tuple]] = {}
+
+        for slot in slots:
+            self.apply(None, slot)
+
+    def _remove(self, slot_id: Any):
+        for key in self.slots.pop(slot_id, ()):
+            entries = self.by_teacher.get(key)
+            if entries is not None:
+                entries.pop(slot_id, None)
+                if not entries:
+                    del self.by_teacher[key]
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un créneau (old -> new, None pour absence)"""
+        if old is not None:
+            self._remove(old.get("id"))
+        if new is None:
+            return
+
+        slot_id = new.get("id")
+        self._remove(slot_id)
+        try:
+            minutes = max(0, time_to_minutes(new.get("end_time", "00:00")) - time_to_minutes(new.get("start_time", "00:00")))
+        except (ValueError, TypeError):
+            minutes = 0
+        keys = AvailabilityIndex.teacher_keys(new.get("teacher_id"), new.get("teacher_name"))
+        entry = (minutes, new.get("subject") or "", new.get("class_name"), new)
+        for key in keys:
+            self.by_teacher.setdefault(key, {})[slot_id] = entry
+        self.slots[slot_id] = keys
+
+    def _entries(self, teacher_id: Any = None, teacher_name: Any = None) -> Dict[Any, tuple]:
+        entries = {}
+        for key in AvailabilityIndex.teacher_keys(teacher_id, teacher_name):
+            entries.update(self.by_teacher.get(key, {}))
+        return entries
+
+    def weekly_minutes(self, teacher_id: Any = None, teacher_name: Any = None) -> int:
+        return sum(entry[0] for entry in self._entries(teacher_id, teacher_name).values())
+
+    def subjects(self, teacher_id: Any = None, teacher_name: Any = None) -> List[str]:
+        """Matières enseignées (orthographe de la première saisie, sans doublon d'accents ou de casse)"""
+        subjects = {}
+        for _, subject, _, _ in self._entries(teacher_id, teacher_name).values():
+            if subject:
+                subjects.setdefault(fold_text(subject), subject)
+        return sorted(subjects.values(), key=fold_text)
+
+    def classes(self, teacher_id: Any = None, teacher_name: Any = None) -> set:
+        return {entry[2] for entry in self._entries(teacher_id, teacher_name).values()}
+
+    def slots_on(self, day: str, teacher_id: Any = None, teacher_name: Any = None) -> List[Dict]:
+        """Créneaux du professeur ce jour-là, par heure de début"""
+        slots = [entry[3] for entry in self._entries(teacher_id, teacher_name).values() if entry[3].get("day") == day]
+        return sorted(slots, key=lambda slot: str(slot.get("start_time", "")))
+
+
+def fold_text(value: Any) -> str:
+    """Minuscules sans accents, pour comparer les saisies de recherche"""
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def student_sort_key(student: Dict) -> int:
+    """Clé de tri numérique : premier groupe de chiffres de l'ID (STU0001 -> 1)"""
+    numbers = re.findall(r'\d+', str(student.get("student_id", student.get("id", 0))))
+    return int(numbers[0]) if numbers else 0
+
+
+class StudentSearchIndex:
+    """Index de recherche des élèves : texte normalisé et trigrammes
+
+    Pour chaque élève, l'ID, le prénom, le nom, le nom complet et le numéro
+    d'élève sont normalisés (minuscules, sans accents) une fois pour toutes.
+    Les requêtes d'au moins trois caractères ne vérifient que les élèves qui
+    possèdent tous les trigrammes de la requête.
+    """
+
+    def __init__(self, students: List[Dict]):
+        self.records: Dict[Any, Dict] = {}
+        self.haystacks: Dict[Any, str] = {}
+        self.sort_keys: Dict[Any, tuple] = {}
+        self.trigrams: Dict[str, set] = {}
+        self._next_position = 0
+
+        for student in students:
+            self.apply(None, student)
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _haystack(self, student: Dict) -> str:
+        prenom = str(student.get("prenom", ""))
+        nom = str(student.get("nom", ""))
+        fields = [
+            student.get("student_id", student.get("id", "")),
+            prenom,
+            nom,
+            f"{prenom} {nom}".strip(),
+            student.get("numero_eleve", "")
+        ]
+        # Séparateur absent des saisies : une correspondance reste dans un seul champ
+        return "\x00".join(fold_text(f) for f in fields)
+
+    def _remove(self, student_id: Any):
+        self.records.pop(student_id, None)
+        haystack = self.haystacks.pop(student_id, None)
+        if haystack is not None:
+            for trigram in self._trigrams(haystack):
+                postings = self.trigrams.get(trigram)
+                if postings is not None:
+                    postings.discard(student_id)
+                    if not postings:
+                        del self.trigrams[trigram]
+
+    def apply(self, old: Optional[Dict], new: Optional[Dict]):
+        """Répercuter l'écriture d'un élève (old -> new, None pour absence)"""
+        position = None
+        if old is not None:
+            old_id = old.get("id")
+            if new is not None and new.get("id") == old_id and old_id in self.sort_keys:
+                # Conserver la position d'origine pour un tri stable
+                position = self.sort_keys[old_id][1]
+            self._remove(old_id)
+            self.sort_keys.pop(old_id, None)
+
+        if new is None:
+            return
+
+        student_id = new.get("id")
+        if student_id in self.records:
+            position = self.sort_keys[student_id][1]
+            self._remove(student_id)
+        if position is None:
+            position = self._next_position
+            self._next_position += 1
+
+        haystack = self._haystack(new)
+        self.records[student_id] = new
+        self.haystacks[student_id] = haystack
+        self.sort_keys[student_id] = (student_sort_key(new), position)
+        for trigram in self._trigrams(haystack):
+            self.trigrams.setdefault(trigram, set()).add(student_id)
+
+    def search(self, query: str, class_name: Optional[str] = None) -> List[Dict]:
+        """Élèves correspondant à la requête (toute la classe si vide), triés par ID"""
+        term = fold_text(query.strip())
+
+        if len(term) >= 3:
+            # Intersection des listes de trigrammes, en commençant par la plus courte
+            postings = sorted((self.trigrams.get(t, set()) for t in self._trigrams(term)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        else:
+            candidates = self.records.keys()
+
+        matches = []
+        for student_id in candidates:
+            student = self.records[student_id]
+            if class_name is not None and student.get("classe") != class_name:
+                continue
+            if term and term not in self.haystacks[student_id]:
+                continue
+            matches.append(student_id)
+
+        matches.sort(key=self.sort_keys.__getitem__)
+        return [self.records[student_id] for student_id in matches]
@@ -0,0 +1,101 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Verrou lecteurs/rédacteur réentrant, partagé par les sessions d'un processus
+
+    Plusieurs lectures peuvent avoir lieu en même temps ; une écriture est
+    exclusive. Les rédacteurs en attente sont prioritaires sur les nouveaux
+    lecteurs pour ne pas être affamés pendant les périodes de forte lecture.
+    Un thread qui tient déjà le verrou peut le reprendre (lecture dans une
+    écriture, écriture dans une écriture) ; passer d'une lecture à une
+    écriture est refusé car deux threads pourraient s'y bloquer mutuellement.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._writers_waiting:
+                self._condition.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Impossible de passer d'un verrou de lecture à un verrou d'écriture")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def reads(method):
+    """Exécuter une méthode sous le verrou de lecture de l'objet (attribut _lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.read_locked():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def writes(method):
+    """Exécuter une méthode sous le verrou d'écriture de l'objet (attribut _lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.write_locked():
+            return method(self, *args, **kwargs)
+    return wrapper
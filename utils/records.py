@@ -0,0 +1,280 @@
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from enum import StrEnum
+from typing import Any, ClassVar, Dict, Optional
+
+
+class _Missing:
+    """Valeur d'un champ absent de l'enregistrement JSON d'origine"""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+class InternedEnum(StrEnum):
+    """Énumération de chaînes : une seule instance par valeur en mémoire
+
+    Les membres restent des str : comparaisons, clés de dictionnaire et JSON
+    se comportent comme avec la valeur d'origine ("premier" == Semester.PREMIER).
+    """
+
+    # Même hachage que la chaîne pour retrouver les clés str dans les dicts
+    __hash__ = str.__hash__
+
+
+class Semester(InternedEnum):
+    PREMIER = "premier"
+    DEUXIEME = "deuxieme"
+
+
+class GradeType(InternedEnum):
+    DEVOIR1 = "devoir1"
+    DEVOIR2 = "devoir2"
+    DEVOIR3 = "devoir3"
+    DEVOIR4 = "devoir4"
+    DEVOIR5 = "devoir5"
+    COMPOSITION = "composition"
+
+
+class Day(InternedEnum):
+    LUNDI = "Lundi"
+    MARDI = "Mardi"
+    MERCREDI = "Mercredi"
+    JEUDI = "Jeudi"
+    VENDREDI = "Vendredi"
+    SAMEDI = "Samedi"
+    DIMANCHE = "Dimanche"
+
+
+def intern_value(value: Any, enum: Optional[type] = None) -> Any:
+    """Membre d'énumération si la valeur est connue, sinon chaîne internée"""
+    if not isinstance(value, str):
+        return value
+    if enum is not None:
+        try:
+            return enum(value)
+        except ValueError:
+            pass
+    return sys.intern(value)
+
+
+class Record(Mapping):
+    """Enregistrement typé et immuable, lisible comme le dict JSON d'origine
+
+    Les champs connus sont des attributs (__slots__) ; les clés inconnues
+    sont conservées dans extra, et les champs absents valent MISSING, ce qui
+    rend la conversion JSON -> Record -> JSON sans perte. L'interface Mapping
+    (get, [], in, items...) garde le code existant fonctionnel ; le code
+    critique peut lire directement les attributs (grade.note).
+    """
+    __slots__ = ()
+
+    # Champs dont la valeur est une énumération, ou une chaîne à interner
+    _enums: ClassVar[Dict[str, type]] = {}
+    _interned: ClassVar[tuple] = ()
+    _field_names: ClassVar[tuple] = ()
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Record":
+        """Construire l'enregistrement depuis sa forme JSON"""
+        values = {}
+        extra = None
+        for key, value in data.items():
+            if key in cls._field_names:
+                enum = cls._enums.get(key)
+                if enum is not None or key in cls._interned:
+                    value = intern_value(value, enum)
+                values[key] = value
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        return cls(**values, extra=extra)
+
+    def to_dict(self) -> Dict:
+        """Forme JSON de l'enregistrement (nouveau dict)"""
+        return {key: self[key] for key in self}
+
+    def replace(self, **changes) -> "Record":
+        """Copie de l'enregistrement avec des champs modifiés"""
+        data = self.to_dict()
+        data.update(changes)
+        return type(self).from_dict(data)
+
+    def __getitem__(self, key):
+        if key in self._field_names:
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            return value
+        if self.extra is not None:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in self._field_names:
+            if getattr(self, name) is not MISSING:
+                yield name
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        count = sum(1 for name in self._field_names if getattr(self, name) is not MISSING)
+        return count + (len(self.extra) if self.extra is not None else 0)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record(cls):
+    """Décorateur des classes d'enregistrement : dataclass figée à __slots__"""
+    cls = dataclass(frozen=True, slots=True, eq=False, repr=False)(cls)
+    cls._field_names = tuple(f.name for f in fields(cls) if f.name != "extra")
+    return cls
+
+
+@record
+class Student(Record):
+    _interned = ("classe", "genre", "lieu_naissance")
+
+    id: Any = MISSING
+    student_id: Any = MISSING
+    prenom: Any = MISSING
+    nom: Any = MISSING
+    nom_complet: Any = MISSING
+    date_naissance: Any = MISSING
+    lieu_naissance: Any = MISSING
+    numero_eleve: Any = MISSING
+    telephone_parent: Any = MISSING
+    genre: Any = MISSING
+    classe: Any = MISSING
+    photo: Any = MISSING
+    date_creation: Any = MISSING
+    date_modification: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+@record
+class Teacher(Record):
+    _interned = ("genre", "matiere")
+
+    id: Any = MISSING
+    teacher_id: Any = MISSING
+    prenom: Any = MISSING
+    nom: Any = MISSING
+    nom_complet: Any = MISSING
+    date_naissance: Any = MISSING
+    lieu_naissance: Any = MISSING
+    email: Any = MISSING
+    telephone: Any = MISSING
+    residence: Any = MISSING
+    experience: Any = MISSING
+    genre: Any = MISSING
+    matiere: Any = MISSING
+    qualifications: Any = MISSING
+    date_inscription: Any = MISSING
+    date_creation: Any = MISSING
+    date_modification: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+@record
+class SchoolClass(Record):
+    _interned = ("nom",)
+
+    id: Any = MISSING
+    nom: Any = MISSING
+    date_creation: Any = MISSING
+    date_modification: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+@record
+class Subject(Record):
+    _enums = {"semestre": Semester}
+    _interned = ("nom", "classe")
+
+    id: Any = MISSING
+    nom: Any = MISSING
+    coefficient: Any = MISSING
+    semestre: Any = MISSING
+    classe: Any = MISSING
+    date_creation: Any = MISSING
+    date_modification: Any = MISSING
+    sync_from: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+@record
+class Grade(Record):
+    _enums = {"semester": Semester, "type": GradeType}
+    _interned = ("subject_id", "subject_name", "school_year", "class_name")
+
+    id: Any = MISSING
+    student_id: Any = MISSING
+    subject_id: Any = MISSING
+    subject_name: Any = MISSING
+    semester: Any = MISSING
+    type: Any = MISSING
+    note: Any = MISSING
+    date_creation: Any = MISSING
+    date_modification: Any = MISSING
+    school_year: Any = MISSING
+    class_name: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+@record
+class ScheduleSlot(Record):
+    _enums = {"day": Day}
+    _interned = ("class_name", "start_time", "end_time", "teacher_name", "subject", "color")
+
+    id: Any = MISSING
+    class_name: Any = MISSING
+    day: Any = MISSING
+    start_time: Any = MISSING
+    end_time: Any = MISSING
+    teacher_name: Any = MISSING
+    subject: Any = MISSING
+    color: Any = MISSING
+    created_at: Any = MISSING
+    updated_at: Any = MISSING
+    teacher_id: Any = MISSING
+    extra: Optional[Dict] = None
+
+
+# Type d'enregistrement de chaque collection (les autres restent des dicts)
+RECORD_TYPES = {
+    "students": Student,
+    "teachers": Teacher,
+    "classes": SchoolClass,
+    "subjects": Subject,
+    "grades": Grade,
+    "schedule": ScheduleSlot,
+}
+
+
+def to_record(collection: str, data: Any) -> Any:
+    """Convertir un dict JSON dans le type d'enregistrement de sa collection"""
+    record_type = RECORD_TYPES.get(collection)
+    if record_type is None or not isinstance(data, dict):
+        return data
+    return record_type.from_dict(data)
+
+
+def to_json(value: Any) -> Dict:
+    """Fonction default= de json.dump pour sérialiser les enregistrements"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Objet de type {type(value).__name__} non sérialisable en JSON")
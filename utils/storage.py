@@ -0,0 +1,889 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Any
+from urllib.parse import quote
+
+from utils.records import RECORD_TYPES, to_record, to_json
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrouillage limité au processus courant
+    fcntl = None
+
+
+# Description des collections : fichier JSON, clé primaire, colonnes indexées et,
+# pour les notes, champs de partitionnement (un fichier par année/semestre/classe)
+COLLECTIONS = {
+    "students": {"file": "students.json", "key": "id", "indexes": ["classe"]},
+    "teachers": {"file": "teachers.json", "key": "id", "indexes": []},
+    "classes": {"file": "classes.json", "key": "id", "indexes": []},
+    "grades": {"file": "grades.json", "key": "id",
+               "indexes": ["student_id", "subject_id", "semester", "school_year", "class_name"],
+               "partition": ["school_year", "semester", "class_name"]},
+    "subjects": {"file": "subjects.json", "key": "id", "indexes": ["classe", "semestre"]},
+    "attendance": {"file": "attendance.json", "key": None, "indexes": ["student_id"]},
+    "schedule": {"file": "schedule.json", "key": "id", "indexes": ["class_name", "teacher_id", "day"]},
+    "homework_config": {"file": "homework_config.json", "key": None, "indexes": ["class_name", "subject_id"]},
+    "subject_settings": {"file": "subject_settings.json", "key": None, "indexes": ["class_name", "subject_id"]},
+    "averages": {"file": "averages.json", "key": "id", "indexes": ["class_name", "semester"]},
+}
+
+
+class DataCorruptionError(Exception):
+    """Fichier de données illisible et sans sauvegarde exploitable"""
+
+
+class StaleVersionError(Exception):
+    """La collection a été modifiée depuis la version lue par l'écrivain"""
+
+
+def school_year_of(date_iso: Optional[str] = None) -> str:
+    """Année scolaire (septembre à août) d'une date ISO, l'année en cours par défaut"""
+    try:
+        date = datetime.fromisoformat(date_iso) if date_iso else datetime.now()
+    except (TypeError, ValueError):
+        date = datetime.now()
+    start = date.year if date.month >= 9 else date.year - 1
+    return f"{start}-{start + 1}"
+
+
+def grade_id(student_id: Any, subject_id: Any, grade_type: Any, school_year: str) -> str:
+    """ID d'une note : l'année scolaire en fait partie, les notes des années passées sont conservées
+
+    Les IDs de matière (<semestre>_<classe>_<numéro>) se répètent d'une année
+    à l'autre ; sans l'année, une note de la nouvelle année remplacerait
+    celle de l'année précédente.
+    """
+    return f"{school_year}_{student_id}_{subject_id}_{grade_type}"
+
+
+def qualify_legacy_grade_ids(grades: List[Dict]) -> Dict[Any, Dict]:
+    """Ajouter l'année scolaire aux IDs de notes de l'ancien format (<élève>_<matière>_<type>)
+
+    Les notes doivent déjà porter leur année (fill_grade_partition_fields).
+    Retourne les notes renommées, par ancien ID.
+    """
+    renamed = {}
+    for grade in grades:
+        legacy_id = f"{grade.get('student_id')}_{grade.get('subject_id')}_{grade.get('type')}"
+        if grade.get("id") == legacy_id:
+            renamed[legacy_id] = grade
+            grade["id"] = grade_id(grade.get("student_id"), grade.get("subject_id"), grade.get("type"),
+                                   grade.get("school_year"))
+    return renamed
+
+
+def fill_grade_partition_fields(grades: List[Dict], subjects: List[Dict]):
+    """Compléter l'année scolaire et la classe des notes qui n'en ont pas
+
+    La classe vient de la matière ; à défaut, de l'ID de matière
+    (<semestre>_<classe>_<numéro>).
+    """
+    subject_classes = {s.get("id"): s.get("classe") for s in subjects}
+    for grade in grades:
+        if not grade.get("school_year"):
+            grade["school_year"] = school_year_of(grade.get("date_creation"))
+        if not grade.get("class_name"):
+            class_name = subject_classes.get(grade.get("subject_id"))
+            if class_name is None:
+                parts = str(grade.get("subject_id", "")).split("_")
+                class_name = "_".join(parts[1:-1]) or None
+            grade["class_name"] = class_name
+
+
+def copy_records(value):
+    """Copier récursivement une structure JSON (listes/dicts) sans passer par copy.deepcopy
+
+    Les enregistrements typés (utils.records) sont immuables : ils sont
+    partagés tels quels.
+    """
+    if isinstance(value, dict):
+        return {k: copy_records(v) if isinstance(v, (dict, list)) else v for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_records(v) if isinstance(v, (dict, list)) else v for v in value]
+    return value
+
+
+class StorageEngine:
+    """Interface commune des moteurs de stockage utilisés par DataManager
+
+    Une collection est une liste ordonnée d'enregistrements (dicts JSON).
+    Les collections possédant une clé primaire (voir COLLECTIONS) supportent
+    en plus les écritures et suppressions unitaires.
+    """
+
+    def initialize(self):
+        """Préparer le stockage (fichiers ou tables vides)"""
+
+    def load(self, collection: str, shared: bool = False) -> List[Dict]:
+        """Charger toute une collection (shared=True : vue partagée en lecture seule)"""
+        raise NotImplementedError
+
+    def save(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Remplacer toute une collection
+
+        Avec expected_version, StaleVersionError est levée si la collection a
+        changé depuis cette version (lecture-modification-écriture concurrente).
+        """
+        raise NotImplementedError
+
+    def version(self, collection: str) -> Any:
+        """Jeton qui change à chaque modification de la collection (index dérivés)"""
+        raise NotImplementedError
+
+    @contextmanager
+    def locked(self, collection: str):
+        """Section exclusive sur une collection (réentrante dans un même thread)
+
+        Par défaut le moteur sérialise lui-même ses écritures (transactions) :
+        la détection des versions obsolètes suffit alors.
+        """
+        yield
+
+    def find(self, collection: str, **criteria) -> List[Dict]:
+        """Récupérer les enregistrements dont les champs valent exactement les critères"""
+        return [copy_records(r) for r in self.load(collection, shared=True)
+                if all(r.get(field) == value for field, value in criteria.items())]
+
+    def existing_keys(self, collection: str, keys: List[Any]) -> set:
+        """Sous-ensemble des clés primaires déjà présentes dans la collection"""
+        key = COLLECTIONS[collection]["key"]
+        wanted = set(keys)
+        return {r.get(key) for r in self.load(collection, shared=True) if r.get(key) in wanted}
+
+    def upsert(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Insérer ou remplacer des enregistrements selon leur clé primaire"""
+        raise NotImplementedError
+
+    def delete(self, collection: str, key_value: Any, expected_version: Any = None) -> bool:
+        """Supprimer l'enregistrement portant cette clé primaire"""
+        raise NotImplementedError
+
+
+class JsonStorage(StorageEngine):
+    """Stockage historique : un fichier JSON par collection, gardé en mémoire
+
+    Chaque collection possède un fichier de verrou (.<collection>.lock) : il
+    porte le verrou consultatif fcntl qui sérialise les écritures entre
+    processus et le numéro de version incrémenté à chaque écriture.
+
+    Les collections partitionnées (clé "partition" dans COLLECTIONS) sont
+    réparties dans un répertoire à leur nom : un fichier par partition et un
+    manifeste (manifest.json) qui liste les partitions et leur effectif. Une
+    écriture ne réécrit que les partitions touchées et le manifeste.
+    """
+
+    def __init__(self, data_dir: str = "data"):
+        self.data_dir = data_dir
+        # Cache mémoire des fichiers : chemin -> ((inode, mtime_ns, taille), données)
+        self._cache: Dict[str, Tuple[Tuple[int, int, int], List[Dict]]] = {}
+        # Collections partitionnées réassemblées : collection -> (version, enregistrements)
+        self._assembled: Dict[str, Tuple[Any, List[Dict]]] = {}
+        # Verrous détenus par ce processus : collection -> [verrou de thread, profondeur, descripteur]
+        self._locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+
+    @staticmethod
+    def _is_partitioned(collection: str) -> bool:
+        return "partition" in COLLECTIONS[collection]
+
+    def file_path(self, collection: str) -> str:
+        """Chemin du fichier JSON d'une collection (manifeste si elle est partitionnée)"""
+        if self._is_partitioned(collection):
+            return os.path.join(self.data_dir, collection, "manifest.json")
+        return os.path.join(self.data_dir, COLLECTIONS[collection]["file"])
+
+    def partition_path(self, collection: str, partition: Dict) -> str:
+        """Chemin du fichier d'une partition décrite dans le manifeste"""
+        return os.path.join(self.data_dir, collection, *partition["file"].split("/"))
+
+    def initialize(self):
+        """Créer le répertoire et les fichiers JSON vides manquants"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        for collection in COLLECTIONS:
+            file_path = self.file_path(collection)
+            if os.path.exists(file_path):
+                continue
+            if self._is_partitioned(collection):
+                self._create_partitions(collection)
+            else:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump([], f, ensure_ascii=False, indent=2)
+
+    def _create_partitions(self, collection: str):
+        """Créer le manifeste d'une collection partitionnée
+
+        Un ancien fichier plat (grades.json) est réparti dans les partitions
+        puis renommé en <fichier>.migrated.
+        """
+        os.makedirs(os.path.dirname(self.file_path(collection)), exist_ok=True)
+        legacy_path = os.path.join(self.data_dir, COLLECTIONS[collection]["file"])
+        with self.locked(collection):
+            if os.path.exists(self.file_path(collection)):
+                return
+            records = []
+            if os.path.exists(legacy_path):
+                records = self._read_json(legacy_path)
+                if collection == "grades":
+                    fill_grade_partition_fields(records, self.load("subjects", shared=True))
+                    qualify_legacy_grade_ids(records)
+            if not self._write_partitions(collection, [], records, replace=True):
+                raise OSError(f"Impossible de créer les partitions de {collection}")
+            if os.path.exists(legacy_path):
+                os.replace(legacy_path, legacy_path + ".migrated")
+                print(f"{len(records)} enregistrement(s) de {legacy_path} répartis par partition")
+
+    @staticmethod
+    def _file_signature(file_path: str) -> Optional[Tuple[int, int, int]]:
+        """Signature (inode, mtime, taille) d'un fichier, None s'il n'existe pas
+
+        Chaque écriture remplace le fichier par un nouveau (os.replace) :
+        l'inode change même si la date et la taille sont identiques.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def lock_path(self, collection: str) -> str:
+        """Chemin du fichier de verrou et de version d'une collection"""
+        return os.path.join(self.data_dir, f".{collection}.lock")
+
+    def _read_stamp(self, collection: str) -> int:
+        """Numéro de version écrit dans le fichier de verrou (0 s'il n'existe pas)"""
+        try:
+            with open(self.lock_path(collection), 'rb') as f:
+                return int(f.read(20) or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def version(self, collection: str) -> Any:
+        """(numéro de version, inode, mtime, taille) du fichier (ou manifeste), None s'il n'existe pas
+
+        Le numéro détecte les écritures des autres processus même lorsque
+        le fichier semble inchangé.
+        """
+        signature = self._file_signature(self.file_path(collection))
+        if signature is None:
+            return None
+        return (self._read_stamp(collection),) + signature
+
+    @contextmanager
+    def locked(self, collection: str):
+        """Verrou exclusif de la collection : threads du processus puis autres processus (fcntl)"""
+        with self._locks_guard:
+            entry = self._locks.setdefault(collection, [threading.RLock(), 0, None])
+        entry[0].acquire()
+        try:
+            if entry[1] == 0:
+                fd = os.open(self.lock_path(collection), os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    except OSError:
+                        os.close(fd)
+                        raise
+                entry[2] = fd
+            entry[1] += 1
+            try:
+                yield
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    fd, entry[2] = entry[2], None
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+        finally:
+            entry[0].release()
+
+    def _bump_stamp(self, collection: str):
+        """Incrémenter le numéro de version (verrou de la collection détenu)"""
+        fd = self._locks[collection][2]
+        stamp = self._read_stamp(collection) + 1
+        # Largeur fixe : une seule écriture, sans troncature visible des lecteurs
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, f"{stamp:020d}".encode())
+
+    def _check_version(self, collection: str, expected_version: Any):
+        if expected_version is not None and self.version(collection) != expected_version:
+            raise StaleVersionError(f"La collection {collection} a été modifiée entre-temps")
+
+    @staticmethod
+    def _read_json(file_path: str) -> List[Dict]:
+        """Lire un fichier de collection ; ValueError si le contenu est invalide"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"{file_path} ne contient pas une liste")
+        return data
+
+    def _load_file(self, collection: str, file_path: str, decode: bool = True) -> List[Dict]:
+        """Contenu (partagé) d'un fichier, relu seulement s'il a changé sur le disque
+
+        Avec decode=True, les enregistrements sont convertis dans le type de la
+        collection (utils.records) ; le manifeste des partitions reste en dicts.
+        Un fichier corrompu est restauré depuis sa sauvegarde .bak ; sans
+        sauvegarde valide, DataCorruptionError est levée plutôt que de renvoyer
+        une liste vide qui effacerait les données à la prochaine écriture.
+        """
+        signature = self._file_signature(file_path)
+        cached = self._cache.get(file_path)
+        if cached is not None and signature is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            data = self._read_json(file_path)
+        except FileNotFoundError:
+            self._cache.pop(file_path, None)
+            return []
+        except ValueError as e:
+            # JSONDecodeError et UnicodeDecodeError sont des ValueError
+            self._cache.pop(file_path, None)
+            data = self._recover_from_backup(collection, file_path, e)
+            signature = self._file_signature(file_path)
+
+        if decode and collection in RECORD_TYPES:
+            data = [to_record(collection, r) for r in data]
+        if signature is not None:
+            self._cache[file_path] = (signature, data)
+        return data
+
+    def load(self, collection: str, shared: bool = False) -> List[Dict]:
+        """Charger une collection depuis son fichier JSON (ou toutes ses partitions)
+
+        La collection reste en mémoire après la première lecture et n'est relue
+        que si le fichier a changé sur le disque.
+        """
+        if not self._is_partitioned(collection):
+            data = self._load_file(collection, self.file_path(collection))
+            return data if shared else copy_records(data)
+
+        version = self.version(collection)
+        assembled = self._assembled.get(collection)
+        if assembled is None or version is None or assembled[0] != version:
+            data = []
+            for partition in self._load_file(collection, self.file_path(collection), decode=False):
+                data.extend(self._load_file(collection, self.partition_path(collection, partition)))
+            assembled = (version, data)
+            if version is not None:
+                self._assembled[collection] = assembled
+        return assembled[1] if shared else copy_records(assembled[1])
+
+    def partitions(self, collection: str) -> List[Dict]:
+        """Entrées du manifeste d'une collection partitionnée (clé, fichier, effectif)"""
+        return copy_records(self._load_file(collection, self.file_path(collection), decode=False))
+
+    def find(self, collection: str, **criteria) -> List[Dict]:
+        """Recherche ; pour une collection partitionnée, seules les partitions compatibles sont lues"""
+        if not self._is_partitioned(collection):
+            return super().find(collection, **criteria)
+
+        fields = COLLECTIONS[collection]["partition"]
+        wanted = dict(zip(fields, self._partition_key(criteria, fields)))
+        results = []
+        for partition in self._load_file(collection, self.file_path(collection), decode=False):
+            key = dict(zip(fields, partition["key"]))
+            if any(field in criteria and wanted[field] != value for field, value in key.items()):
+                continue
+            for record in self._load_file(collection, self.partition_path(collection, partition)):
+                if all(record.get(field) == value for field, value in criteria.items()):
+                    results.append(copy_records(record))
+        return results
+
+    def _recover_from_backup(self, collection: str, file_path: str, error: Exception) -> List[Dict]:
+        """Restaurer un fichier corrompu depuis sa sauvegarde .bak"""
+        backup_path = file_path + ".bak"
+        try:
+            data = self._read_json(backup_path)
+        except (OSError, ValueError):
+            raise DataCorruptionError(
+                f"{file_path} est corrompu ({error}) et aucune sauvegarde valide n'existe"
+            ) from error
+
+        print(f"Attention: {file_path} est corrompu ({error}), restauration depuis {backup_path}")
+        # Conserver le fichier corrompu pour analyse puis réécrire le fichier
+        shutil.copy2(file_path, file_path + ".corrupt")
+        with self.locked(collection):
+            if not self._write_file(file_path, data, None):
+                raise DataCorruptionError(f"Impossible de restaurer {file_path}") from error
+            self._bump_stamp(collection)
+        return data
+
+    def _rotate_backup(self, file_path: str):
+        """Conserver la version actuelle (valide) du fichier dans <fichier>.bak"""
+        cached = self._cache.get(file_path)
+        signature = self._file_signature(file_path)
+        if signature is None:
+            return
+        if cached is None or cached[0] != signature:
+            # Version jamais lue par ce processus : ne sauvegarder que si elle est valide
+            try:
+                self._read_json(file_path)
+            except (OSError, ValueError):
+                return
+
+        backup_path = file_path + ".bak"
+        backup_tmp = backup_path + ".tmp"
+        try:
+            # Lien physique : aucune copie, l'ancien contenu reste accessible après le remplacement
+            if os.path.exists(backup_tmp):
+                os.remove(backup_tmp)
+            os.link(file_path, backup_tmp)
+        except OSError:
+            shutil.copy2(file_path, backup_tmp)
+        os.replace(backup_tmp, backup_path)
+
+    @staticmethod
+    def _fsync_directory(directory: str):
+        """Rendre durable le renommage (sans effet sur les systèmes qui ne le permettent pas)"""
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+    def _write_file(self, file_path: str, records: List[Dict], collection: Optional[str]) -> bool:
+        """Écrire un fichier de façon atomique (écriture traversante du cache)
+
+        Fichier temporaire dans le même répertoire, fsync puis os.replace : un
+        lecteur voit toujours l'ancienne ou la nouvelle version complète,
+        jamais un fichier tronqué. Le cache reçoit les enregistrements typés
+        de la collection (None : contenu gardé tel quel, manifeste).
+        """
+        directory = os.path.dirname(file_path) or "."
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory
+            )
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2, default=to_json)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._rotate_backup(file_path)
+            os.replace(tmp_path, file_path)
+            tmp_path = None
+            self._fsync_directory(directory)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde: {e}")
+            self._cache.pop(file_path, None)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        signature = self._file_signature(file_path)
+        if signature is None:
+            self._cache.pop(file_path, None)
+        elif collection in RECORD_TYPES:
+            self._cache[file_path] = (signature, [to_record(collection, r) for r in records])
+        else:
+            # Copie pour que l'appelant puisse continuer à modifier sa liste
+            self._cache[file_path] = (signature, copy_records(records))
+        return True
+
+    @staticmethod
+    def _partition_file(key: tuple) -> str:
+        """Chemin relatif du fichier d'une partition (année/semestre/classe.json)
+
+        Chaque valeur est encodée en pourcentage, points compris : deux valeurs
+        différentes donnent toujours des noms différents ("6e A" -> 6e%20A,
+        "6e_A" -> 6e_A) et aucun nom ne sort du répertoire. Une valeur absente
+        s'écrit "%", que l'encodage ne produit jamais seul.
+        """
+        parts = [quote(str(part), safe="").replace(".", "%2E") if part not in (None, "") else "%"
+                 for part in key]
+        return "/".join(parts) + ".json"
+
+    @staticmethod
+    def _partition_key(record: Dict, fields: List[str]) -> tuple:
+        """Clé de partition d'un enregistrement (chaîne vide et absence confondues)"""
+        return tuple(None if record.get(f) in (None, "") else record.get(f) for f in fields)
+
+    def _write_partitions(self, collection: str, manifest: List[Dict], records: List[Dict],
+                          replace: bool = False, removed: Optional[Dict[tuple, set]] = None) -> bool:
+        """Fusionner des enregistrements dans leurs partitions puis réécrire le manifeste
+
+        Seules les partitions concernées sont relues et réécrites. Avec
+        replace=True, les partitions absentes de records sont vidées (save).
+        removed associe une clé de partition aux clés primaires à retirer.
+        """
+        spec = COLLECTIONS[collection]
+        key_field = spec["key"]
+        groups: Dict[tuple, List[Dict]] = {}
+        for record in records:
+            groups.setdefault(self._partition_key(record, spec["partition"]), []).append(record)
+
+        entries = {tuple(p["key"]): dict(p) for p in manifest}
+        touched = set(groups) | set(removed or {})
+        if replace:
+            touched |= set(entries)
+
+        # Nouvelles partitions : refuser avant toute écriture un fichier déjà attribué
+        files = {e["file"]: key for key, e in entries.items()}
+        for key in touched - set(entries):
+            file_name = self._partition_file(key)
+            if files.get(file_name, key) != key:
+                print(f"Erreur lors de la sauvegarde: les partitions {key} et {files[file_name]} "
+                      f"partageraient le fichier {file_name}")
+                return False
+            files[file_name] = key
+            entries[key] = {"key": list(key), "file": file_name, "count": 0}
+
+        for key in touched:
+            entry = entries[key]
+            file_path = self.partition_path(collection, entry)
+            data = [] if replace else copy_records(self._load_file(collection, file_path))
+            positions = {r.get(key_field): i for i, r in enumerate(data)}
+            for record in groups.get(key, []):
+                key_value = record.get(key_field)
+                if key_value in positions:
+                    data[positions[key_value]] = record
+                else:
+                    positions[key_value] = len(data)
+                    data.append(record)
+            if removed and key in removed:
+                data = [r for r in data if r.get(key_field) not in removed[key]]
+
+            if data:
+                if not self._write_file(file_path, data, collection):
+                    return False
+            elif os.path.exists(file_path):
+                # Partition vidée : retirée du manifeste, fichier supprimé
+                os.remove(file_path)
+                self._cache.pop(file_path, None)
+            entry["count"] = len(data)
+            entries[key] = entry
+
+        new_manifest = sorted((e for e in entries.values() if e["count"]),
+                              key=lambda e: [str(part) for part in e["key"]])
+        if not self._write_file(self.file_path(collection), new_manifest, None):
+            return False
+        self._bump_stamp(collection)
+        return True
+
+    def save(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Sauvegarder une collection complète (écriture atomique de chaque fichier)"""
+        with self.locked(collection):
+            self._check_version(collection, expected_version)
+            if self._is_partitioned(collection):
+                manifest = self._load_file(collection, self.file_path(collection), decode=False)
+                return self._write_partitions(collection, manifest, records, replace=True)
+            return self._write(collection, records)
+
+    def _write(self, collection: str, records: List[Dict]) -> bool:
+        """Écrire le fichier et incrémenter sa version (verrou de la collection détenu)"""
+        if not self._write_file(self.file_path(collection), records, collection):
+            return False
+        self._bump_stamp(collection)
+        return True
+
+    def upsert(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Insérer ou remplacer des enregistrements puis réécrire le fichier une seule fois
+
+        Le fichier est relu sous verrou : les enregistrements écrits entre-temps
+        par un autre processus sont conservés. Pour une collection partitionnée,
+        seules les partitions des enregistrements écrits sont réécrites.
+        """
+        if not records:
+            return True
+        key = COLLECTIONS[collection]["key"]
+        with self.locked(collection):
+            self._check_version(collection, expected_version)
+            if self._is_partitioned(collection):
+                manifest = self._load_file(collection, self.file_path(collection), decode=False)
+                return self._write_partitions(collection, manifest, records)
+
+            data = self.load(collection)
+            positions = {r.get(key): i for i, r in enumerate(data)}
+
+            for record in records:
+                key_value = record.get(key)
+                if key_value in positions:
+                    data[positions[key_value]] = record
+                else:
+                    positions[key_value] = len(data)
+                    data.append(record)
+
+            return self._write(collection, data)
+
+    def delete(self, collection: str, key_value: Any, expected_version: Any = None) -> bool:
+        """Supprimer un enregistrement puis réécrire le fichier (ou sa seule partition)"""
+        key = COLLECTIONS[collection]["key"]
+        with self.locked(collection):
+            self._check_version(collection, expected_version)
+            if self._is_partitioned(collection):
+                manifest = self._load_file(collection, self.file_path(collection), decode=False)
+                removed = {}
+                for partition in manifest:
+                    partition_data = self._load_file(collection, self.partition_path(collection, partition))
+                    if any(r.get(key) == key_value for r in partition_data):
+                        removed[tuple(partition["key"])] = {key_value}
+                return self._write_partitions(collection, manifest, [], removed=removed)
+
+            data = self.load(collection)
+            return self._write(collection, [r for r in data if r.get(key) != key_value])
+
+
+class SQLiteStorage(StorageEngine):
+    """Stockage SQLite : une table par collection, clé primaire et index secondaires
+
+    Chaque ligne conserve l'enregistrement complet en JSON (colonne data) pour
+    rester fidèle au format des fichiers ; la clé et les champs de recherche
+    sont dupliqués dans des colonnes indexées.
+    """
+
+    def __init__(self, db_path: str = os.path.join("data", "school.db")):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Collections décodées, par collection : (compteur d'écritures, enregistrements)
+        self._cache: Dict[str, Tuple[Any, List[Dict]]] = {}
+
+    def initialize(self):
+        """Créer les tables et index manquants"""
+        with self.conn:
+            # Compteur d'écritures par collection, incrémenté dans la transaction d'écriture
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS "_versions" (collection TEXT PRIMARY KEY, counter INTEGER NOT NULL)'
+            )
+            for collection, spec in COLLECTIONS.items():
+                # Colonnes sans type : entiers et chaînes sont conservés tels quels
+                columns = ", ".join(f'"{c}"' for c in spec["indexes"])
+                self.conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{collection}" ('
+                    f'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    f'"key" UNIQUE{", " + columns if columns else ""}, '
+                    f'data TEXT NOT NULL)'
+                )
+                # Colonnes indexées ajoutées depuis la création de la table
+                existing = {row[1] for row in self.conn.execute(f'PRAGMA table_info("{collection}")')}
+                for column in spec["indexes"]:
+                    if column not in existing:
+                        self.conn.execute(f'ALTER TABLE "{collection}" ADD COLUMN "{column}"')
+                        self.conn.execute(
+                            f'UPDATE "{collection}" SET "{column}" = json_extract(data, ?)',
+                            (f'$."{column}"',)
+                        )
+                for column in spec["indexes"]:
+                    self.conn.execute(
+                        f'CREATE INDEX IF NOT EXISTS "idx_{collection}_{column}" '
+                        f'ON "{collection}" ("{column}")'
+                    )
+                if "partition" in spec:
+                    # Segment de table par partition : un index composite suffit
+                    columns = ", ".join(f'"{c}"' for c in spec["partition"])
+                    self.conn.execute(
+                        f'CREATE INDEX IF NOT EXISTS "idx_{collection}_partition" '
+                        f'ON "{collection}" ({columns})'
+                    )
+
+        # Notes enregistrées avant le partitionnement : année scolaire, classe et ID avec l'année
+        rows = self.conn.execute('SELECT data FROM "grades" WHERE "school_year" IS NULL').fetchall()
+        if rows:
+            grades = [json.loads(row[0]) for row in rows]
+            fill_grade_partition_fields(grades, self.load("subjects"))
+            renamed = qualify_legacy_grade_ids(grades)
+            with self.conn:
+                self.conn.executemany('DELETE FROM "grades" WHERE "key" = ?', [(k,) for k in renamed])
+                self.conn.executemany(self._insert_sql("grades", upsert=True),
+                                      [self._row_values("grades", g) for g in grades])
+                self._touch("grades")
+
+    def _row_values(self, collection: str, record: Dict) -> tuple:
+        """Valeurs (clé, colonnes indexées, JSON) d'un enregistrement"""
+        spec = COLLECTIONS[collection]
+        key_value = record.get(spec["key"]) if spec["key"] else None
+        indexed = tuple(record.get(c) for c in spec["indexes"])
+        return (key_value,) + indexed + (json.dumps(record, ensure_ascii=False, default=to_json),)
+
+    def _insert_sql(self, collection: str, upsert: bool) -> str:
+        spec = COLLECTIONS[collection]
+        columns = ['"key"'] + [f'"{c}"' for c in spec["indexes"]] + ["data"]
+        sql = (f'INSERT INTO "{collection}" ({", ".join(columns)}) '
+               f'VALUES ({", ".join("?" for _ in columns)})')
+        if upsert:
+            # Conserver seq pour garder l'ordre d'insertion d'origine
+            updates = ", ".join(f"{c}=excluded.{c}" for c in columns[1:])
+            sql += f' ON CONFLICT("key") DO UPDATE SET {updates}'
+        return sql
+
+    def version(self, collection: str) -> Any:
+        """Compteur d'écritures de la collection, partagé entre connexions et processus
+
+        PRAGMA data_version change à chaque écriture d'une autre connexion,
+        quelle que soit la table : il rendrait périmés les index et les versions
+        attendues de toutes les collections à la moindre écriture.
+        """
+        row = self.conn.execute(
+            'SELECT counter FROM "_versions" WHERE collection = ?', (collection,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _begin_write(self, collection: str, expected_version: Any):
+        """Ouvrir la transaction d'écriture (verrou de la base) et vérifier la version"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        if expected_version is not None and self.version(collection) != expected_version:
+            raise StaleVersionError(f"La collection {collection} a été modifiée entre-temps")
+
+    def _touch(self, collection: str):
+        """Incrémenter le compteur d'écritures (à appeler dans la transaction)"""
+        self.conn.execute(
+            'INSERT INTO "_versions" (collection, counter) VALUES (?, 1) '
+            'ON CONFLICT(collection) DO UPDATE SET counter = counter + 1',
+            (collection,)
+        )
+
+    def load(self, collection: str, shared: bool = False) -> List[Dict]:
+        """Charger toute une collection dans l'ordre d'insertion
+
+        La collection décodée reste en mémoire et n'est relue que si son
+        compteur d'écritures a changé (écriture de ce processus ou d'un autre).
+        """
+        # Compteur lu avant les lignes : une écriture intercalée ne fait que forcer une relecture
+        version = self.version(collection)
+        cached = self._cache.get(collection)
+        if cached is None or cached[0] != version:
+            rows = self.conn.execute(f'SELECT data FROM "{collection}" ORDER BY seq')
+            cached = (version, [to_record(collection, json.loads(row[0])) for row in rows])
+            self._cache[collection] = cached
+        return cached[1] if shared else copy_records(cached[1])
+
+    def save(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Remplacer toute une collection dans une transaction"""
+        try:
+            with self.conn:
+                self._begin_write(collection, expected_version)
+                self.conn.execute(f'DELETE FROM "{collection}"')
+                self.conn.executemany(
+                    self._insert_sql(collection, upsert=True),
+                    [self._row_values(collection, r) for r in records]
+                )
+                self._touch(collection)
+            return True
+        except StaleVersionError:
+            raise
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde: {e}")
+            return False
+
+    def existing_keys(self, collection: str, keys: List[Any]) -> set:
+        """Clés déjà présentes, par paquets pour rester sous la limite de paramètres"""
+        found = set()
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self.conn.execute(
+                f'SELECT "key" FROM "{collection}" WHERE "key" IN ({placeholders})', chunk
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def find(self, collection: str, **criteria) -> List[Dict]:
+        """Recherche par index pour les colonnes connues, filtrage Python pour le reste"""
+        spec = COLLECTIONS[collection]
+        clauses, params, remaining = [], [], {}
+        for field, value in criteria.items():
+            if field == spec["key"]:
+                clauses.append('"key" = ?')
+                params.append(value)
+            elif field in spec["indexes"]:
+                clauses.append(f'"{field}" = ?')
+                params.append(value)
+            else:
+                remaining[field] = value
+
+        sql = f'SELECT data FROM "{collection}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY seq"
+
+        records = [to_record(collection, json.loads(row[0])) for row in self.conn.execute(sql, params)]
+        if remaining:
+            records = [r for r in records
+                       if all(r.get(f) == v for f, v in remaining.items())]
+        return records
+
+    def upsert(self, collection: str, records: List[Dict], expected_version: Any = None) -> bool:
+        """Insérer ou remplacer des enregistrements ligne par ligne"""
+        try:
+            with self.conn:
+                self._begin_write(collection, expected_version)
+                self.conn.executemany(
+                    self._insert_sql(collection, upsert=True),
+                    [self._row_values(collection, r) for r in records]
+                )
+                self._touch(collection)
+            return True
+        except StaleVersionError:
+            raise
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde: {e}")
+            return False
+
+    def delete(self, collection: str, key_value: Any, expected_version: Any = None) -> bool:
+        """Supprimer une ligne par clé primaire"""
+        try:
+            with self.conn:
+                self._begin_write(collection, expected_version)
+                self.conn.execute(f'DELETE FROM "{collection}" WHERE "key" = ?', (key_value,))
+                self._touch(collection)
+            return True
+        except StaleVersionError:
+            raise
+        except Exception as e:
+            print(f"Erreur lors de la suppression: {e}")
+            return False
+
+
+def create_storage(data_dir: str = "data") -> StorageEngine:
+    """Créer le moteur de stockage choisi par la variable SCHOOL_STORAGE (json par défaut)"""
+    if os.environ.get("SCHOOL_STORAGE", "json").lower() == "sqlite":
+        return SQLiteStorage(os.path.join(data_dir, "school.db"))
+    return JsonStorage(data_dir)
+
+
+def migrate_json_to_sqlite(data_dir: str = "data", db_path: Optional[str] = None) -> Dict[str, int]:
+    """Copier toutes les collections JSON existantes dans une base SQLite
+
+    Retourne le nombre d'enregistrements migrés par collection.
+    """
+    source = JsonStorage(data_dir)
+    # Répartit au besoin l'ancien grades.json dans ses partitions avant la copie
+    source.initialize()
+    target = SQLiteStorage(db_path or os.path.join(data_dir, "school.db"))
+    target.initialize()
+
+    migrated = {}
+    for collection in COLLECTIONS:
+        records = source.load(collection, shared=True)
+        if not target.save(collection, records):
+            raise RuntimeError(f"Échec de la migration de la collection {collection}")
+        migrated[collection] = len(records)
+
+    target.conn.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    # Utilisation : python -m utils.storage [répertoire_data] [fichier.db]
+    counts = migrate_json_to_sqlite(*sys.argv[1:3])
+    for name, count in counts.items():
+        print(f"{name}: {count} enregistrement(s) migré(s)")
@@ -0,0 +1,269 @@
+import csv
+import os
+from datetime import date, datetime
+from typing import List, Dict, Optional, Any, Iterator, Callable
+
+from utils.indexes import fold_text
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Champs obligatoires, dans l'ordre et avec les messages de save_student
+REQUIRED_FIELDS = [
+    ("prenom", "Le prénom est obligatoire"),
+    ("nom", "Le nom est obligatoire"),
+    ("classe", "La classe est obligatoire"),
+    ("date_naissance", "La date de naissance est obligatoire"),
+    ("lieu_naissance", "Le lieu de naissance est obligatoire"),
+    ("telephone_parent", "Le téléphone parent est obligatoire"),
+]
+
+# En-têtes reconnus (minuscules, sans accents ni "_") -> champ élève
+COLUMN_ALIASES = {
+    "prenom": "prenom",
+    "prenoms": "prenom",
+    "nom": "nom",
+    "nom de famille": "nom",
+    "classe": "classe",
+    "date naissance": "date_naissance",
+    "date de naissance": "date_naissance",
+    "ne le": "date_naissance",
+    "lieu naissance": "lieu_naissance",
+    "lieu de naissance": "lieu_naissance",
+    "ne a": "lieu_naissance",
+    "telephone parent": "telephone_parent",
+    "telephone du parent": "telephone_parent",
+    "n° parent": "telephone_parent",
+    "numero eleve": "numero_eleve",
+    "numero d'eleve": "numero_eleve",
+    "matricule": "numero_eleve",
+    "genre": "genre",
+    "sexe": "genre",
+}
+
+GENRES = {
+    "m": "Masculin", "masculin": "Masculin", "garcon": "Masculin", "h": "Masculin",
+    "f": "Féminin", "feminin": "Féminin", "fille": "Féminin",
+}
+
+BATCH_SIZE = 500
+
+
+class StudentImportError(Exception):
+    """Fichier d'import illisible (format, en-têtes ou dépendance manquante)"""
+
+
+def _column_field(header: Any) -> Optional[str]:
+    """Champ élève correspondant à un en-tête de colonne, None si inconnu"""
+    if header is None:
+        return None
+    # "Téléphone parent *" ou "telephone_parent" -> "telephone parent"
+    words = fold_text(header).replace("_", " ").replace("*", " ").split()
+    return COLUMN_ALIASES.get(" ".join(words))
+
+
+def _map_headers(headers: List[Any]) -> List[Optional[str]]:
+    """Champs des colonnes ; erreur si une colonne obligatoire manque"""
+    fields = [_column_field(h) for h in headers]
+    missing = [name for name, _ in REQUIRED_FIELDS if name not in fields]
+    if missing:
+        raise StudentImportError(f"Colonnes obligatoires absentes: {', '.join(missing)}")
+    return fields
+
+
+def _decode_line(raw: bytes) -> str:
+    """Ligne du fichier CSV en texte (UTF-8, sinon Windows-1252 des exports Excel)"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+
+def _iter_csv(path: str, map_headers: Callable) -> Iterator[tuple]:
+    """Lignes d'un fichier CSV lues au fil de l'eau : (numéro, valeurs, octets lus, taille)"""
+    total = os.path.getsize(path)
+    position = [0]
+
+    with open(path, "rb") as f:
+        sample = _decode_line(f.read(64 * 1024)).lstrip("\ufeff")
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample.split("\n", 1)[0], delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        def lines():
+            for raw in f:
+                position[0] += len(raw)
+                yield _decode_line(raw)
+
+        reader = csv.reader(lines(), dialect)
+        headers = next(reader, None)
+        if headers is None:
+            raise StudentImportError("Le fichier est vide")
+        headers[0] = headers[0].lstrip("\ufeff")
+        yield map_headers(headers)
+        while True:
+            # Ligne de début de l'enregistrement (un champ entre guillemets peut en couvrir plusieurs)
+            line = reader.line_num + 1
+            values = next(reader, None)
+            if values is None:
+                break
+            yield line, values, position[0], total
+
+
+def _iter_xlsx(path: str, map_headers: Callable) -> Iterator[tuple]:
+    """Lignes de la première feuille d'un classeur Excel (lecture en flux)"""
+    if openpyxl is None:
+        raise StudentImportError("L'import Excel nécessite le module openpyxl (pip install openpyxl)")
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row or 0
+        rows = sheet.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            raise StudentImportError("Le fichier est vide")
+        yield map_headers(list(headers))
+        for line, values in enumerate(rows, 2):
+            yield line, list(values), line, total
+    finally:
+        workbook.close()
+
+
+def iter_table_rows(path: str, map_headers: Callable[[List[Any]], List[Optional[str]]]) -> Iterator[tuple]:
+    """Lignes d'un fichier CSV ou XLSX : (numéro de ligne, dict, avancement, total)
+
+    map_headers(en-têtes) donne le champ de chaque colonne (None : ignorée)
+    et lève StudentImportError s'il en manque. Le fichier n'est jamais
+    chargé en entier ; l'avancement est en octets pour un CSV et en lignes
+    pour un classeur Excel.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        rows = _iter_csv(path, map_headers)
+    elif extension in (".xlsx", ".xlsm"):
+        rows = _iter_xlsx(path, map_headers)
+    else:
+        raise StudentImportError(f"Format non pris en charge: {extension or path} (CSV ou XLSX attendu)")
+
+    fields = next(rows)
+    for line, values, done, total in rows:
+        row = {}
+        for field, value in zip(fields, values):
+            if field is not None and field not in row:
+                row[field] = value
+        if any(v not in (None, "") for v in row.values()):
+            yield line, row, done, total
+
+
+def iter_student_rows(path: str) -> Iterator[tuple]:
+    """Lignes d'un fichier d'élèves CSV ou XLSX : (numéro de ligne, dict, avancement, total)"""
+    return iter_table_rows(path, _map_headers)
+
+
+def _text(value: Any) -> str:
+    """Valeur de cellule en texte nettoyé (dates au format jj/mm/aaaa)"""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, float) and value.is_integer():
+        # Numéros saisis comme nombres dans Excel (téléphone, matricule)
+        return str(int(value))
+    return str(value).strip()
+
+
+def validate_student_row(row: Dict, class_names: set) -> tuple:
+    """Valider une ligne avec les règles de save_student
+
+    Retourne (données de l'élève, None) ou (None, [messages d'erreur]).
+    """
+    values = {field: _text(value) for field, value in row.items()}
+    errors = [message for field, message in REQUIRED_FIELDS if not values.get(field)]
+
+    classe = values.get("classe")
+    if classe and classe not in class_names:
+        errors.append(f"Classe inconnue: {classe}")
+
+    genre_value = values.get("genre", "")
+    genre = GENRES.get(fold_text(genre_value), "Masculin" if not genre_value else None)
+    if genre is None:
+        errors.append(f"Genre invalide: {genre_value}")
+
+    if errors:
+        return None, errors
+
+    return {
+        "prenom": values["prenom"],
+        "nom": values["nom"],
+        "nom_complet": f"{values['prenom']} {values['nom']}",
+        "date_naissance": values["date_naissance"],
+        "lieu_naissance": values["lieu_naissance"],
+        "numero_eleve": values.get("numero_eleve", ""),
+        "telephone_parent": values["telephone_parent"],
+        "genre": genre,
+        "classe": classe,
+        "date_creation": datetime.now().isoformat()
+    }, None
+
+
+def import_students(data_manager, path: str,
+                    progress: Optional[Callable[[int, int, int], None]] = None,
+                    cancel_event=None, batch_size: int = BATCH_SIZE) -> Optional[Dict]:
+    """Importer des élèves depuis un fichier CSV ou XLSX
+
+    Les lignes sont lues en flux et validées par lots ; les élèves valides
+    sont inscrits en une seule écriture, avec des IDs attribués d'un bloc
+    (register_students). progress(avancement, total, lignes lues) est appelé
+    après chaque lot. Retourne le rapport {"total", "imported", "ids",
+    "errors": [{"line", "nom", "errors"}]}, ou None si cancel_event est positionné.
+    Lève StudentImportError si le fichier est illisible.
+    """
+    class_names = {c.get("nom") for c in data_manager.get_all_classes(shared=True)}
+    valid = []
+    errors = []
+    count = 0
+
+    for line, row, done, total in iter_student_rows(path):
+        count += 1
+        student, row_errors = validate_student_row(row, class_names)
+        if student is not None:
+            valid.append(student)
+        else:
+            errors.append({
+                "line": line,
+                "nom": f"{_text(row.get('prenom'))} {_text(row.get('nom'))}".strip(),
+                "errors": row_errors
+            })
+
+        if count % batch_size == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if progress:
+                progress(done, total, count)
+
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    ids = []
+    if valid:
+        ids = data_manager.register_students(valid)
+        if ids is None:
+            raise StudentImportError("Erreur lors de l'enregistrement des élèves")
+
+    return {"total": count, "imported": len(ids), "ids": ids, "errors": errors}
+
+
+def write_error_report(report: Dict, path: str) -> str:
+    """Écrire les lignes rejetées dans un CSV (ligne, élève, erreurs) et retourner son chemin"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Ligne", "Élève", "Erreurs"])
+        for error in report["errors"]:
+            writer.writerow([error["line"], error["nom"], " ; ".join(error["errors"])])
+    return path
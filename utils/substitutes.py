@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from typing import List, Dict, Any
+
+from utils.indexes import AvailabilityIndex, TeacherLoadIndex, time_to_minutes, fold_text
+
+WEEKDAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+
+# Points du classement des remplaçants
+SAME_SPECIALITY_SCORE = 100     # matière principale du professeur (fiche)
+TAUGHT_SUBJECT_SCORE = 60       # matière déjà enseignée d'après l'emploi du temps
+KNOWN_CLASS_SCORE = 15          # professeur qui a déjà cette classe
+HOUR_LOAD_PENALTY = 1           # par heure de cours hebdomadaire
+
+
+def weekday_name(value: Any) -> str:
+    """Jour de la semaine (« Lundi »...) d'une date, d'un datetime ou d'un texte jj/mm/aaaa ou aaaa-mm-jj"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        text = str(value).strip()
+        for date_format in ("%d/%m/%Y", "%Y-%m-%d"):
+            try:
+                value = datetime.strptime(text, date_format).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Date invalide: {text} (jj/mm/aaaa attendu)")
+    return WEEKDAYS[value.weekday()]
+
+
+def _teacher_identity(teacher: Dict) -> tuple:
+    return (teacher.get("teacher_id", teacher.get("id")),
+            f"{teacher.get('prenom', '')} {teacher.get('nom', '')}".strip())
+
+
+def rank_substitutes(slot: Dict, teachers: List[Dict], availability: AvailabilityIndex,
+                     load: TeacherLoadIndex, absent_id: Any = None, limit: int = 5) -> List[Dict]:
+    """Professeurs libres pendant le créneau, les plus indiqués d'abord
+
+    Disponibilité lue dans les bitmaps d'occupation ; classement par matière
+    principale (matiere), matières enseignées d'après l'emploi du temps,
+    classe déjà connue, puis charge hebdomadaire la plus faible.
+    """
+    day = slot.get("day")
+    needed = availability.cells(time_to_minutes(slot.get("start_time", "00:00")),
+                                time_to_minutes(slot.get("end_time", "00:00")))
+    subject = fold_text(slot.get("subject") or "")
+    candidates = []
+
+    for teacher in teachers:
+        teacher_id, teacher_name = _teacher_identity(teacher)
+        if absent_id is not None and str(teacher_id) == str(absent_id):
+            continue
+        if availability.free_bits(day, teachers=[(teacher_id, teacher_name)]) & needed != needed:
+            continue
+
+        same_speciality = bool(subject) and fold_text(teacher.get("matiere") or "") == subject
+        taught = [fold_text(s) for s in load.subjects(teacher_id, teacher_name)]
+        teaches_subject = bool(subject) and subject in taught
+        knows_class = slot.get("class_name") in load.classes(teacher_id, teacher_name)
+        weekly_minutes = load.weekly_minutes(teacher_id, teacher_name)
+
+        score = (SAME_SPECIALITY_SCORE * same_speciality + TAUGHT_SUBJECT_SCORE * teaches_subject
+                 + KNOWN_CLASS_SCORE * knows_class - HOUR_LOAD_PENALTY * weekly_minutes / 60)
+        candidates.append({
+            "teacher_id": teacher_id,
+            "teacher_name": teacher_name,
+            "matiere": teacher.get("matiere", ""),
+            "same_speciality": same_speciality,
+            "teaches_subject": teaches_subject,
+            "knows_class": knows_class,
+            "weekly_hours": round(weekly_minutes / 60, 1),
+            "score": round(score, 1),
+        })
+
+    candidates.sort(key=lambda c: (-c["score"], c["weekly_hours"], fold_text(c["teacher_name"])))
+    return candidates[:limit] if limit else candidates
+
+
+def substitutes_for_day(teachers: List[Dict], absent_id: Any, day: str, availability: AvailabilityIndex,
+                        load: TeacherLoadIndex, limit: int = 5) -> List[Dict]:
+    """Créneaux du professeur absent ce jour-là, chacun avec ses remplaçants classés
+
+    Retourne [{"slot", "candidates"}] par heure de début.
+    """
+    absent = next((t for t in teachers if str(_teacher_identity(t)[0]) == str(absent_id)), None)
+    absent_name = _teacher_identity(absent)[1] if absent is not None else None
+    return [{"slot": slot, "candidates": rank_substitutes(slot, teachers, availability, load, absent_id, limit)}
+            for slot in load.slots_on(day, absent_id, absent_name)]
@@ -0,0 +1,703 @@
+import math
+import random
+import re
+import time
+from typing import List, Dict, Optional, Any, Iterable, Callable
+
+from utils.indexes import time_to_minutes, fold_text, IntervalList
+from utils.student_import import iter_table_rows, StudentImportError
+
+# Grille de l'emploi du temps (celle de create_schedule_grid) : 6 jours de 8h à 20h, par heure
+DAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi"]
+FIRST_HOUR = 8
+LAST_HOUR = 20
+HOURS_PER_DAY = LAST_HOUR - FIRST_HOUR
+PERIODS = len(DAYS) * HOURS_PER_DAY
+DAY_BITS = (1 << HOURS_PER_DAY) - 1
+
+# Couleurs des blocs de cours proposées dans les éditeurs d'emploi du temps
+COLORS = ["#4f46e5", "#ef4444", "#10b981", "#f59e0b", "#8b5cf6",
+          "#06b6d4", "#84cc16", "#ec4899", "#14b8a6", "#1f2937"]
+
+# Poids des contraintes souples (coût à minimiser)
+CLASS_GAP_WEIGHT = 6        # heure creuse d'une classe entre deux cours
+TEACHER_GAP_WEIGHT = 3      # heure creuse d'un professeur
+BALANCE_WEIGHT = 1          # carré des heures d'une classe par jour (journées équilibrées)
+SUBJECT_DAY_LIMIT = 2       # heures d'une même matière par jour sans pénalité
+SUBJECT_DAY_WEIGHT = 8      # par heure au-delà
+LATE_HOUR = 17              # cours commençant à partir de 17h
+LATE_WEIGHT = 1
+
+LATE_BITS = sum(1 << (hour - FIRST_HOUR) for hour in range(LATE_HOUR, LAST_HOUR))
+
+# En-têtes reconnus du fichier des besoins (minuscules, sans accents) -> champ
+REQUIREMENT_COLUMNS = {
+    "classe": "classe",
+    "matiere": "matiere",
+    "discipline": "matiere",
+    "professeur": "professeur",
+    "enseignant": "professeur",
+    "heures": "heures",
+    "heures par semaine": "heures",
+    "volume horaire": "heures",
+    "couleur": "couleur",
+    "indisponibilites": "indisponibilites",
+    "indisponibilites professeur": "indisponibilites",
+}
+
+REQUIRED_COLUMNS = ["classe", "matiere", "professeur", "heures"]
+
+_HOURS_RANGE = re.compile(r"(\d{1,2})(?:[:hH](\d{2})?)?\s*-\s*(\d{1,2})(?:[:hH](\d{2})?)?")
+
+
+class TimetableError(Exception):
+    """Génération ou enregistrement impossible (besoins illisibles, grille trop petite, conflit)"""
+
+
+def _gaps(bits: int) -> int:
+    """Heures libres entre le premier et le dernier cours d'une journée"""
+    if not bits:
+        return 0
+    return bits.bit_length() - (bits & -bits).bit_length() + 1 - bits.bit_count()
+
+
+def _period_bits(day: Any, start: int, end: int) -> int:
+    """Heures de la grille touchées par [start, end) (minutes) un jour donné"""
+    if day not in DAYS:
+        return 0
+    bits = 0
+    for hour in range(HOURS_PER_DAY):
+        period_start = (FIRST_HOUR + hour) * 60
+        if start < period_start + 60 and end > period_start:
+            bits |= 1 << hour
+    return bits << (DAYS.index(day) * HOURS_PER_DAY)
+
+
+def teacher_key(teacher_id: Any = None, teacher_name: Any = None) -> str:
+    """Identité d'un professeur dans le solveur : son ID, sinon son nom"""
+    if teacher_id not in (None, ""):
+        return str(teacher_id)
+    return "nom:" + fold_text(teacher_name or "")
+
+
+class _Solver:
+    """État du placement : cours d'une heure posés sur la grille de 72 créneaux
+
+    Chaque besoin (classe, matière, professeur, heures) donne autant de cours
+    d'une heure. Les occupations sont des entiers de 72 bits par classe et par
+    professeur ; class_at/teacher_at donnent le cours posé sur un créneau.
+    """
+
+    def __init__(self, requirements: List[Dict], blocked: Dict[str, int], rng: random.Random):
+        self.rng = rng
+        self.requirements = requirements
+        class_names = sorted({r["class_name"] for r in requirements})
+        teacher_keys = sorted({r["teacher_key"] for r in requirements})
+        self.class_index = {name: i for i, name in enumerate(class_names)}
+        self.teacher_index = {key: i for i, key in enumerate(teacher_keys)}
+
+        self.req_class = [self.class_index[r["class_name"]] for r in requirements]
+        self.req_teacher = [self.teacher_index[r["teacher_key"]] for r in requirements]
+        # Créneaux permis : ni indisponibilité ni cours conservé du professeur
+        self.allowed = [((1 << PERIODS) - 1) & ~blocked.get(r["teacher_key"], 0) for r in requirements]
+
+        self.lesson_req = [index for index, r in enumerate(requirements) for _ in range(r["hours"])]
+        self.lesson_period = [-1] * len(self.lesson_req)
+
+        self.class_mask = [0] * len(class_names)
+        self.teacher_mask = [blocked.get(key, 0) for key in teacher_keys]
+        self.class_at = [[-1] * PERIODS for _ in class_names]
+        self.teacher_at = [[-1] * PERIODS for _ in teacher_keys]
+        self.req_day = [[0] * len(DAYS) for _ in requirements]
+
+    # Coût des contraintes souples
+    def _class_day_cost(self, c: int, day: int) -> int:
+        bits = (self.class_mask[c] >> (day * HOURS_PER_DAY)) & DAY_BITS
+        count = bits.bit_count()
+        return (CLASS_GAP_WEIGHT * _gaps(bits) + BALANCE_WEIGHT * count * count
+                + LATE_WEIGHT * (bits & LATE_BITS).bit_count())
+
+    def _teacher_day_cost(self, t: int, day: int) -> int:
+        return TEACHER_GAP_WEIGHT * _gaps((self.teacher_mask[t] >> (day * HOURS_PER_DAY)) & DAY_BITS)
+
+    def _req_day_cost(self, r: int, day: int) -> int:
+        over = self.req_day[r][day] - SUBJECT_DAY_LIMIT
+        return SUBJECT_DAY_WEIGHT * over if over > 0 else 0
+
+    def _cost_around(self, lessons: Iterable[tuple]) -> int:
+        """Coût des journées touchées par des cours (requirement, jour)"""
+        days = set()
+        for r, day in lessons:
+            days.add((0, self.req_class[r], day))
+            days.add((1, self.req_teacher[r], day))
+            days.add((2, r, day))
+        cost = 0
+        for kind, owner, day in days:
+            if kind == 0:
+                cost += self._class_day_cost(owner, day)
+            elif kind == 1:
+                cost += self._teacher_day_cost(owner, day)
+            else:
+                cost += self._req_day_cost(owner, day)
+        return cost
+
+    def total_cost(self) -> int:
+        cost = 0
+        for day in range(len(DAYS)):
+            cost += sum(self._class_day_cost(c, day) for c in range(len(self.class_mask)))
+            cost += sum(self._teacher_day_cost(t, day) for t in range(len(self.teacher_mask)))
+            cost += sum(self._req_day_cost(r, day) for r in range(len(self.requirements)))
+        return cost
+
+    # Placement
+    def free(self, r: int) -> int:
+        """Créneaux où un cours du besoin peut encore être posé"""
+        return self.allowed[r] & ~self.class_mask[self.req_class[r]] & ~self.teacher_mask[self.req_teacher[r]]
+
+    def place(self, lesson: int, period: int):
+        r = self.lesson_req[lesson]
+        c, t = self.req_class[r], self.req_teacher[r]
+        self.lesson_period[lesson] = period
+        self.class_mask[c] |= 1 << period
+        self.teacher_mask[t] |= 1 << period
+        self.class_at[c][period] = lesson
+        self.teacher_at[t][period] = lesson
+        self.req_day[r][period // HOURS_PER_DAY] += 1
+
+    def unplace(self, lesson: int):
+        period = self.lesson_period[lesson]
+        r = self.lesson_req[lesson]
+        c, t = self.req_class[r], self.req_teacher[r]
+        self.lesson_period[lesson] = -1
+        self.class_mask[c] &= ~(1 << period)
+        self.teacher_mask[t] &= ~(1 << period)
+        self.class_at[c][period] = -1
+        self.teacher_at[t][period] = -1
+        self.req_day[r][period // HOURS_PER_DAY] -= 1
+
+    def _placement_cost(self, lesson: int, period: int) -> int:
+        """Hausse du coût si le cours (non placé) est posé sur ce créneau"""
+        around = [(self.lesson_req[lesson], period // HOURS_PER_DAY)]
+        before = self._cost_around(around)
+        self.place(lesson, period)
+        after = self._cost_around(around)
+        self.unplace(lesson)
+        return after - before
+
+    def _best_period(self, lesson: int, periods: int) -> int:
+        best, best_cost = -1, None
+        while periods:
+            low = periods & -periods
+            period = low.bit_length() - 1
+            periods ^= low
+            cost = self._placement_cost(lesson, period) + self.rng.random()
+            if best_cost is None or cost < best_cost:
+                best, best_cost = period, cost
+        return best
+
+    def construct(self, progress: Optional[Callable] = None, cancel_event=None) -> bool:
+        """Placement glouton avec propagation : besoin le plus contraint d'abord
+
+        Après chaque cours posé, les créneaux libres des besoins de la même
+        classe et du même professeur se réduisent (masques d'occupation). Un
+        besoin sans créneau libre déloge les cours qui le bloquent (réparation
+        avec liste tabou), dans la limite d'un nombre d'évictions.
+        """
+        pending: Dict[int, List[int]] = {}
+        for lesson, r in enumerate(self.lesson_req):
+            pending.setdefault(r, []).append(lesson)
+        total = len(self.lesson_req)
+        evictions_left = 20 * total + 100
+        tabu: Dict[tuple, int] = {}
+        step = 0
+
+        while pending:
+            step += 1
+            if step % 200 == 0:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                if progress:
+                    placed = total - sum(len(lessons) for lessons in pending.values())
+                    progress(placed, total, f"Placement des cours : {placed}/{total}")
+
+            # Besoin le plus contraint : le moins de créneaux libres par heure restant à placer
+            r = min(pending, key=lambda k: (self.free(k).bit_count() - len(pending[k]), self.rng.random()))
+            lessons = pending[r]
+            lesson = lessons.pop()
+            if not lessons:
+                del pending[r]
+
+            free = self.free(r)
+            if free:
+                self.place(lesson, self._best_period(lesson, free))
+                continue
+
+            if evictions_left <= 0:
+                continue  # reste non placé
+
+            # Réparation : créneau permis qui déloge le moins de cours
+            c, t = self.req_class[r], self.req_teacher[r]
+            candidates = []
+            periods = self.allowed[r]
+            while periods:
+                low = periods & -periods
+                period = low.bit_length() - 1
+                periods ^= low
+                if tabu.get((r, period), 0) > step:
+                    continue
+                blocking = {self.class_at[c][period], self.teacher_at[t][period]} - {-1}
+                candidates.append((len(blocking), self.rng.random(), period, blocking))
+            if not candidates:
+                continue
+            _, _, period, blocking = min(candidates)
+            for other in blocking:
+                other_req = self.lesson_req[other]
+                tabu[(other_req, self.lesson_period[other])] = step + 10
+                self.unplace(other)
+                pending.setdefault(other_req, []).append(other)
+                evictions_left -= 1
+            self.place(lesson, period)
+        return True
+
+    def place_unplaced(self):
+        """Poser les cours restants là où un créneau s'est libéré"""
+        for lesson, period in enumerate(self.lesson_period):
+            if period < 0:
+                free = self.free(self.lesson_req[lesson])
+                if free:
+                    self.place(lesson, self._best_period(lesson, free))
+
+    # Recherche locale
+    def _random_bit(self, bits: int) -> int:
+        count = bits.bit_count()
+        index = self.rng.randrange(count)
+        while index:
+            bits &= bits - 1
+            index -= 1
+        return (bits & -bits).bit_length() - 1
+
+    def _try_move(self, lesson: int, temperature: float) -> int:
+        """Déplacer un cours vers un créneau libre ou l'échanger avec un cours de sa classe
+
+        Retourne la variation de coût (0 si le mouvement est refusé).
+        """
+        r = self.lesson_req[lesson]
+        period = self.lesson_period[lesson]
+        c, t = self.req_class[r], self.req_teacher[r]
+
+        if self.rng.random() < 0.6:
+            free = self.free(r)
+            if not free:
+                return 0
+            target = self._random_bit(free)
+            around = [(r, period // HOURS_PER_DAY), (r, target // HOURS_PER_DAY)]
+            before = self._cost_around(around)
+            self.unplace(lesson)
+            self.place(lesson, target)
+            delta = self._cost_around(around) - before
+            if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                return delta
+            self.unplace(lesson)
+            self.place(lesson, period)
+            return 0
+
+        # Échange avec un autre cours de la classe (ou une heure libre de la classe)
+        target = self.rng.randrange(PERIODS)
+        other = self.class_at[c][target]
+        if target == period or other < 0 or not (self.allowed[r] >> target & 1):
+            return 0
+        other_req = self.lesson_req[other]
+        other_teacher = self.req_teacher[other_req]
+        if other_req == r or not (self.allowed[other_req] >> period & 1):
+            return 0
+        if other_teacher != t and (self.teacher_mask[t] >> target & 1 or self.teacher_mask[other_teacher] >> period & 1):
+            return 0
+        around = [(r, period // HOURS_PER_DAY), (r, target // HOURS_PER_DAY),
+                  (other_req, period // HOURS_PER_DAY), (other_req, target // HOURS_PER_DAY)]
+        before = self._cost_around(around)
+        self.unplace(lesson)
+        self.unplace(other)
+        self.place(lesson, target)
+        self.place(other, period)
+        delta = self._cost_around(around) - before
+        if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+            return delta
+        self.unplace(lesson)
+        self.unplace(other)
+        self.place(lesson, period)
+        self.place(other, target)
+        return 0
+
+    def improve(self, time_limit: float, progress: Optional[Callable] = None, cancel_event=None):
+        """Recuit simulé sur les contraintes souples ; garde la meilleure solution rencontrée"""
+        placed = [lesson for lesson, period in enumerate(self.lesson_period) if period >= 0]
+        if not placed:
+            return
+        cost = best_cost = self.total_cost()
+        best = list(self.lesson_period)
+        start = time.monotonic()
+        deadline = start + time_limit
+        stall_limit = max(20000, 30 * len(placed))
+        last_improvement = 0
+        last_report = start
+        iteration = 0
+        temperature_start, temperature_end = 4.0, 0.05
+        temperature = temperature_start
+
+        while True:
+            iteration += 1
+            if iteration % 512 == 0:
+                now = time.monotonic()
+                if now >= deadline or iteration - last_improvement > stall_limit:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if now - last_report > 0.5 and progress:
+                    last_report = now
+                    progress(now - start, time_limit, f"Optimisation de l'emploi du temps (coût {best_cost})")
+                if iteration % 8192 == 0 and any(p < 0 for p in self.lesson_period):
+                    self.place_unplaced()
+                    placed = [lesson for lesson, period in enumerate(self.lesson_period) if period >= 0]
+                    cost = self.total_cost()
+                    best_cost, best = cost, list(self.lesson_period)
+                elapsed = (now - start) / time_limit
+                temperature = temperature_start * (temperature_end / temperature_start) ** min(elapsed, 1.0)
+
+            cost += self._try_move(self.rng.choice(placed), temperature)
+            if cost < best_cost:
+                best_cost = cost
+                best = list(self.lesson_period)
+                last_improvement = iteration
+
+        # Revenir à la meilleure solution
+        for lesson, period in enumerate(self.lesson_period):
+            if period >= 0:
+                self.unplace(lesson)
+        for lesson, period in enumerate(best):
+            if period >= 0:
+                self.place(lesson, period)
+
+    def statistics(self) -> Dict:
+        """Heures creuses des classes et des professeurs de la solution"""
+        class_gaps = teacher_gaps = 0
+        for day in range(len(DAYS)):
+            shift = day * HOURS_PER_DAY
+            class_gaps += sum(_gaps((mask >> shift) & DAY_BITS) for mask in self.class_mask)
+            teacher_gaps += sum(_gaps((mask >> shift) & DAY_BITS) for mask in self.teacher_mask)
+        return {"class_gaps": class_gaps, "teacher_gaps": teacher_gaps, "cost": self.total_cost()}
+
+    def slots(self) -> List[Dict]:
+        """Créneaux d'emploi du temps : heures consécutives d'un même besoin fusionnées"""
+        periods: Dict[int, List[int]] = {}
+        for lesson, period in enumerate(self.lesson_period):
+            if period >= 0:
+                periods.setdefault(self.lesson_req[lesson], []).append(period)
+
+        slots = []
+        for r, req_periods in sorted(periods.items()):
+            requirement = self.requirements[r]
+            req_periods.sort()
+            blocks = []
+            for period in req_periods:
+                if blocks and blocks[-1][1] == period and period % HOURS_PER_DAY:
+                    blocks[-1][1] = period + 1
+                else:
+                    blocks.append([period, period + 1])
+            for first, end in blocks:
+                day, hour = divmod(first, HOURS_PER_DAY)
+                slot = {
+                    "class_name": requirement["class_name"],
+                    "day": DAYS[day],
+                    "start_time": f"{FIRST_HOUR + hour:02d}:00",
+                    "end_time": f"{FIRST_HOUR + hour + end - first:02d}:00",
+                    "teacher_name": requirement["teacher_name"],
+                    "subject": requirement["subject"],
+                    "color": requirement["color"],
+                }
+                # ID gardé tel qu'enregistré dans la fiche du professeur (entier ou texte)
+                if requirement.get("teacher_id") not in (None, ""):
+                    slot["teacher_id"] = requirement["teacher_id"]
+                slots.append(slot)
+        slots.sort(key=lambda s: (s["class_name"], DAYS.index(s["day"]), s["start_time"]))
+        return slots
+
+
+def _normalize_requirements(requirements: Iterable[Dict]) -> List[Dict]:
+    """Besoins complétés (clé du professeur, heures entières, couleur par matière)"""
+    normalized = []
+    subject_colors: Dict[str, str] = {}
+    for requirement in requirements:
+        hours = int(math.ceil(float(requirement.get("hours", 0) or 0)))
+        if hours <= 0:
+            continue
+        subject = str(requirement.get("subject", "")).strip()
+        color = requirement.get("color") or subject_colors.get(fold_text(subject))
+        if not color:
+            color = COLORS[len(subject_colors) % len(COLORS)]
+        subject_colors.setdefault(fold_text(subject), color)
+        normalized.append({
+            "class_name": requirement["class_name"],
+            "subject": subject,
+            "teacher_id": requirement.get("teacher_id"),
+            "teacher_name": requirement.get("teacher_name", ""),
+            "teacher_key": teacher_key(requirement.get("teacher_id"), requirement.get("teacher_name")),
+            "hours": hours,
+            "color": color,
+        })
+    return normalized
+
+
+def generate_timetable(requirements: Iterable[Dict], unavailable: Optional[Dict[str, List[tuple]]] = None,
+                       fixed_slots: Iterable[Dict] = (), time_limit: float = 20.0,
+                       seed: Optional[int] = None,
+                       progress: Optional[Callable[[float, Optional[float], str], None]] = None,
+                       cancel_event=None) -> Optional[Dict]:
+    """Construire l'emploi du temps des classes à partir de leurs besoins horaires
+
+    requirements : [{"class_name", "subject", "teacher_id", "teacher_name",
+    "hours", "color" (facultatif)}], heures par semaine. unavailable :
+    {clé professeur (teacher_key): [(jour, "HH:MM", "HH:MM")]} ; un jour seul
+    ("HH:MM" vides) bloque toute la journée. fixed_slots : créneaux conservés
+    des autres classes, qui occupent leurs professeurs.
+
+    Contraintes strictes : ni classe ni professeur à deux endroits, grille
+    8h-20h du lundi au samedi, indisponibilités. Contraintes souples : heures
+    creuses des classes et des professeurs, équilibre des journées, plus de
+    SUBJECT_DAY_LIMIT heures d'une matière par jour, cours tardifs.
+    progress(avancement, total, message) suit les deux phases. Retourne
+    {"slots", "unplaced": [{"class_name", "subject", "teacher_name", "hours"}],
+    "statistics"}, ou None si cancel_event est positionné.
+    """
+    requirements = _normalize_requirements(requirements)
+    hours_by_class: Dict[str, int] = {}
+    for requirement in requirements:
+        hours_by_class[requirement["class_name"]] = hours_by_class.get(requirement["class_name"], 0) + requirement["hours"]
+    too_long = [name for name, hours in hours_by_class.items() if hours > PERIODS]
+    if too_long:
+        raise TimetableError(f"Plus de {PERIODS} heures par semaine pour: {', '.join(sorted(too_long))}")
+
+    # Créneaux bloqués par professeur : indisponibilités et cours des classes conservées
+    blocked: Dict[str, int] = {}
+    for key, windows in (unavailable or {}).items():
+        for day, start, end in windows:
+            start = time_to_minutes(start) if start else FIRST_HOUR * 60
+            end = time_to_minutes(end) if end else LAST_HOUR * 60
+            blocked[key] = blocked.get(key, 0) | _period_bits(day, start, end)
+    for slot in fixed_slots:
+        try:
+            bits = _period_bits(slot.get("day"), time_to_minutes(slot.get("start_time", "00:00")),
+                                time_to_minutes(slot.get("end_time", "00:00")))
+        except (TypeError, ValueError):
+            continue
+        key = teacher_key(slot.get("teacher_id"), slot.get("teacher_name"))
+        blocked[key] = blocked.get(key, 0) | bits
+
+    solver = _Solver(requirements, blocked, random.Random(seed))
+    if not solver.construct(progress, cancel_event):
+        return None
+    started = time.monotonic()
+    solver.improve(time_limit, progress, cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    unplaced: Dict[int, int] = {}
+    for lesson, period in enumerate(solver.lesson_period):
+        if period < 0:
+            r = solver.lesson_req[lesson]
+            unplaced[r] = unplaced.get(r, 0) + 1
+    statistics = solver.statistics()
+    statistics["search_seconds"] = round(time.monotonic() - started, 1)
+    return {
+        "slots": solver.slots(),
+        "unplaced": [{"class_name": requirements[r]["class_name"], "subject": requirements[r]["subject"],
+                      "teacher_name": requirements[r]["teacher_name"], "hours": hours}
+                     for r, hours in sorted(unplaced.items())],
+        "statistics": statistics,
+    }
+
+
+def teacher_clashes(fixed_slots: Iterable[Dict], slots: Iterable[Dict]) -> List[Dict]:
+    """Créneaux de slots dont le professeur a déjà cours au même moment dans fixed_slots
+
+    Les professeurs sont identifiés comme dans le solveur (teacher_key) ; un
+    créneau sans professeur ou aux heures illisibles n'est pas comparé.
+    """
+    busy: Dict[tuple, IntervalList] = {}
+    for position, slot in enumerate(fixed_slots):
+        key = teacher_key(slot.get("teacher_id"), slot.get("teacher_name"))
+        if key == "nom:":
+            continue
+        try:
+            start, end = time_to_minutes(slot.get("start_time", "00:00")), time_to_minutes(slot.get("end_time", "00:00"))
+        except (TypeError, ValueError):
+            continue
+        busy.setdefault((key, slot.get("day")), IntervalList()).add(start, end, position)
+
+    clashes = []
+    for slot in slots:
+        intervals = busy.get((teacher_key(slot.get("teacher_id"), slot.get("teacher_name")), slot.get("day")))
+        if intervals is None:
+            continue
+        try:
+            start, end = time_to_minutes(slot.get("start_time", "00:00")), time_to_minutes(slot.get("end_time", "00:00"))
+        except (TypeError, ValueError):
+            continue
+        if intervals.has_overlap(start, end):
+            clashes.append(slot)
+    return clashes
+
+
+def _teachers_by_key(teachers: Iterable[Dict]) -> Dict[str, Dict]:
+    """Professeurs par ID, « prénom nom » et « nom prénom » (sans accents)"""
+    by_key: Dict[str, Dict] = {}
+    for teacher in teachers:
+        teacher_id = teacher.get("teacher_id", teacher.get("id"))
+        by_key[str(teacher_id)] = teacher
+        by_key[fold_text(f"{teacher.get('prenom', '')} {teacher.get('nom', '')}")] = teacher
+        by_key[fold_text(f"{teacher.get('nom', '')} {teacher.get('prenom', '')}")] = teacher
+    return by_key
+
+
+def requirements_from_schedule(slots: Iterable[Dict], class_names: Optional[Iterable[str]] = None,
+                               teachers: Iterable[Dict] = ()) -> List[Dict]:
+    """Besoins horaires déduits de l'emploi du temps actuel (réorganisation)
+
+    Les heures de chaque (classe, matière, professeur) sont additionnées et
+    arrondies à l'heure supérieure. Un professeur saisi par son seul nom est
+    rattaché à son ID quand il figure dans teachers.
+    """
+    by_key = _teachers_by_key(teachers)
+    wanted = set(class_names) if class_names is not None else None
+    minutes: Dict[tuple, Dict] = {}
+    for slot in slots:
+        class_name = slot.get("class_name")
+        if wanted is not None and class_name not in wanted:
+            continue
+        try:
+            duration = time_to_minutes(slot.get("end_time", "00:00")) - time_to_minutes(slot.get("start_time", "00:00"))
+        except (TypeError, ValueError):
+            continue
+        if duration <= 0:
+            continue
+        teacher_id = slot.get("teacher_id")
+        if teacher_id in (None, ""):
+            teacher = by_key.get(fold_text(slot.get("teacher_name") or ""))
+            if teacher is not None:
+                teacher_id = teacher.get("teacher_id", teacher.get("id"))
+        key = (class_name, fold_text(slot.get("subject", "")), teacher_key(teacher_id, slot.get("teacher_name")))
+        entry = minutes.setdefault(key, {
+            "class_name": class_name,
+            "subject": slot.get("subject", ""),
+            "teacher_id": teacher_id,
+            "teacher_name": slot.get("teacher_name", ""),
+            "color": slot.get("color"),
+            "minutes": 0,
+        })
+        entry["minutes"] += duration
+
+    return [{**{k: v for k, v in entry.items() if k != "minutes"}, "hours": math.ceil(entry["minutes"] / 60)}
+            for entry in minutes.values()]
+
+
+def _requirement_column(header: Any) -> Optional[str]:
+    if header is None:
+        return None
+    words = fold_text(header).replace("_", " ").replace("*", " ").split()
+    return REQUIREMENT_COLUMNS.get(" ".join(words))
+
+
+def _map_requirement_headers(headers: List[Any]) -> List[Optional[str]]:
+    fields = [_requirement_column(h) for h in headers]
+    missing = [name for name in REQUIRED_COLUMNS if name not in fields]
+    if missing:
+        raise StudentImportError(f"Colonnes obligatoires absentes: {', '.join(missing)}")
+    return fields
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def parse_unavailability(text: str) -> tuple:
+    """Indisponibilités « Mercredi 14:00-20:00, Samedi » : ([(jour, début, fin)], [erreurs])"""
+    days = {fold_text(day): day for day in DAYS}
+    windows, errors = [], []
+    for part in re.split(r"[,;/]", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        day = days.get(fold_text(part.split()[0]))
+        if day is None:
+            errors.append(f"Jour inconnu: {part}")
+            continue
+        match = _HOURS_RANGE.search(part)
+        if match:
+            start_hour, start_minute, end_hour, end_minute = match.groups()
+            windows.append((day, f"{int(start_hour):02d}:{start_minute or '00'}",
+                            f"{int(end_hour):02d}:{end_minute or '00'}"))
+        else:
+            windows.append((day, "", ""))
+    return windows, errors
+
+
+def read_requirements(path: str, teachers: Iterable[Dict], class_names: Iterable[str]) -> Dict:
+    """Lire le fichier des besoins horaires (CSV ou XLSX)
+
+    Colonnes : Classe, Matière, Professeur (ID ou « Prénom Nom »), Heures,
+    et facultativement Couleur et Indisponibilités du professeur. Retourne
+    {"requirements", "unavailable", "errors": [{"line", "nom", "errors"}]},
+    comme le rapport d'import des élèves. Lève TimetableError si le fichier
+    est illisible.
+    """
+    by_key = _teachers_by_key(teachers)
+    class_names = set(class_names)
+
+    requirements, errors = [], []
+    unavailable: Dict[str, List[tuple]] = {}
+    try:
+        for line, row, _, _ in iter_table_rows(path, _map_requirement_headers):
+            values = {field: _cell(value) for field, value in row.items()}
+            row_errors = [f"La colonne {name} est obligatoire" for name in REQUIRED_COLUMNS if not values.get(name)]
+            class_name = values.get("classe")
+            if class_name and class_name not in class_names:
+                row_errors.append(f"Classe inconnue: {class_name}")
+            teacher = by_key.get(values.get("professeur", "")) or by_key.get(fold_text(values.get("professeur", "")))
+            if values.get("professeur") and teacher is None:
+                row_errors.append(f"Professeur inconnu: {values['professeur']}")
+            try:
+                hours = float(values.get("heures", "0").replace(",", "."))
+                if hours <= 0:
+                    raise ValueError
+            except ValueError:
+                hours = 0
+                if values.get("heures"):
+                    row_errors.append(f"Nombre d'heures invalide: {values['heures']}")
+            windows, window_errors = parse_unavailability(values.get("indisponibilites", ""))
+            row_errors.extend(window_errors)
+
+            if row_errors:
+                errors.append({"line": line, "nom": f"{class_name or ''} {values.get('matiere', '')}".strip(),
+                               "errors": row_errors})
+                continue
+
+            teacher_id = teacher.get("teacher_id", teacher.get("id"))
+            key = teacher_key(teacher_id)
+            for window in windows:
+                if window not in unavailable.setdefault(key, []):
+                    unavailable[key].append(window)
+            requirements.append({
+                "class_name": class_name,
+                "subject": values["matiere"],
+                "teacher_id": teacher_id,
+                "teacher_name": f"{teacher.get('prenom', '')} {teacher.get('nom', '')}".strip(),
+                "hours": hours,
+                "color": values.get("couleur") or None,
+            })
+    except StudentImportError as ex:
+        raise TimetableError(str(ex))
+
+    return {"requirements": requirements, "unavailable": unavailable, "errors": errors}